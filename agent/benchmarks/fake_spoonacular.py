@@ -0,0 +1,150 @@
+"""
+Local stand-in for the Spoonacular endpoints used by /chat.
+
+Serves findByIngredients, /{id}/information and informationBulk from the fixture JSON in
+benchmarks/fixtures, with configurable latency and error injection. Responses carry
+Spoonacular's quota headers (X-API-Quota-Request/-Used/-Left), charged the way the
+real API charges these endpoints.
+
+Run standalone:
+    python -m benchmarks.fake_spoonacular --port 8090 --latency-ms 150 --error-rate 0.02
+
+then start the agent with SPOONACULAR_BASE_URL=http://127.0.0.1:8090
+"""
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+@dataclass
+class FakeSpoonacularConfig:
+    latency_ms: float = 120.0  # mean added latency per request
+    jitter_ms: float = 60.0  # +/- uniform jitter around the mean
+    tail_rate: float = 0.01  # fraction of requests that get tail latency
+    tail_latency_ms: float = 1500.0
+    error_rate: float = 0.0  # fraction of requests that fail
+    error_status: int = 500
+    daily_quota: float = 150.0  # points reported as X-API-Quota-Left starts from
+
+
+def quota_points(path: str, params) -> float:
+    """Points Spoonacular charges for a request to one of the served endpoints"""
+    if path.endswith("/findByIngredients"):
+        return 1 + 0.01 * int(params.get("number", 10))
+    if path.endswith("/informationBulk"):
+        ids = [i for i in params.get("ids", "").split(",") if i.strip()]
+        return 1 + 0.5 * max(len(ids) - 1, 0)
+    return 1.0
+
+
+def load_fixtures() -> tuple[list, dict]:
+    with open(FIXTURES_DIR / "findByIngredients.json") as f:
+        search_results = json.load(f)
+    with open(FIXTURES_DIR / "information.json") as f:
+        information = json.load(f)
+    return search_results, information
+
+
+def create_app(config: FakeSpoonacularConfig | None = None) -> FastAPI:
+    config = config or FakeSpoonacularConfig()
+    search_results, information = load_fixtures()
+    fallback_ids = list(information)
+
+    app = FastAPI()
+    app.state.config = config
+    app.state.request_count = 0
+    app.state.quota_used = 0.0
+
+    @app.middleware("http")
+    async def quota_headers(request: Request, call_next):
+        response = await call_next(request)
+        if response.status_code < 400:
+            points = quota_points(request.url.path, request.query_params)
+            app.state.quota_used += points
+            response.headers["X-API-Quota-Request"] = f"{points:g}"
+            response.headers["X-API-Quota-Used"] = f"{app.state.quota_used:g}"
+            response.headers["X-API-Quota-Left"] = f"{config.daily_quota - app.state.quota_used:g}"
+        return response
+
+    async def simulate_network():
+        app.state.request_count += 1
+        if random.random() < config.tail_rate:
+            delay = config.tail_latency_ms
+        else:
+            delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        await asyncio.sleep(max(delay, 0) / 1000)
+
+        if random.random() < config.error_rate:
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"status": "failure", "code": config.error_status, "message": "Injected error"},
+            )
+        return None
+
+    @app.get("/recipes/findByIngredients")
+    async def find_by_ingredients(ingredients: str = "", number: int = 10, ranking: int = 1, ignorePantry: bool = True):
+        error = await simulate_network()
+        if error:
+            return error
+        return search_results[:number]
+
+    def lookup(recipe_id: int, include_nutrition: bool) -> dict:
+        recipe = information.get(str(recipe_id))
+        if recipe is None:
+            # unknown ids get a fixture recipe with the id swapped in
+            recipe = dict(information[fallback_ids[recipe_id % len(fallback_ids)]], id=recipe_id)
+        if not include_nutrition:
+            recipe = {k: v for k, v in recipe.items() if k != "nutrition"}
+        return recipe
+
+    @app.get("/recipes/informationBulk")
+    async def recipe_information_bulk(ids: str = "", includeNutrition: bool = False):
+        error = await simulate_network()
+        if error:
+            return error
+        return [lookup(int(recipe_id), includeNutrition) for recipe_id in ids.split(",") if recipe_id.strip()]
+
+    @app.get("/recipes/{recipe_id}/information")
+    async def recipe_information(recipe_id: int, includeNutrition: bool = False):
+        error = await simulate_network()
+        if error:
+            return error
+        return lookup(recipe_id, includeNutrition)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Spoonacular server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=120.0)
+    parser.add_argument("--jitter-ms", type=float, default=60.0)
+    parser.add_argument("--tail-rate", type=float, default=0.01)
+    parser.add_argument("--tail-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    config = FakeSpoonacularConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tail_rate=args.tail_rate,
+        tail_latency_ms=args.tail_latency_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Cold-start profile for the agent app.
+
+Imports main in a fresh interpreter under `python -X importtime` and reports
+the total import time, the slowest top-level packages (cumulative) and the
+modules with the most self time. With --startup it also launches the app with
+uvicorn and polls /healthz, reporting when the server starts listening and
+when warm-up finishes.
+
+Usage (from agent/):
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --top 20 --startup --json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from httpx import Client, HTTPError
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+def profile_env() -> Dict[str, str]:
+    """Environment that lets main import without real credentials or exporting telemetry"""
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "import-profile")
+    env.setdefault("SPOONACULAR_API_KEY", "import-profile")
+    env.setdefault("LOGFIRE_SEND_TO_LOGFIRE", "false")
+    env.setdefault("LOGFIRE_CONSOLE", "false")
+    return env
+
+
+def parse_importtime(stderr: str) -> List[ImportTiming]:
+    """Parse `-X importtime` lines: 'import time: self | cumulative | module'"""
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append(ImportTiming(
+            module=name.strip(),
+            self_ms=int(self_us) / 1000,
+            cumulative_ms=int(cumulative_us) / 1000,
+            # nesting is shown as two spaces per level after the last '|'
+            depth=(len(name) - len(name.lstrip()) - 1) // 2,
+        ))
+    return timings
+
+
+def profile_imports(module: str = "main") -> List[ImportTiming]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=AGENT_DIR,
+        env=profile_env(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure_startup(port: int, timeout: float) -> Dict[str, Optional[float]]:
+    """Seconds until /healthz answers at all (listening) and until it reports ready"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=AGENT_DIR,
+        env=profile_env(),
+    )
+    listening = ready = None
+    try:
+        with Client(timeout=1.0) as client:
+            while time.perf_counter() - start < timeout and ready is None:
+                try:
+                    response = client.get(f"http://127.0.0.1:{port}/healthz")
+                except HTTPError:
+                    time.sleep(0.02)
+                    continue
+                now = time.perf_counter() - start
+                if listening is None:
+                    listening = now
+                if response.status_code == 200:
+                    ready = now
+                else:
+                    time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"listening_s": listening, "ready_s": ready}
+
+
+def print_report(timings: List[ImportTiming], top: int, startup: Optional[dict]) -> None:
+    root = next((t for t in timings if t.depth == 0 and t.module == "main"), None)
+    if root is not None:
+        print(f"\nimport main: {root.cumulative_ms:.0f} ms ({root.self_ms:.0f} ms in main itself)\n")
+
+    packages = [t for t in timings if t.depth == 1]
+    print(f"{'slowest imports from main':<40}{'cumulative ms':>15}")
+    for t in sorted(packages, key=lambda t: t.cumulative_ms, reverse=True)[:top]:
+        print(f"{t.module:<40}{t.cumulative_ms:>15.1f}")
+
+    print(f"\n{'most self time':<40}{'self ms':>15}")
+    for t in sorted(timings, key=lambda t: t.self_ms, reverse=True)[:top]:
+        print(f"{t.module:<40}{t.self_ms:>15.1f}")
+
+    if startup is not None:
+        def fmt(value):
+            return f"{value:.2f}s" if value is not None else "timed out"
+        print(f"\nuvicorn startup: listening after {fmt(startup['listening_s'])}, ready after {fmt(startup['ready_s'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and startup profile for the agent app")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--startup", action="store_true", help="also time uvicorn startup via /healthz")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    timings = profile_imports(args.module)
+    startup = measure_startup(args.port, args.timeout) if args.startup else None
+    print_report(timings, args.top, startup)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"imports": [asdict(t) for t in timings], "startup": startup}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
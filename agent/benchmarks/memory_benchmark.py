@@ -0,0 +1,131 @@
+"""
+Per-request memory benchmark for recipe data.
+
+Builds what one /chat request holds on Deps between the search step and the
+final payload — the findByIngredients results and the parsed recipe details —
+from the bundled fixtures, once the way the pipeline used to (raw search dicts
+plus RecipeDetails models) and once as it does now (trimmed search dicts plus
+CompactRecipe records). Reports the bytes still allocated afterwards
+(tracemalloc), the build time and the time to turn the held data into the
+/chat payload.
+
+Usage (from agent/):
+    python -m benchmarks.memory_benchmark
+    python -m benchmarks.memory_benchmark --sizes 15 100 500 --json memory.json
+"""
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("LOGFIRE_IGNORE_NO_CONFIG", "1")
+
+from benchmarks.fake_spoonacular import load_fixtures  # noqa: E402
+from models.CompactRecipe import CompactRecipe, compact_search_result  # noqa: E402
+from models.RecipeDetails import RecipeDetails  # noqa: E402
+from utils.recipe_assembly import assemble_recipes  # noqa: E402
+
+
+@dataclass
+class MemoryResult:
+    representation: str
+    recipes: int
+    retained_bytes: int
+    bytes_per_recipe: float
+    build_ms: float
+    assemble_ms: float
+
+
+def upstream_payloads(n: int) -> Tuple[bytes, List[bytes]]:
+    """Encoded search response and per-recipe /information bodies for n distinct recipes"""
+    search_results, information = load_fixtures()
+    fixtures = list(information.values())
+    search, details = [], []
+    for i in range(n):
+        recipe_id = 1_000_000 + i
+        match = search_results[i % len(search_results)]
+        search.append(dict(match, id=recipe_id))
+        details.append(json.dumps(dict(fixtures[i % len(fixtures)], id=recipe_id)).encode())
+    return json.dumps(search).encode(), details
+
+
+def parse_details(body: bytes) -> RecipeDetails:
+    # same mapping as main.parse_recipe_details, without importing the app
+    data = json.loads(body)
+    data.setdefault("ingredients", data.get("extendedIngredients", []))
+    return RecipeDetails(**data)
+
+
+def build_models(search_body: bytes, detail_bodies: List[bytes]):
+    return json.loads(search_body), [parse_details(body) for body in detail_bodies]
+
+
+def build_compact(search_body: bytes, detail_bodies: List[bytes]):
+    search = [compact_search_result(recipe) for recipe in json.loads(search_body)]
+    return search, [CompactRecipe.from_details(parse_details(body)) for body in detail_bodies]
+
+
+def measure(name: str, build: Callable, n: int) -> MemoryResult:
+    search_body, detail_bodies = upstream_payloads(n)
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    search, details = build(search_body, detail_bodies)
+    build_ms = (time.perf_counter() - start) * 1000
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    assemble_recipes(details, search)
+    assemble_ms = (time.perf_counter() - start) * 1000
+    return MemoryResult(name, n, retained, retained / n, build_ms, assemble_ms)
+
+
+BUILDERS: Dict[str, Callable] = {
+    "models": build_models,
+    "compact": build_compact,
+}
+
+
+def print_report(results: List[MemoryResult]) -> None:
+    print(f"\n{'representation':<16}{'recipes':>8}{'retained KiB':>14}{'bytes/recipe':>14}{'build ms':>10}{'assemble ms':>13}")
+    for r in results:
+        print(
+            f"{r.representation:<16}{r.recipes:>8}{r.retained_bytes / 1024:>14.1f}"
+            f"{r.bytes_per_recipe:>14.0f}{r.build_ms:>10.1f}{r.assemble_ms:>13.1f}"
+        )
+    by_size: Dict[int, Dict[str, MemoryResult]] = {}
+    for r in results:
+        by_size.setdefault(r.recipes, {})[r.representation] = r
+    for n, pair in by_size.items():
+        if "models" in pair and "compact" in pair:
+            saved = 1 - pair["compact"].retained_bytes / pair["models"].retained_bytes
+            print(f"{n} recipes: compact records use {saved:.0%} less memory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request memory footprint of recipe data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 100])
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # one-time costs (pydantic validators, logfire setup) shouldn't count against the first size
+    for build in BUILDERS.values():
+        build(*upstream_payloads(1))
+
+    results = [measure(name, build, n) for n in args.sizes for name, build in BUILDERS.items()]
+    print_report(results)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Offline /chat benchmark.
+
+Starts the fake Spoonacular server and the agent app in-process (each on its
+own uvicorn thread), swaps main_agent, ingredient_formatter_agent and the
+vision model for the stubs in benchmarks.stub_models, then replays the
+bundled images/fridge-example-*.jpg uploads against /chat at a target
+concurrency. Reports per-step p50/p95/p99 (from step_complete timing_ms),
+end-to-end latency, time to first byte, throughput and peak RSS.
+
+Usage (from agent/):
+    python -m benchmarks.run_benchmark --requests 60 --concurrency 8
+    python -m benchmarks.run_benchmark --spoonacular-latency-ms 250 --error-rate 0.05 --json results.json
+    HEDGE_REQUESTS=1 python -m benchmarks.run_benchmark --tail-rate 0.05 --tail-latency-ms 3000
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import uvicorn
+from httpx import AsyncClient, Timeout
+
+from benchmarks.fake_spoonacular import FakeSpoonacularConfig, create_app
+from benchmarks.stub_models import StubLatency, StubVisionModel, formatter_model, main_agent_model
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+IMAGES_DIR = AGENT_DIR / "images"
+
+
+@dataclass
+class RequestResult:
+    latency_ms: float
+    ttfb_ms: Optional[float]
+    ok: bool
+    step_timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_images() -> List[str]:
+    images = sorted(IMAGES_DIR.glob("fridge-example-*.jpg"))
+    if not images:
+        raise SystemExit(f"No fridge-example-*.jpg images found in {IMAGES_DIR}")
+    return [
+        "data:image/jpeg;base64," + base64.b64encode(path.read_bytes()).decode()
+        for path in images
+    ]
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def load_agent_app(spoonacular_port: int, latency: StubLatency):
+    """Import main with the benchmark environment and stub models installed"""
+    os.environ["SPOONACULAR_BASE_URL"] = f"http://127.0.0.1:{spoonacular_port}"
+    os.environ.setdefault("SPOONACULAR_API_KEY", "benchmark")
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("LOGFIRE_SEND_TO_LOGFIRE", "false")
+    os.environ.setdefault("LOGFIRE_CONSOLE", "false")
+    sys.path.insert(0, str(AGENT_DIR))
+
+    import main
+
+    main.main_agent.model = main_agent_model(latency)
+    main.ingredient_formatter_agent.model = formatter_model(latency)
+    main.get_vision_model = lambda: StubVisionModel(latency)
+    return main.app
+
+
+async def run_request(client: AsyncClient, url: str, image: str) -> RequestResult:
+    start = time.perf_counter()
+    ttfb = None
+    step_timings = {}
+    completed = False
+    error = None
+
+    try:
+        async with client.stream("POST", url, json={"image_base64": image}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if ttfb is None:
+                    ttfb = (time.perf_counter() - start) * 1000
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "step_complete" and "timing_ms" in event:
+                    step_timings[event["step"]["step_name"]] = event["timing_ms"]
+                elif event.get("type") == "complete":
+                    completed = True
+                elif event.get("type") == "error":
+                    error = event.get("step", {}).get("message") or event.get("error")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    return RequestResult(
+        latency_ms=(time.perf_counter() - start) * 1000,
+        ttfb_ms=ttfb,
+        ok=completed and error is None,
+        step_timings=step_timings,
+        error=error,
+    )
+
+
+async def generate_load(url: str, images: List[str], total: int, concurrency: int) -> tuple[List[RequestResult], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with AsyncClient(timeout=Timeout(300)) as client:
+        async def one(idx: int) -> RequestResult:
+            async with semaphore:
+                return await run_request(client, url, images[idx % len(images)])
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(total)))
+        return results, time.perf_counter() - start
+
+
+def summarize(results: List[RequestResult], wall_seconds: float, concurrency: int) -> dict:
+    steps: Dict[str, List[float]] = {}
+    for result in results:
+        for step, timing in result.step_timings.items():
+            steps.setdefault(step, []).append(timing)
+
+    def stats(values: List[float]) -> dict:
+        return {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+
+    errors = [r.error for r in results if not r.ok]
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(results) / wall_seconds if wall_seconds else 0.0,
+        "steps": {step: stats(values) for step, values in steps.items()},
+        "end_to_end": stats([r.latency_ms for r in results]),
+        "ttfb": stats([r.ttfb_ms for r in results if r.ttfb_ms is not None]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\nrequests: {report['requests']}  concurrency: {report['concurrency']}  errors: {report['errors']}")
+    print(f"wall: {report['wall_seconds']:.1f}s  throughput: {report['throughput_rps']:.2f} req/s")
+    print(f"peak RSS: {report['peak_rss_mb']:.1f} MB\n")
+    print(f"{'step':<24}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    rows = list(report["steps"].items()) + [("end-to-end", report["end_to_end"]), ("time to first byte", report["ttfb"])]
+    for name, s in rows:
+        print(f"{name:<24}{s['count']:>6}{s['p50']:>11.1f}{s['p95']:>11.1f}{s['p99']:>11.1f}")
+    for sample in report["error_samples"]:
+        print(f"  error: {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline /chat benchmark with local stand-ins")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--agent-port", type=int, default=8765)
+    parser.add_argument("--spoonacular-port", type=int, default=8766)
+    parser.add_argument("--spoonacular-latency-ms", type=float, default=120.0)
+    parser.add_argument("--spoonacular-jitter-ms", type=float, default=60.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tail-rate", type=float, default=0.01, help="fraction of Spoonacular calls that are slow")
+    parser.add_argument("--tail-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--model-latency-ms", type=float, default=400.0)
+    parser.add_argument("--formatter-latency-ms", type=float, default=600.0)
+    parser.add_argument("--vision-latency-ms", type=float, default=2500.0)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    start_server(
+        create_app(FakeSpoonacularConfig(
+            latency_ms=args.spoonacular_latency_ms,
+            jitter_ms=args.spoonacular_jitter_ms,
+            error_rate=args.error_rate,
+            tail_rate=args.tail_rate,
+            tail_latency_ms=args.tail_latency_ms,
+        )),
+        args.spoonacular_port,
+    )
+    latency = StubLatency(
+        main_agent_ms=args.model_latency_ms,
+        formatter_ms=args.formatter_latency_ms,
+        vision_ms=args.vision_latency_ms,
+    )
+    start_server(load_agent_app(args.spoonacular_port, latency), args.agent_port)
+
+    results, wall_seconds = asyncio.run(generate_load(
+        f"http://127.0.0.1:{args.agent_port}/chat", load_images(), args.requests, args.concurrency
+    ))
+    report = summarize(results, wall_seconds, args.concurrency)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Stub model backends for offline benchmarks.
+
+- main_agent_model(): calls whichever tool the /chat step prompt names, then
+  answers with a short text once the tool result is back.
+- formatter_model(): returns RecipeSearchParams built from the prompt's ingredient list.
+- StubVisionModel: stands in for the google.generativeai model used by
+  analyze_fridge_contents and returns the structured item JSON.
+
+Latencies are configurable so runs approximate real model round trips.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import AsyncIterator
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelResponse,
+    RetryPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+FRIDGE_ITEMS = [
+    {"name": "whole milk", "category": "dairy", "is_food": True},
+    {"name": "large eggs", "category": "dairy", "is_food": True},
+    {"name": "cheddar cheese", "category": "dairy", "is_food": True},
+    {"name": "greek yogurt", "category": "dairy", "is_food": True},
+    {"name": "butter", "category": "dairy", "is_food": True},
+    {"name": "chicken breast", "category": "meat", "is_food": True},
+    {"name": "ground turkey", "category": "meat", "is_food": True},
+    {"name": "salmon fillet", "category": "seafood", "is_food": True},
+    {"name": "baby spinach", "category": "produce", "is_food": True},
+    {"name": "broccoli", "category": "produce", "is_food": True},
+    {"name": "red bell pepper", "category": "produce", "is_food": True},
+    {"name": "carrots", "category": "produce", "is_food": True},
+    {"name": "lemons", "category": "produce", "is_food": True},
+    {"name": "mushrooms", "category": "produce", "is_food": True},
+    {"name": "cherry tomatoes", "category": "produce", "is_food": True},
+    {"name": "Heinz ketchup", "category": "condiment", "is_food": True},
+    {"name": "soy sauce", "category": "condiment", "is_food": True},
+    {"name": "basil pesto", "category": "condiment", "is_food": True},
+    {"name": "orange juice", "category": "beverage", "is_food": True},
+    {"name": "sparkling water", "category": "beverage", "is_food": True},
+    {"name": "cooked rice", "category": "leftovers", "is_food": True},
+]
+
+# default arguments the /chat prompts ask for
+TOOL_ARGS = {
+    "search_recipes_by_ingredients": {"number": 15},
+}
+
+
+@dataclass
+class StubLatency:
+    main_agent_ms: float = 400.0  # per model turn
+    formatter_ms: float = 600.0
+    vision_ms: float = 2500.0
+    stream_chunk_ms: float = 30.0
+
+
+def _user_prompt(messages: list[ModelMessage]) -> str:
+    for message in reversed(messages):
+        for part in getattr(message, "parts", []):
+            if isinstance(part, UserPromptPart):
+                return part.content if isinstance(part.content, str) else str(part.content)
+    return ""
+
+
+def main_agent_model(latency: StubLatency) -> FunctionModel:
+    async def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(latency.main_agent_ms / 1000)
+
+        # once a tool has run, wrap up the turn with text
+        last_parts = getattr(messages[-1], "parts", [])
+        if any(isinstance(part, (ToolReturnPart, RetryPromptPart)) for part in last_parts):
+            return ModelResponse(parts=[TextPart(content="Done.")])
+
+        prompt = _user_prompt(messages)
+        for tool in info.function_tools:
+            if tool.name in prompt:
+                return ModelResponse(parts=[ToolCallPart(tool_name=tool.name, args=TOOL_ARGS.get(tool.name, {}))])
+
+        return ModelResponse(parts=[TextPart(content="Try a quick omelette with your eggs and spinach.")])
+
+    async def stream(messages: list[ModelMessage], info: AgentInfo) -> AsyncIterator[str]:
+        answer = "Try a quick omelette: whisk the eggs, wilt the spinach in butter, fold in cheddar and serve."
+        for word in answer.split(" "):
+            await asyncio.sleep(latency.stream_chunk_ms / 1000)
+            yield word + " "
+
+    return FunctionModel(respond, stream_function=stream)
+
+
+def formatter_model(latency: StubLatency) -> FunctionModel:
+    async def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(latency.formatter_ms / 1000)
+
+        prompt = _user_prompt(messages)
+        ingredients = [item.strip() for item in prompt.split(":", 1)[-1].split(",") if item.strip()]
+        result_tool = info.result_tools[0].name
+        return ModelResponse(parts=[
+            ToolCallPart(tool_name=result_tool, args={"ingredients": ",".join(ingredients[:12])})
+        ])
+
+    return FunctionModel(respond)
+
+
+class StubVisionModel:
+    """Mimics genai.GenerativeModel.generate_content for the fridge vision call"""
+
+    def __init__(self, latency: StubLatency):
+        self.latency = latency
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        # the real SDK call is blocking, so the stand-in is too
+        time.sleep(self.latency.vision_ms / 1000)
+        image = contents[-1]
+        offset = (getattr(image, "width", 0) + getattr(image, "height", 0)) % 5
+        items = FRIDGE_ITEMS[offset:] + FRIDGE_ITEMS[:offset]
+        return SimpleNamespace(text=json.dumps(items))
@@ -2,37 +2,171 @@ import os
 from pathlib import Path
 import base64
 import asyncio
+import hashlib
 import io
 import re
-import json
+import tempfile
+import time
 
 import uvicorn
-from dataclasses import dataclass
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pydantic import BaseModel, Field
 import logfire
-from httpx import AsyncClient
+from httpx import URL, AsyncClient, HTTPStatusError
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.exceptions import UserError
 from dotenv import load_dotenv
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException
+from typing import List, Literal, Optional, Dict, Any
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response
 
-# For direct Gemini vision
-import google.generativeai as genai
-from PIL import Image
+# google.generativeai and PIL (direct Gemini vision) are imported on first use
+# or by warm_up() after startup, so they stay off the import path
 
 # Import models
-from models.RecipeSearchParams import ExtractedIngredients, RecipeSearchParams
+from models.RecipeSearchParams import ExtractedIngredients, FridgeItem, RecipeSearchParams
+from models.CompactRecipe import CompactRecipe, compact_search_result
 from models.RecipeDetails import RecipeDetails
 
+# Metrics
+from utils.metrics import (
+    CHAT_REQUESTS,
+    DEGRADED_REQUESTS,
+    DEPENDENCY_HOSTS,
+    InstrumentedTransport,
+    format_server_timing,
+    observe_dependency,
+    observe_step,
+    render_metrics,
+    resumed_step,
+)
+
+# Per-request cost ledger and budgets
+from utils.ledger import (
+    CostLedger,
+    LedgerTransport,
+    current_ledger,
+    daily_budget,
+    record_agent_usage,
+    record_model_usage,
+    record_transfer,
+)
+
+# Telemetry policy (attribute budgets and sampling of verbose spans)
+from utils.telemetry import (
+    sample_request,
+    set_attribute,
+    set_verbose_attribute,
+    verbose_enabled,
+    verbose_span,
+)
+
+# Final payload assembly
+from utils.recipe_assembly import assemble_previews, assemble_recipes, index_matches
+
+# Columnar filters and stats over recipe details
+from utils.recipe_columns import NUMERIC_FIELDS, PREFERENCE_FILTERS, RecipeColumns, recipe_store
+
+# Re-ranking results against preferences in the chat message
+from utils.preference_ranking import parse_preferences, rank_previews, rank_recipes
+
+# Per-user pantry inventory kept across requests
+from utils.pantry import ingredient_set, pantry_store
+
+# Merging ingredients across several fridge photos
+from utils.ingredient_merge import merge_extractions
+
+# Shared work across /chat/batch items
+from utils.batching import BatchLoader, SingleFlight, TaskMemo
+
+# Checkpointed, resumable /chat runs
+from utils.runs import InFlightRun, in_flight_runs, new_run_id, release_in_flight, run_store
+
+# Hedged Spoonacular GETs (opt-in via HEDGE_REQUESTS)
+from utils.hedging import hedger
+
+# Upstream result caches
+from utils.cache import recipe_details_cache, search_results_cache, vision_results_cache
+from utils.cache_warmer import CACHE_SNAPSHOT_PATH, CACHE_WARMER, cache_warmer
+
+# Fast JSON for NDJSON events and upstream responses
+from utils.json_codec import dumps as json_dumps, loads as json_loads
+
+# Negotiated wire format (NDJSON/MessagePack, gzip/brotli) for streamed events
+from utils.wire import event_stream_response
+
+# Record/replay of external calls
+from utils.cassette import CASSETTE_MODE, CassetteVisionModel, cassette_transport, cassettes_enabled
+
+# Opt-in per-request profiling
+from utils.profiling import profile_path, profile_requested, profiled_stream
+
+# Token-budgeted tool output
+from utils.tool_output import compact_recipe_line, compact_stats_line, render_tool_output
+
 load_dotenv()
-logfire.configure()
+
+# readiness reported by /healthz; filled in by the lifespan and warm_up()
+startup_state: Dict[str, Any] = {"ready": False, "vision_model": False}
+
+def warm_up() -> None:
+    """One-time initialization that would otherwise land on the first /chat request"""
+    start = time.perf_counter()
+    import google.generativeai  # noqa: F401
+    from PIL import Image  # noqa: F401
+    
+    try:
+        get_vision_model()
+        startup_state["vision_model"] = True
+    except ValueError as e:
+        logfire.warning(f"Vision model not initialized: {str(e)}")
+    
+    startup_state["warm_up_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    startup_state["ready"] = True
+    logfire.info(f"Warm-up finished in {startup_state['warm_up_ms']}ms")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logfire.configure()
+    
+    # long-lived client for work that outlives a single /chat request
+    app.state.http_client = AsyncClient(transport=outbound_transport())
+    
+    # the server accepts connections while heavy imports finish in a thread;
+    # /healthz reports ready once they are done
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    background_tasks.add(warm_up_task)
+    warm_up_task.add_done_callback(background_tasks.discard)
+    
+    warmer_task = None
+    if CACHE_WARMER and os.getenv("SPOONACULAR_API_KEY"):
+        register_cache_refreshers(app.state.http_client)
+        if CACHE_SNAPSHOT_PATH:
+            try:
+                cache_warmer.load_snapshot(Path(CACHE_SNAPSHOT_PATH))
+            except Exception as e:
+                logfire.error(f"Failed to load cache snapshot: {str(e)}")
+        warmer_task = asyncio.create_task(cache_warmer.run())
+    
+    yield
+    
+    if warmer_task is not None:
+        warmer_task.cancel()
+        await cache_warmer.stop()
+        if CACHE_SNAPSHOT_PATH:
+            try:
+                cache_warmer.save_snapshot(Path(CACHE_SNAPSHOT_PATH))
+            except Exception as e:
+                logfire.error(f"Failed to save cache snapshot: {str(e)}")
+    for task in list(background_tasks):
+        task.cancel()
+    await app.state.http_client.aclose()
 
 # FastAPI instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -44,21 +178,82 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Run-Id"],
 )
 
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """
+    Add a Server-Timing header with the time spent before the response started.
+    For /chat the body is streamed after the headers, so per-step timings are
+    sent as timing_ms on each step_complete event instead.
+    """
+    start = time.perf_counter()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = format_server_timing(
+        {"app": (time.perf_counter() - start) * 1000}
+    )
+    return response
+
 @dataclass
 class Deps:
     client: AsyncClient
     spoonacular_api_key: str | None
     image_base64: str | None = None  # Add this field for image storage
+    images_base64: Optional[List[str]] = None  # all uploaded photos when there are several
     last_recipes: List[Dict] = None  # store recipes found during conversation
     last_extracted_ingredients: Optional[ExtractedIngredients] = None  # store ingredients found from image 
     last_formatted_params: Optional[RecipeSearchParams] = None  # store formatted recipe search parameters
-    all_recipe_details: Optional[List[RecipeDetails]] = None  # store details for all recipes from search
+    all_recipe_details: Optional[List[CompactRecipe]] = None  # store details for all recipes from search (compact records)
+    ledger: CostLedger = field(default_factory=CostLedger)  # tokens, points, bytes and time spent by this request
+
+def checkpoint_output(step: str, deps: Deps) -> Any:
+    """JSON-compatible output of a completed /chat step, for the run checkpoint"""
+    if step == "Extract Ingredients":
+        return deps.last_extracted_ingredients.model_dump()
+    if step == "Format Ingredients":
+        return deps.last_formatted_params.model_dump()
+    if step == "Search Recipes":
+        return deps.last_recipes
+    return [recipe.to_dict() for recipe in deps.all_recipe_details]
+
+def restore_checkpoint(deps: Deps, steps: Dict[str, Any]) -> None:
+    """Put checkpointed step outputs back on deps so those steps can be skipped"""
+    if "Extract Ingredients" in steps:
+        deps.last_extracted_ingredients = ExtractedIngredients.model_validate(steps["Extract Ingredients"])
+    if "Format Ingredients" in steps:
+        deps.last_formatted_params = RecipeSearchParams.model_validate(steps["Format Ingredients"])
+    if "Search Recipes" in steps:
+        deps.last_recipes = steps["Search Recipes"]
+    if "Get Recipe Details" in steps:
+        deps.all_recipe_details = [CompactRecipe.from_dict(r) for r in steps["Get Recipe Details"]]
+
+# steps a pantry search can hand to a later request with a similar inventory
+PANTRY_REUSED_STEPS = ("Format Ingredients", "Search Recipes", "Get Recipe Details")
+
+def reusable_steps(deps: Deps, step_states: Dict[str, Dict]) -> Dict[str, Any]:
+    """Checkpoint outputs of the completed search steps, for pantry_store.save_search"""
+    return {
+        step: checkpoint_output(step, deps)
+        for step in PANTRY_REUSED_STEPS
+        if step_states[step]["completed"]
+    }
+
+def outbound_transport() -> InstrumentedTransport:
+    """Transport for outbound httpx clients: metrics and cost accounting, plus cassettes when enabled"""
+    return InstrumentedTransport(LedgerTransport(cassette_transport()))
+
+# Spoonacular API root (overridable so benchmarks can point at a local stand-in)
+SPOONACULAR_BASE_URL = os.getenv("SPOONACULAR_BASE_URL", "https://api.spoonacular.com").rstrip("/")
+DEPENDENCY_HOSTS.setdefault(URL(SPOONACULAR_BASE_URL).host, "spoonacular")
 
 # ================================================== AGENTS ================================================== 
 
-model = GeminiModel(model_name="gemini-2.0-flash")
+# model http traffic goes through the instrumented transport so it shows up in /metrics
+model = GeminiModel(
+    model_name="gemini-2.0-flash",
+    http_client=AsyncClient(transport=outbound_transport()),
+)
 
 # Agent that converts extracted ingredients to recipe search params
 ingredient_formatter_agent = Agent(
@@ -97,15 +292,417 @@ main_agent = Agent(
     Be friendly, helpful, and provide useful cooking suggestions!"""
 )
 
+# created once by get_vision_model()
+_vision_model = None
+
+def get_vision_model():
+    """Gemini model used for fridge image analysis, configured on first use"""
+    global _vision_model
+    if _vision_model is not None:
+        return _vision_model
+    
+    # replayed responses come from cassettes, no key or client needed
+    if CASSETTE_MODE == "replay":
+        _vision_model = CassetteVisionModel(None)
+        return _vision_model
+    
+    if not os.getenv("GEMINI_API_KEY"):
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    
+    import google.generativeai as genai
+    
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    vision_model = genai.GenerativeModel('gemini-2.5-flash')
+    _vision_model = CassetteVisionModel(vision_model) if cassettes_enabled() else vision_model
+    return _vision_model
+
+# ================================================== SPOONACULAR ================================================== 
+
+# How many of the top search results to prefetch details for in preview mode
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "3"))
+
+# keep references to fire-and-forget tasks so they aren't garbage collected
+background_tasks: set = set()
+
+# identical calls already in flight for another request are awaited instead of repeated
+vision_calls = SingleFlight("vision")
+formatter_calls = SingleFlight("formatter")
+search_calls = SingleFlight("findByIngredients")
+
+def shared_client(fallback: AsyncClient) -> AsyncClient:
+    """The app-wide client, for calls other requests may be waiting on"""
+    # a request's own client closes when its client disconnects, mid-call for any followers
+    return getattr(app.state, "http_client", None) or fallback
+
+def search_cache_key(ingredients: str, number: int, ranking: int) -> str:
+    # normalized so the same fridge in a different order shares an entry
+    normalized = ",".join(sorted({i.strip().lower() for i in ingredients.split(",") if i.strip()}))
+    return f"{ranking}|{number}|{normalized}"
+
+async def search_recipes(
+    client: AsyncClient,
+    api_key: str,
+    ingredients: str,
+    number: int = 20,
+    ranking: int = 2,
+    refresh: bool = False
+) -> List[Dict]:
+    """
+    findByIngredients results, from the cache when possible.
+    With refresh=True the cache is bypassed and overwritten (used by the warmer).
+    
+    Raises:
+        httpx.HTTPStatusError: If Spoonacular returns an error status
+    """
+    cache_key = search_cache_key(ingredients, number, ranking)
+    if not refresh:
+        await cache_warmer.record(search_results_cache.name, cache_key)
+        cached = await search_results_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+    
+    async def fetch() -> List[Dict]:
+        response = await hedger.get(
+            shared_client(client),
+            f"{SPOONACULAR_BASE_URL}/recipes/findByIngredients",
+            "findByIngredients",
+            params={
+                "ingredients": ingredients,
+                "number": number,
+                "ignorePantry": True,  # Always ignore pantry items
+                "ranking": ranking,
+                "apiKey": api_key
+            }
+        )
+        response.raise_for_status()
+        
+        recipes = json_loads(response.content)
+        await search_results_cache.aset(cache_key, recipes)
+        return recipes
+    
+    # Same normalized search already running for another request: wait for it
+    return await search_calls.run(cache_key, fetch)
+
+async def fetch_recipe_details(
+    client: AsyncClient,
+    api_key: str,
+    recipe_id: int,
+    refresh: bool = False
+) -> RecipeDetails:
+    """
+    Get details (with nutrition) for one recipe, from the cache when possible.
+    With refresh=True the cache is bypassed and overwritten (used by the warmer).
+    
+    Raises:
+        httpx.HTTPStatusError: If Spoonacular returns an error status
+    """
+    cache_key = str(recipe_id)
+    if not refresh:
+        await cache_warmer.record(recipe_details_cache.name, cache_key)
+        cached = await recipe_details_cache.aget(cache_key)
+        if cached is not None:
+            return RecipeDetails.model_validate(cached)
+    
+    response = await hedger.get(
+        client,
+        f"{SPOONACULAR_BASE_URL}/recipes/{recipe_id}/information",
+        "information",
+        params={"includeNutrition": True, "apiKey": api_key}
+    )
+    response.raise_for_status()
+    
+    recipe_details = parse_recipe_details(json_loads(response.content))
+    await cache_recipe_details(recipe_details)
+    return recipe_details
+
+async def cache_recipe_details(recipe_details: RecipeDetails) -> None:
+    """Store fetched details in the details cache and the column store over it"""
+    await recipe_details_cache.aset(str(recipe_details.id), recipe_details.model_dump())
+    recipe_store.upsert(recipe_details, time.time() + recipe_details_cache.ttl_seconds)
+
+def parse_recipe_details(recipe_data: Dict) -> RecipeDetails:
+    """RecipeDetails from a Spoonacular /information (or informationBulk) recipe"""
+    recipe_id = recipe_data.get('id')
+    
+    # Log the raw API response structure
+    if verbose_enabled():
+        logfire.info(f"Raw API response for recipe {recipe_id}", 
+                   has_extendedIngredients='extendedIngredients' in recipe_data,
+                   has_ingredients='ingredients' in recipe_data,
+                   has_instructions='analyzedInstructions' in recipe_data,
+                   extendedIngredient_count=len(recipe_data.get('extendedIngredients', [])),
+                   instruction_count=len(recipe_data.get('analyzedInstructions', [])))
+    
+    # Map extendedIngredients to ingredients if needed
+    if 'extendedIngredients' in recipe_data and 'ingredients' not in recipe_data:
+        recipe_data['ingredients'] = recipe_data['extendedIngredients']
+    
+    return RecipeDetails(**recipe_data)
+
+# informationBulk accepts up to 100 ids per call
+BULK_DETAILS_CHUNK = 100
+
+async def fetch_recipe_details_bulk(client: AsyncClient, api_key: str, recipe_ids: List[int]) -> Dict[int, RecipeDetails]:
+    """
+    Details for many recipes: cached ones from the cache, the rest through
+    informationBulk (one call per 100 ids instead of one per recipe).
+    
+    Raises:
+        httpx.HTTPStatusError: If Spoonacular returns an error status
+    """
+    details = {}
+    missing = []
+    for recipe_id in dict.fromkeys(recipe_ids):
+        cached = await recipe_details_cache.aget(str(recipe_id))
+        if cached is not None:
+            details[recipe_id] = RecipeDetails.model_validate(cached)
+        else:
+            missing.append(recipe_id)
+    
+    for i in range(0, len(missing), BULK_DETAILS_CHUNK):
+        chunk = missing[i:i + BULK_DETAILS_CHUNK]
+        response = await hedger.get(
+            client,
+            f"{SPOONACULAR_BASE_URL}/recipes/informationBulk",
+            "informationBulk",
+            params={"ids": ",".join(str(recipe_id) for recipe_id in chunk), "includeNutrition": True, "apiKey": api_key}
+        )
+        response.raise_for_status()
+        
+        for recipe_data in json_loads(response.content):
+            recipe_details = parse_recipe_details(recipe_data)
+            await cache_recipe_details(recipe_details)
+            details[recipe_details.id] = recipe_details
+    
+    return details
+
+def register_cache_refreshers(client: AsyncClient) -> None:
+    """Let the cache warmer re-fetch popular details and searches"""
+    async def refresh_details(key: str) -> None:
+        await fetch_recipe_details(client, os.getenv("SPOONACULAR_API_KEY"), int(key), refresh=True)
+    
+    async def refresh_search(key: str) -> None:
+        ranking, number, ingredients = key.split("|", 2)
+        await search_recipes(
+            client, os.getenv("SPOONACULAR_API_KEY"), ingredients, int(number), int(ranking), refresh=True
+        )
+    
+    cache_warmer.register(recipe_details_cache, refresh_details)
+    cache_warmer.register(search_results_cache, refresh_search)
+
+def prefetch_recipe_details(recipe_ids: List[int]) -> None:
+    """Warm the details cache for recipes the user is likely to open"""
+    api_key = os.getenv("SPOONACULAR_API_KEY")
+    if not api_key or not recipe_ids:
+        return
+    
+    async def prefetch():
+        missing = [recipe_id for recipe_id in recipe_ids if not await recipe_details_cache.acontains(str(recipe_id))]
+        if not missing:
+            return
+        results = await asyncio.gather(
+            *(fetch_recipe_details(app.state.http_client, api_key, recipe_id) for recipe_id in missing),
+            return_exceptions=True
+        )
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            logfire.warning(f"Prefetch failed for {len(failed)} of {len(missing)} recipes: {failed[0]}")
+    
+    task = asyncio.create_task(prefetch())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
 # ================================================== TOOLS ================================================== 
 
+# Response schema for the vision call: a compact array of FridgeItem objects
+FRIDGE_ITEMS_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "name": {"type": "STRING"},
+            "category": {"type": "STRING"},
+            "is_food": {"type": "BOOLEAN"},
+        },
+        "required": ["name", "category", "is_food"],
+    },
+}
+
+# Compiled once for the ingredient cleanup paths below
+LIST_MARKER_RE = re.compile(r'^[\d\-\•\*\.\s]+')
+PREP_WORDS_RE = re.compile(r'\b(fresh|organic|whole|sliced|chopped)\b', re.IGNORECASE)
+
+def clean_ingredient_lines(ingredients_text: str) -> List[str]:
+    """
+    Fallback parser for free-text vision responses: one item per line, with
+    headers, numbering and formatting artifacts removed.
+    """
+    ingredients_list = [item.strip() for item in ingredients_text.split('\n') if item.strip()]
+    
+    # Log raw response for debugging
+    logfire.info(f"Raw response contained {len(ingredients_list)} lines")
+    
+    # Remove any numbering, bullets, headers, and filter out non-ingredient lines
+    cleaned_ingredients = []
+    filtered_count = 0
+    
+    for item in ingredients_list:
+        # Skip lines that are headers or formatting
+        if any(skip_word in item.lower() for skip_word in [
+            'shelf', 'compartment', 'drawer', 'left to right', 
+            'here\'s', 'list of', 'organized by', 'please note',
+            'assuming', ':**', 'various fruits...', '...', 'i can see'
+        ]):
+            filtered_count += 1
+            continue
+        
+        # Remove common prefixes like "1.", "•", "-", etc.
+        cleaned_item = LIST_MARKER_RE.sub('', item)
+        
+        # Remove any trailing asterisks or formatting
+        cleaned_item = cleaned_item.rstrip('*:')
+        
+        # Skip empty items or very short items (likely formatting artifacts)
+        if cleaned_item and len(cleaned_item) > 2 and any(c.isalpha() for c in cleaned_item):
+            cleaned_ingredients.append(cleaned_item)
+        else:
+            filtered_count += 1
+    
+    logfire.info(f"Filtered out {filtered_count} non-ingredient lines, kept {len(cleaned_ingredients)} ingredients")
+    return cleaned_ingredients
+
+
+# Prompt for the vision call (also part of the vision cache key)
+VISION_PROMPT = """Analyze this refrigerator image and list EVERY SINGLE visible item.
+
+Return a JSON array with one object per item: {"name": ..., "category": ..., "is_food": ...}
+Don't add shelf names or sections - just the actual items.
+
+Be SPECIFIC with names:
+- Include brand names when visible (e.g., "Heinz ketchup" not just "ketchup")
+- Be specific about types (e.g., "whole milk" not just "milk")
+- Name specific fruits/vegetables (e.g., "red bell pepper" not just "pepper")
+
+category is one of: produce, dairy, meat, seafood, condiment, grain, beverage, leftovers, other.
+is_food is false for anything that is not food (containers, medicine, etc.).
+
+List EVERYTHING you can see: every condiment, dairy product, fruit, vegetable,
+beverage, jar, container, package and other food item."""
+
+# Photos analyzed at once per request (each is a separate Gemini call)
+VISION_CONCURRENCY = int(os.getenv("VISION_CONCURRENCY", "3"))
+
+def decode_image(image_base64: str) -> bytes:
+    """Decode a base64 image or data URL, tolerating missing padding"""
+    # If it's a data URL, extract the base64 part
+    if ',' in image_base64 and image_base64.startswith('data:'):
+        image_base64 = image_base64.split(',')[1]
+    
+    # Clean whitespace
+    image_base64 = image_base64.strip()
+    
+    # Add padding if needed
+    missing_padding = len(image_base64) % 4
+    if missing_padding:
+        image_base64 += '=' * (4 - missing_padding)
+    
+    return base64.b64decode(image_base64)
+
+async def extract_ingredients_from_image(image_bytes: bytes) -> ExtractedIngredients:
+    """Run the vision call (or reuse its cached answer) for one photo"""
+    import google.generativeai as genai
+    from PIL import Image
+    
+    image = Image.open(io.BytesIO(image_bytes))
+    logfire.info(f"Successfully decoded image: {image.format} {image.width}x{image.height}")
+    
+    # The same photo with the same prompt gives the same answer, so reuse it
+    vision_key = hashlib.sha256(VISION_PROMPT.encode() + image_bytes).hexdigest()
+    ingredients_text = await vision_results_cache.aget(vision_key)
+    if ingredients_text is not None:
+        logfire.info("Using cached vision result")
+    else:
+        async def call_vision() -> str:
+            model = get_vision_model()
+            
+            # Generate content with Gemini, constrained to the item schema. The SDK
+            # call is blocking, so it runs in a thread to let other photos proceed.
+            with observe_dependency("gemini", "vision"):
+                response = await asyncio.to_thread(
+                    model.generate_content,
+                    [VISION_PROMPT, image],
+                    generation_config=genai.GenerationConfig(
+                        response_mime_type="application/json",
+                        response_schema=FRIDGE_ITEMS_SCHEMA,
+                    ),
+                )
+            text = response.text.strip()
+            await vision_results_cache.aset(vision_key, text)
+            usage = getattr(response, "usage_metadata", None)
+            record_model_usage(
+                "vision",
+                getattr(usage, "prompt_token_count", 0) or 0,
+                getattr(usage, "candidates_token_count", 0) or 0,
+            )
+            record_transfer("gemini", sent=len(image_bytes), received=len(text))
+            return text
+        
+        # The same photo uploaded by a concurrent request shares its vision call
+        ingredients_text = await vision_calls.run(vision_key, call_vision)
+    
+    # Parse the structured response, falling back to line cleaning for free text
+    try:
+        items = [FridgeItem.model_validate(item) for item in json_loads(ingredients_text)]
+        cleaned_ingredients = [item.name.strip() for item in items if item.name.strip()]
+        logfire.info(f"Parsed {len(items)} structured items from vision response")
+    except (ValueError, TypeError) as parse_error:
+        logfire.warning(f"Vision response was not valid item JSON, using line fallback: {parse_error}")
+        items = []
+        cleaned_ingredients = clean_ingredient_lines(ingredients_text)
+    
+    return ExtractedIngredients(ingredients=cleaned_ingredients, items=items)
+
+async def extract_from_images(
+    images_bytes: List[bytes],
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> tuple[ExtractedIngredients, int]:
+    """
+    Extract ingredients from every photo concurrently, a few vision calls at a
+    time, and merge them, dropping near-duplicates seen in several shots.
+    
+    Returns:
+        The merged ingredients and how many photos failed
+    
+    Raises:
+        Exception: The first failure, if every photo failed
+    """
+    semaphore = semaphore or asyncio.Semaphore(VISION_CONCURRENCY)
+    
+    async def extract(image_bytes: bytes) -> ExtractedIngredients:
+        async with semaphore:
+            return await extract_ingredients_from_image(image_bytes)
+    
+    results = await asyncio.gather(*(extract(b) for b in images_bytes), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, Exception)]
+    if len(failures) == len(results):
+        raise failures[0]
+    if failures:
+        logfire.warning(f"Vision failed for {len(failures)} of {len(results)} photos: {failures[0]}")
+    
+    if len(results) == 1:
+        return results[0], 0
+    # keep each result's upload position so items point at the right photo when some failed
+    succeeded = [(i, r) for i, r in enumerate(results) if not isinstance(r, Exception)]
+    return merge_extractions(succeeded), len(failures)
+
 @main_agent.tool
 async def analyze_fridge_contents(
     ctx: RunContext[Deps], 
     image_base64: Optional[str] = None
 ) -> str:
     """
-    Analyze a fridge image to extract ALL visible ingredients using Gemini directly.
+    Analyze fridge photos to extract ALL visible ingredients using Gemini directly.
+    When several photos were uploaded they are analyzed together and merged.
     
     Args:
         image_base64: Base64 encoded image of the fridge interior (optional - will use from context if not provided)
@@ -115,129 +712,43 @@ async def analyze_fridge_contents(
     """
     with logfire.span("analyze_fridge_contents") as span:
         try:
-            # Use provided image or get from context
-            if not image_base64 and ctx.deps.image_base64:
-                image_base64 = ctx.deps.image_base64
-                logfire.info("Using image from context")
+            # Use provided image or get the uploaded photos from context
+            if image_base64:
+                images = [image_base64]
+            else:
+                images = ctx.deps.images_base64 or ([ctx.deps.image_base64] if ctx.deps.image_base64 else [])
+                if images:
+                    logfire.info("Using image from context")
             
-            if not image_base64:
+            if not images:
                 error_msg = "No image provided. Please upload a fridge image."
                 span.set_attribute("status", "no_image")
                 return error_msg
             
+            span.set_attribute("image_count", len(images))
+            
             # Try to decode base64
             try:
-                # If it's a data URL, extract the base64 part
-                if ',' in image_base64 and image_base64.startswith('data:'):
-                    image_base64 = image_base64.split(',')[1]
-                
-                # Clean whitespace
-                image_base64 = image_base64.strip()
-                
-                # Add padding if needed
-                missing_padding = len(image_base64) % 4
-                if missing_padding:
-                    image_base64 += '=' * (4 - missing_padding)
-                
-                # Decode
-                image_bytes = base64.b64decode(image_base64)
-                image = Image.open(io.BytesIO(image_bytes))
-                
-                logfire.info(f"Successfully decoded image: {image.format} {image.width}x{image.height}")
-                
+                images_bytes = [decode_image(image) for image in images]
             except Exception as e:
                 # If direct decode fails, try using the original from context
                 if ctx.deps.image_base64 and ctx.deps.image_base64 != image_base64:
                     logfire.info("Trying with original image from context")
-                    image_base64 = ctx.deps.image_base64
-                    if ',' in image_base64 and image_base64.startswith('data:'):
-                        image_base64 = image_base64.split(',')[1]
-                    image_base64 = image_base64.strip()
-                    missing_padding = len(image_base64) % 4
-                    if missing_padding:
-                        image_base64 += '=' * (4 - missing_padding)
-                    image_bytes = base64.b64decode(image_base64)
-                    image = Image.open(io.BytesIO(image_bytes))
+                    images_bytes = [decode_image(image) for image in ctx.deps.images_base64 or [ctx.deps.image_base64]]
                 else:
                     raise e
             
-            # Configure Gemini
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            
-            if not os.getenv("GEMINI_API_KEY"):
-                raise ValueError("GEMINI_API_KEY not found in environment variables")
-            
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
-            # Create detailed prompt for Gemini
-            prompt = """Analyze this refrigerator image and list EVERY SINGLE visible item.
-
-IMPORTANT: Just list the items, one per line. No headers, no sections, no explanations.
-Don't say "Top shelf" or "Middle shelf" - just list the actual food items.
-
-Be SPECIFIC with names:
-- Include brand names when visible (e.g., "Heinz ketchup" not just "ketchup")
-- Be specific about types (e.g., "whole milk" not just "milk")
-- Name specific fruits/vegetables (e.g., "red bell pepper" not just "pepper")
-
-List EVERYTHING you can see:
-- Every condiment
-- Every dairy product
-- Every fruit (individually)
-- Every vegetable (individually)
-- Every beverage
-- Every jar, container, package
-- Every other food item
-
-Format: Just the item name, one per line. Nothing else."""
-            
-            # Generate content with Gemini
-            response = model.generate_content([prompt, image])
-            
-            # Parse the response into a list of ingredients
-            ingredients_text = response.text.strip()
-            ingredients_list = [item.strip() for item in ingredients_text.split('\n') if item.strip()]
-            
-            # Log raw response for debugging
-            logfire.info(f"Raw response contained {len(ingredients_list)} lines")
-            
-            # Remove any numbering, bullets, headers, and filter out non-ingredient lines
-            cleaned_ingredients = []
-            filtered_count = 0
-            
-            for item in ingredients_list:
-                # Skip lines that are headers or formatting
-                if any(skip_word in item.lower() for skip_word in [
-                    'shelf', 'compartment', 'drawer', 'left to right', 
-                    'here\'s', 'list of', 'organized by', 'please note',
-                    'assuming', ':**', 'various fruits...', '...', 'i can see'
-                ]):
-                    filtered_count += 1
-                    continue
-                
-                # Remove common prefixes like "1.", "•", "-", etc.
-                cleaned_item = re.sub(r'^[\d\-\•\*\.\s]+', '', item)
-                
-                # Remove any trailing asterisks or formatting
-                cleaned_item = cleaned_item.rstrip('*:')
-                
-                # Skip empty items or very short items (likely formatting artifacts)
-                if cleaned_item and len(cleaned_item) > 2 and any(c.isalpha() for c in cleaned_item):
-                    cleaned_ingredients.append(cleaned_item)
-                else:
-                    filtered_count += 1
-            
-            logfire.info(f"Filtered out {filtered_count} non-ingredient lines, kept {len(cleaned_ingredients)} ingredients")
-            
-            # Create ExtractedIngredients object
-            extracted_ingredients = ExtractedIngredients(ingredients=cleaned_ingredients)
+            extracted_ingredients, failed_count = await extract_from_images(images_bytes)
+            if failed_count:
+                span.set_attribute("failed_images", failed_count)
+            cleaned_ingredients = extracted_ingredients.ingredients
             
             # Store in context
             ctx.deps.last_extracted_ingredients = extracted_ingredients
             
             # Log all found ingredients
             span.set_attribute("total_ingredients_count", len(cleaned_ingredients))
-            span.set_attribute("all_ingredients", cleaned_ingredients)
+            set_verbose_attribute(span, "all_ingredients", cleaned_ingredients)
             span.set_attribute("analysis_status", "success")
             
             logfire.info(f"Successfully extracted {len(cleaned_ingredients)} ingredients")
@@ -267,6 +778,48 @@ Format: Just the item name, one per line. Nothing else."""
             else:
                 return f"Failed to analyze the image: {str(e)}"
 
+def fallback_search_params(cooking_candidates: List[str]) -> Optional[RecipeSearchParams]:
+    """Basic formatting without the formatter agent: the first 15 cleaned cooking ingredients"""
+    cooking_ingredients = []
+    for ing in cooking_candidates:
+        # Skip beverages and non-cooking items
+        ing_lower = ing.lower()
+        if not any(skip in ing_lower for skip in ['water', 'ice', 'soda', 'beer', 'wine bottle']):
+            # Clean up the ingredient name
+            clean_ing = PREP_WORDS_RE.sub('', ing)
+            clean_ing = clean_ing.strip()
+            if clean_ing:
+                cooking_ingredients.append(clean_ing)
+    
+    # Take top 15 ingredients
+    selected_ingredients = cooking_ingredients[:15]
+    if not selected_ingredients:
+        return None
+    return RecipeSearchParams(ingredients=",".join(selected_ingredients))
+
+async def run_ingredient_formatter(cooking_candidates: List[str]) -> Optional[RecipeSearchParams]:
+    """Formatter agent output for the ingredients; identical lists in flight share one run"""
+    async def run() -> Optional[RecipeSearchParams]:
+        result = await ingredient_formatter_agent.run(
+            f"Convert these ingredients for recipe search: {', '.join(cooking_candidates)}"
+        )
+        record_agent_usage("formatter", result.usage())
+        return result.data
+    
+    # order is kept: the formatter is asked to pick the most useful ingredients
+    key = tuple(name.strip().lower() for name in cooking_candidates)
+    return await formatter_calls.run(key, run)
+
+async def format_search_params(cooking_candidates: List[str]) -> Optional[RecipeSearchParams]:
+    """Formatter agent output for the ingredients, or the basic fallback if it fails"""
+    try:
+        formatted = await run_ingredient_formatter(cooking_candidates)
+        if formatted and formatted.ingredients:
+            return formatted
+    except Exception as e:
+        logfire.error(f"Formatter agent error: {str(e)}")
+    return fallback_search_params(cooking_candidates)
+
 @main_agent.tool
 async def format_ingredients_for_recipes(
     ctx: RunContext[Deps]
@@ -294,26 +847,26 @@ async def format_ingredients_for_recipes(
             
             logfire.info(f"Formatting {ingredients_count} ingredients for recipe search")
             
-            # Use the ingredient formatter agent to convert to recipe search params
-            # Create a proper string representation of the ingredients
-            ingredients_str = ", ".join(extracted.ingredients)
+            # Beverages and non-food items flagged by the vision call are dropped up front
+            cooking_candidates = extracted.cooking_ingredients()
+            span.set_attribute("skipped_non_cooking_items", ingredients_count - len(cooking_candidates))
             
+            # Use the ingredient formatter agent to convert to recipe search params
+            # (shared with any identical list being formatted for another request)
             try:
-                formatted_params = await ingredient_formatter_agent.run(
-                    f"Convert these ingredients for recipe search: {ingredients_str}"
-                )
+                formatted_params = await run_ingredient_formatter(cooking_candidates)
                 
                 # Check if formatting was successful
-                if formatted_params.data and formatted_params.data.ingredients:
-                    span.set_attribute("formatted_ingredients", formatted_params.data.ingredients)
-                    formatted_count = len(formatted_params.data.ingredients.split(','))
+                if formatted_params and formatted_params.ingredients:
+                    set_attribute(span, "formatted_ingredients", formatted_params.ingredients)
+                    formatted_count = len(formatted_params.ingredients.split(','))
                     span.set_attribute("formatted_count", formatted_count)
                     span.set_attribute("status", "success")
                     
                     # Store the formatted params for future use
-                    ctx.deps.last_formatted_params = formatted_params.data
+                    ctx.deps.last_formatted_params = formatted_params
                     
-                    ingredient_list = formatted_params.data.ingredients
+                    ingredient_list = formatted_params.ingredients
                     logfire.info(f"Successfully formatted {formatted_count} ingredients: {ingredient_list}")
                     
                     return f"Formatted {formatted_count} key ingredients for recipe search: {ingredient_list}"
@@ -329,31 +882,15 @@ async def format_ingredients_for_recipes(
                 logfire.error(f"Formatter agent error: {str(format_error)}")
                 
                 # Fallback: do basic formatting ourselves
-                # Select the most common cooking ingredients
-                cooking_ingredients = []
-                for ing in extracted.ingredients:
-                    # Skip beverages and non-cooking items
-                    ing_lower = ing.lower()
-                    if not any(skip in ing_lower for skip in ['water', 'ice', 'soda', 'beer', 'wine bottle']):
-                        # Clean up the ingredient name
-                        clean_ing = re.sub(r'\b(fresh|organic|whole|sliced|chopped)\b', '', ing, flags=re.IGNORECASE)
-                        clean_ing = clean_ing.strip()
-                        if clean_ing:
-                            cooking_ingredients.append(clean_ing)
-                
-                # Take top 15 ingredients
-                selected_ingredients = cooking_ingredients[:15]
-                if selected_ingredients:
-                    formatted_str = ",".join(selected_ingredients)
-                    
-                    # Create a RecipeSearchParams object manually
-                    from models.RecipeSearchParams import RecipeSearchParams
-                    ctx.deps.last_formatted_params = RecipeSearchParams(ingredients=formatted_str)
+                fallback_params = fallback_search_params(cooking_candidates)
+                if fallback_params:
+                    formatted_str = fallback_params.ingredients
+                    ctx.deps.last_formatted_params = fallback_params
                     
                     span.set_attribute("status", "fallback_success")
-                    span.set_attribute("fallback_ingredients", formatted_str)
+                    set_attribute(span, "fallback_ingredients", formatted_str)
                     
-                    return f"Formatted {len(selected_ingredients)} ingredients using fallback method: {formatted_str}"
+                    return f"Formatted {len(formatted_str.split(','))} ingredients using fallback method: {formatted_str}"
                 else:
                     return "Could not format ingredients for recipe search. Please try with different ingredients."
                 
@@ -401,31 +938,19 @@ async def search_recipes_by_ingredients(
             
             # Get the formatted ingredients
             ingredients = ctx.deps.last_formatted_params.ingredients
-            span.set_attribute("ingredients", ingredients)
+            set_attribute(span, "ingredients", ingredients)
             span.set_attribute("number_requested", number)
             span.set_attribute("ranking", ranking)
             
             logfire.info(f"Searching recipes with ingredients: {ingredients}")
             
-            # Prepare API request
-            base_url = "https://api.spoonacular.com/recipes/findByIngredients"
-            params = {
-                "ingredients": ingredients,
-                "number": number,
-                "ignorePantry": True,  # Always ignore pantry items
-                "ranking": ranking,
-                "apiKey": ctx.deps.spoonacular_api_key
-            }
-            
-            # Make API request
-            response = await ctx.deps.client.get(base_url, params=params)
-            response.raise_for_status()
-            
-            recipes = response.json()
+            recipes = await search_recipes(
+                ctx.deps.client, ctx.deps.spoonacular_api_key, ingredients, number, ranking
+            )
             span.set_attribute("recipes_found", len(recipes))
             
-            # Store recipes in context
-            ctx.deps.last_recipes = recipes
+            # Store recipes in context, trimmed to the fields later steps read
+            ctx.deps.last_recipes = [compact_search_result(recipe) for recipe in recipes]
             
             # Log recipe details
             if recipes:
@@ -440,11 +965,11 @@ async def search_recipes_by_ingredients(
                     used_count = recipe.get('usedIngredientCount', 0)
                     missed_count = recipe.get('missedIngredientCount', 0)
                     
-                    # Log individual recipe
-                    span.set_attribute(f"recipe_{i}_id", recipe_id)
-                    span.set_attribute(f"recipe_{i}_title", title)
-                    span.set_attribute(f"recipe_{i}_used_ingredients", used_count)
-                    span.set_attribute(f"recipe_{i}_missed_ingredients", missed_count)
+                    # Log individual recipe (sampled requests only)
+                    set_verbose_attribute(span, f"recipe_{i}_id", recipe_id)
+                    set_verbose_attribute(span, f"recipe_{i}_title", title)
+                    set_verbose_attribute(span, f"recipe_{i}_used_ingredients", used_count)
+                    set_verbose_attribute(span, f"recipe_{i}_missed_ingredients", missed_count)
                     
                     # Get ingredient details
                     used_ingredients = [ing['name'] for ing in recipe.get('usedIngredients', [])]
@@ -458,8 +983,17 @@ async def search_recipes_by_ingredients(
                 if len(recipes) > 10:
                     summary_lines.append(f"\n... and {len(recipes) - 10} more recipes")
                 
+                # Compact output: one line per recipe with match counts
+                compact_lines = [f"recipes={len(recipes)}\nid|title|used|missed: missing ingredients"]
+                for recipe in recipes:
+                    missed_names = [ing['name'] for ing in recipe.get('missedIngredients', [])[:3]]
+                    compact_lines.append(
+                        f"{recipe.get('id')}|{recipe.get('title', 'Unknown')}"
+                        f"|{recipe.get('usedIngredientCount', 0)}|{recipe.get('missedIngredientCount', 0)}: {','.join(missed_names)}"
+                    )
+                
                 span.set_attribute("status", "success")
-                return ''.join(summary_lines)
+                return render_tool_output("search_recipes_by_ingredients", ''.join(summary_lines), compact_lines)
             else:
                 span.set_attribute("status", "no_recipes_found")
                 return "No recipes found with those ingredients. Try using fewer or different ingredients."
@@ -529,46 +1063,24 @@ async def get_all_recipe_details(
                 recipe_id = recipe.get('id')
                 recipe_title = recipe.get('title', 'Unknown')
                 
-                with logfire.span(f"fetch_recipe_{idx+1}") as recipe_span:
+                with verbose_span(f"fetch_recipe_{idx+1}") as recipe_span:
                     recipe_span.set_attribute("recipe_id", recipe_id)
                     recipe_span.set_attribute("recipe_title", recipe_title)
                     
                     try:
-                        # Make API request
-                        base_url = f"https://api.spoonacular.com/recipes/{recipe_id}/information"
-                        params = {
-                            "includeNutrition": True,
-                            "apiKey": ctx.deps.spoonacular_api_key
-                        }
-                        
-                        response = await ctx.deps.client.get(base_url, params=params)
-                        response.raise_for_status()
-                        
-                        recipe_data = response.json()
-                        
-                        # Log the raw API response structure
-                        logfire.info(f"Raw API response for recipe {recipe_id}", 
-                                   has_extendedIngredients='extendedIngredients' in recipe_data,
-                                   has_ingredients='ingredients' in recipe_data,
-                                   has_instructions='analyzedInstructions' in recipe_data,
-                                   extendedIngredient_count=len(recipe_data.get('extendedIngredients', [])),
-                                   instruction_count=len(recipe_data.get('analyzedInstructions', [])))
-                        
-                        # Map extendedIngredients to ingredients if needed
-                        if 'extendedIngredients' in recipe_data and 'ingredients' not in recipe_data:
-                            recipe_data['ingredients'] = recipe_data['extendedIngredients']
-                            logfire.info(f"Mapped extendedIngredients to ingredients for recipe {recipe_id}")
-                        
-                        # Parse into RecipeDetails model
-                        recipe_details = RecipeDetails(**recipe_data)
+                        # Cached details, or a Spoonacular request on a miss
+                        recipe_details = await fetch_recipe_details(
+                            ctx.deps.client, ctx.deps.spoonacular_api_key, recipe_id
+                        )
                         
                         # Verify parsing worked
-                        logfire.info(f"Parsed recipe {recipe_id}", 
-                                   title=recipe_details.title,
-                                   ingredient_count=len(recipe_details.ingredients),
-                                   instruction_count=len(recipe_details.analyzedInstructions),
-                                   has_nutrition=recipe_details.nutrition is not None,
-                                   first_ingredient=recipe_details.ingredients[0].name if recipe_details.ingredients else "None")
+                        if verbose_enabled():
+                            logfire.info(f"Parsed recipe {recipe_id}", 
+                                       title=recipe_details.title,
+                                       ingredient_count=len(recipe_details.ingredients),
+                                       instruction_count=len(recipe_details.analyzedInstructions),
+                                       has_nutrition=recipe_details.nutrition is not None,
+                                       first_ingredient=recipe_details.ingredients[0].name if recipe_details.ingredients else "None")
                         
                         all_recipe_details.append(recipe_details)
                         
@@ -579,15 +1091,12 @@ async def get_all_recipe_details(
                         logfire.error(f"✗ Failed to get details for recipe {idx+1}: {recipe_title} - {str(e)}")
                         continue
             
-            # Store all details in context
-            ctx.deps.all_recipe_details = all_recipe_details
-            
             # Log summary statistics
             span.set_attribute("successful_fetches", len(all_recipe_details))
             span.set_attribute("failed_fetches", len(failed_recipes))
             
             if failed_recipes:
-                span.set_attribute("failed_recipes", failed_recipes)
+                set_attribute(span, "failed_recipes", failed_recipes)
             
             # Create comprehensive summary
             summary_lines = [f"📚 Retrieved details for {len(all_recipe_details)} recipes:\n"]
@@ -600,26 +1109,27 @@ async def get_all_recipe_details(
             
             # Create detailed summaries
             all_recipes_data = []
+            record_payload = verbose_enabled()
             
             for idx, recipe in enumerate(all_recipe_details, 1):
-                # Store structured data
-                recipe_data = {
-                    "index": idx,
-                    "id": recipe.id,
-                    "title": recipe.title,
-                    "ready_in_minutes": recipe.readyInMinutes,
-                    "calories": recipe.nutrition.calories if recipe.nutrition else None,
-                    "protein": recipe.nutrition.protein if recipe.nutrition else None,
-                    "carbs": recipe.nutrition.carbohydrates if recipe.nutrition else None,
-                    "fat": recipe.nutrition.fat if recipe.nutrition else None,
-                    "ingredient_count": len(recipe.ingredients),
-                    "instruction_steps": len(recipe.analyzedInstructions),
-                    "ingredients": [{"name": ing.name, "amount": ing.amount, "unit": ing.unit} 
-                                  for ing in recipe.ingredients],
-                    "analyzedInstructions": [{"number": step.number, "step": step.step, "minutes": step.length} 
-                                   for step in recipe.analyzedInstructions]
-                }
-                all_recipes_data.append(recipe_data)
+                # Store structured data (only built when the request is sampled)
+                if record_payload:
+                    all_recipes_data.append({
+                        "index": idx,
+                        "id": recipe.id,
+                        "title": recipe.title,
+                        "ready_in_minutes": recipe.readyInMinutes,
+                        "calories": recipe.nutrition.calories if recipe.nutrition else None,
+                        "protein": recipe.nutrition.protein if recipe.nutrition else None,
+                        "carbs": recipe.nutrition.carbohydrates if recipe.nutrition else None,
+                        "fat": recipe.nutrition.fat if recipe.nutrition else None,
+                        "ingredient_count": len(recipe.ingredients),
+                        "instruction_steps": len(recipe.analyzedInstructions),
+                        "ingredients": [{"name": ing.name, "amount": ing.amount, "unit": ing.unit} 
+                                      for ing in recipe.ingredients],
+                        "analyzedInstructions": [{"number": step.number, "step": step.step, "minutes": step.length} 
+                                       for step in recipe.analyzedInstructions]
+                    })
                 
                 # Create readable summary
                 summary_lines.append(f"\n{idx}. {recipe.title}")
@@ -656,34 +1166,32 @@ async def get_all_recipe_details(
                 summary_lines.append("")  # Empty line between recipes
             
             # Store all structured data
-            span.set_attribute("all_recipes_details", all_recipes_data)
+            set_verbose_attribute(span, "all_recipes_details", all_recipes_data)
             
             # Summary statistics
             summary_lines.append("\n" + "=" * 80)
             summary_lines.append(f"\n📊 SUMMARY STATISTICS:")
             summary_lines.append(f"   • Total recipes detailed: {len(all_recipe_details)}")
             
+            # Vectorized over the recipes' columns; recipes with missing or 0 calories are skipped
+            columns = RecipeColumns.from_recipes(all_recipe_details)
             if all_recipe_details:
-                avg_time = sum(r.readyInMinutes for r in all_recipe_details) / len(all_recipe_details)
-                # Calculate average calories only for recipes that have nutrition info
-                recipes_with_calories = [r for r in all_recipe_details if r.nutrition and r.nutrition.calories]
-                if recipes_with_calories:
-                    avg_calories = sum(r.nutrition.calories for r in recipes_with_calories) / len(recipes_with_calories)
-                else:
-                    avg_calories = 0
-                avg_ingredients = sum(len(r.ingredients) for r in all_recipe_details) / len(all_recipe_details)
+                stats = columns.query()
+                with_calories = columns.query().nonzero("calories")
+                avg_calories = with_calories.aggregate("calories")["mean"]
                 
-                summary_lines.append(f"   • Average cooking time: {avg_time:.0f} minutes")
-                if avg_calories > 0:
+                summary_lines.append(f"   • Average cooking time: {stats.aggregate('readyInMinutes')['mean']:.0f} minutes")
+                if avg_calories:
                     summary_lines.append(f"   • Average calories: {avg_calories:.0f}")
-                summary_lines.append(f"   • Average ingredients needed: {avg_ingredients:.0f}")
+                summary_lines.append(f"   • Average ingredients needed: {stats.aggregate('ingredientCount')['mean']:.0f}")
                 
                 # Find quickest and healthiest options
-                quickest = min(all_recipe_details, key=lambda r: r.readyInMinutes)
+                quickest = all_recipe_details[stats.argmin("readyInMinutes")]
                 summary_lines.append(f"\n   🏃 Quickest option: {quickest.title} ({quickest.readyInMinutes} min)")
                 
-                if recipes_with_calories:
-                    lowest_cal = min(recipes_with_calories, key=lambda r: r.nutrition.calories)
+                lowest_cal_idx = with_calories.argmin("calories")
+                if lowest_cal_idx is not None:
+                    lowest_cal = all_recipe_details[lowest_cal_idx]
                     summary_lines.append(f"   🥗 Lowest calorie: {lowest_cal.title} ({lowest_cal.nutrition.calories} cal)")
             
             if failed_recipes:
@@ -692,7 +1200,13 @@ async def get_all_recipe_details(
             span.set_attribute("status", "success")
             logfire.info(f"Successfully retrieved details for {len(all_recipe_details)} recipes")
             
-            return ''.join(summary_lines)
+            compact_lines = [compact_stats_line(columns, len(failed_recipes))]
+            compact_lines.extend(compact_recipe_line(recipe) for recipe in all_recipe_details)
+            
+            # Store all details in context as compact records; the pydantic trees go out of scope here
+            ctx.deps.all_recipe_details = [CompactRecipe.from_details(recipe) for recipe in all_recipe_details]
+            
+            return render_tool_output("get_all_recipe_details", ''.join(summary_lines), compact_lines)
             
         except Exception as e:
             span.set_attribute("status", "error")
@@ -743,27 +1257,12 @@ async def search_recipes_with_details(
                 recipe_title = recipe.get('title', 'Unknown')
                 
                 try:
-                    # Make API request for details
-                    base_url = f"https://api.spoonacular.com/recipes/{recipe_id}/information"
-                    params = {
-                        "includeNutrition": True,
-                        "apiKey": ctx.deps.spoonacular_api_key
-                    }
-                    
-                    response = await ctx.deps.client.get(base_url, params=params)
-                    response.raise_for_status()
-                    
-                    recipe_data = response.json()
-                    recipe_details = RecipeDetails(**recipe_data)
-                    
-                    # Preserve the original search info
-                    recipe_details_dict = recipe_details.model_dump()
-                    recipe_details_dict['usedIngredientCount'] = recipe.get('usedIngredientCount', 0)
-                    recipe_details_dict['missedIngredientCount'] = recipe.get('missedIngredientCount', 0)
-                    recipe_details_dict['usedIngredients'] = recipe.get('usedIngredients', [])
-                    recipe_details_dict['missedIngredients'] = recipe.get('missedIngredients', [])
+                    # Cached details, or a Spoonacular request on a miss
+                    recipe_details = await fetch_recipe_details(
+                        ctx.deps.client, ctx.deps.spoonacular_api_key, recipe_id
+                    )
                     
-                    all_recipe_details.append((recipe_details, recipe_details_dict))
+                    all_recipe_details.append(recipe_details)
                     
                     logfire.info(f"✓ Retrieved details for recipe {idx+1}/{len(ctx.deps.last_recipes)}: {recipe_title}")
                     
@@ -772,26 +1271,30 @@ async def search_recipes_with_details(
                     logfire.error(f"✗ Failed to get details for: {recipe_title}")
                     continue
             
-            # Store all details in context
-            ctx.deps.all_recipe_details = [details[0] for details in all_recipe_details]
+            # Store all details in context as compact records
+            ctx.deps.all_recipe_details = [CompactRecipe.from_details(recipe) for recipe in all_recipe_details]
+            
+            # Match info from the search results, looked up by recipe id
+            matches = index_matches(ctx.deps.last_recipes)
             
             # Create comprehensive output
             summary_lines = [f"\n🍳 FOUND {len(ctx.deps.last_recipes)} RECIPES WITH COMPLETE DETAILS:\n"]
             summary_lines.append("=" * 80 + "\n")
             
             # Display each recipe with full details
-            for idx, (recipe_details, full_data) in enumerate(all_recipe_details, 1):
+            for idx, recipe_details in enumerate(all_recipe_details, 1):
+                full_data = matches.get(recipe_details.id, {})
                 # Header with match info
                 summary_lines.append(f"\n{idx}. {recipe_details.title}")
                 summary_lines.append(f"   {'─' * 70}")
-                summary_lines.append(f"   ✅ Uses {full_data['usedIngredientCount']} of your ingredients: ")
-                used_names = [ing['name'] for ing in full_data['usedIngredients']]
+                summary_lines.append(f"   ✅ Uses {full_data.get('usedIngredientCount', 0)} of your ingredients: ")
+                used_names = [ing['name'] for ing in full_data.get('usedIngredients', [])]
                 summary_lines.append(f"{', '.join(used_names)}")
                 
-                if full_data['missedIngredientCount'] > 0:
-                    summary_lines.append(f"   ❌ Missing {full_data['missedIngredientCount']} ingredients: ")
-                    missed_names = [ing['name'] for ing in full_data['missedIngredients'][:5]]
-                    summary_lines.append(f"{', '.join(missed_names)}{'...' if full_data['missedIngredientCount'] > 5 else ''}")
+                if full_data.get('missedIngredientCount', 0) > 0:
+                    summary_lines.append(f"   ❌ Missing {full_data.get('missedIngredientCount', 0)} ingredients: ")
+                    missed_names = [ing['name'] for ing in full_data.get('missedIngredients', [])[:5]]
+                    summary_lines.append(f"{', '.join(missed_names)}{'...' if full_data.get('missedIngredientCount', 0) > 5 else ''}")
                 
                 # Time and nutrition
                 summary_lines.append(f"\n   ⏱️  Ready in: {recipe_details.readyInMinutes} minutes")
@@ -834,34 +1337,33 @@ async def search_recipes_with_details(
                 
                 summary_lines.append("\n" + "─" * 80)
             
-            # Summary statistics
+            # Summary statistics; recipes with missing or 0 calories are skipped, as before
+            columns = RecipeColumns.from_recipes(all_recipe_details)
             if all_recipe_details:
                 summary_lines.append(f"\n\n📊 SUMMARY:")
                 summary_lines.append(f"   • Successfully retrieved details for {len(all_recipe_details)}/{len(ctx.deps.last_recipes)} recipes")
                 
-                recipes_list = [d[0] for d in all_recipe_details]
-                avg_time = sum(r.readyInMinutes for r in recipes_list) / len(recipes_list)
+                recipes_list = all_recipe_details
+                stats = columns.query()
+                with_calories = columns.query().nonzero("calories")
+                avg_calories = with_calories.aggregate("calories")["mean"]
                 
-                # Calculate average calories only for recipes with nutrition info
-                recipes_with_calories = [r for r in recipes_list if r.nutrition and r.nutrition.calories]
-                if recipes_with_calories:
-                    avg_calories = sum(r.nutrition.calories for r in recipes_with_calories) / len(recipes_with_calories)
-                    summary_lines.append(f"   • Average cooking time: {avg_time:.0f} minutes")
+                summary_lines.append(f"   • Average cooking time: {stats.aggregate('readyInMinutes')['mean']:.0f} minutes")
+                if avg_calories:
                     summary_lines.append(f"   • Average calories: {avg_calories:.0f}")
-                else:
-                    summary_lines.append(f"   • Average cooking time: {avg_time:.0f} minutes")
                 
                 # Find best options
-                quickest = min(recipes_list, key=lambda r: r.readyInMinutes)
+                quickest = recipes_list[stats.argmin("readyInMinutes")]
                 summary_lines.append(f"\n   🏃 Quickest recipe: {quickest.title} ({quickest.readyInMinutes} min)")
                 
-                if recipes_with_calories:
-                    lowest_cal = min(recipes_with_calories, key=lambda r: r.nutrition.calories)
+                lowest_cal_idx = with_calories.argmin("calories")
+                if lowest_cal_idx is not None:
+                    lowest_cal = recipes_list[lowest_cal_idx]
                     summary_lines.append(f"   🥗 Lowest calorie: {lowest_cal.title} ({lowest_cal.nutrition.calories} cal)")
                     
-                    recipes_with_protein = [r for r in recipes_list if r.nutrition and r.nutrition.protein]
-                    if recipes_with_protein:
-                        highest_protein = max(recipes_with_protein, key=lambda r: r.nutrition.protein)
+                    highest_protein_idx = columns.query().nonzero("protein").argmax("protein")
+                    if highest_protein_idx is not None:
+                        highest_protein = recipes_list[highest_protein_idx]
                         summary_lines.append(f"   💪 Highest protein: {highest_protein.title} ({highest_protein.nutrition.protein}g)")
             
             if failed_fetches:
@@ -873,7 +1375,17 @@ async def search_recipes_with_details(
             span.set_attribute("failed_fetches", len(failed_fetches))
             span.set_attribute("status", "success")
             
-            return ''.join(summary_lines)
+            compact_lines = [compact_stats_line(columns, len(failed_fetches), with_match=True)]
+            compact_lines.extend(
+                compact_recipe_line(
+                    recipe_details,
+                    matches.get(recipe_details.id, {}).get('usedIngredientCount', 0),
+                    matches.get(recipe_details.id, {}).get('missedIngredientCount', 0),
+                )
+                for recipe_details in all_recipe_details
+            )
+            
+            return render_tool_output("search_recipes_with_details", ''.join(summary_lines), compact_lines)
             
         except Exception as e:
             span.set_attribute("status", "error")
@@ -886,35 +1398,154 @@ async def search_recipes_with_details(
 
 # ================================================== API ================================================== 
 
-class ChatMessage(BaseModel):
-    """Input model for chat requests"""
+# Photos accepted in one /chat request
+MAX_IMAGES_PER_REQUEST = int(os.getenv("MAX_IMAGES_PER_REQUEST", "6"))
+
+class FridgePhotos(BaseModel):
+    """One fridge, as a single photo and/or several shots"""
     image_base64: Optional[str] = None
+    images_base64: Optional[List[str]] = Field(default=None, max_length=MAX_IMAGES_PER_REQUEST)  # several shots of one fridge
+    
+    def all_images(self) -> List[str]:
+        """image_base64 followed by images_base64, as one list"""
+        images = [self.image_base64] if self.image_base64 else []
+        return (images + (self.images_base64 or []))[:MAX_IMAGES_PER_REQUEST]
+
+class ChatMessage(FridgePhotos):
+    """Input model for chat requests"""
     message: Optional[str] = None
+    fields: Optional[List[str]] = None  # recipe fields (or presets like "card") to return; all when omitted
+    detail_mode: Literal["full", "preview"] = "full"  # "preview" completes after search; details via GET /recipes/{id}
+    resume_run_id: Optional[str] = None  # continue an earlier run (X-Run-Id) from its last completed step
+    pantry_update: Literal["merge", "replace"] = "merge"  # with X-Pantry-Token; "replace": the photos show the whole fridge
+
+# Bulk processing limits for /chat/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+class BatchItem(FridgePhotos):
+    """One fridge in a batch request"""
+    id: Optional[str] = None  # caller's reference, echoed back on the result line
+
+class BatchChatRequest(BaseModel):
+    """Input model for /chat/batch"""
+    items: List[BatchItem] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+    fields: Optional[List[str]] = None  # recipe fields (or presets like "card") to return; all when omitted
+    number: int = 20  # recipes searched per item
+    ranking: int = 2  # 1 to maximize used ingredients, 2 to minimize missing ingredients
 
 @app.post("/chat")
-async def chat_with_assistant(body: ChatMessage):
+async def chat_with_assistant(body: ChatMessage, request: Request):
     """
     Stream processing updates to the frontend in real-time
     
     Flow:
     - If image provided: Extract ingredients → Format → Search recipes → Get details
-    - If no image: Respond to user message directly
+    - If no image: Respond to user message directly, streaming message_delta events as tokens arrive
+    
+    Image runs are checkpointed after every step under the run id sent in the
+    X-Run-Id header (and on the final complete/error event). Sending it back as
+    resume_run_id skips the steps that already completed. With an
+    Idempotency-Key header, a retry follows the original run if it is still in
+    flight, or resumes it otherwise.
+    
+    Admins can send `X-Profile: 1` with `X-Admin-Token` to run the request under
+    a sampling profiler; the output file is named in the X-Profile-Path header.
     
-    Returns: StreamingResponse with JSON lines
+    Returns: StreamingResponse with JSON lines (or MessagePack frames when the
+    client sends Accept: application/x-msgpack), gzip/brotli compressed when accepted
     """
+    images = body.all_images()
+    
+    # A retry of a run still executing here follows it instead of starting another.
+    # The key is claimed before the first await, so retries arriving together
+    # wait for one request to start the run (or give up) rather than each starting one.
+    idempotency_key = request.headers.get("idempotency-key")
+    claim: Optional[InFlightRun] = None
+    if idempotency_key:
+        while (in_flight := in_flight_runs.get(idempotency_key)) is not None:
+            if await in_flight.started():
+                return event_stream_response(in_flight.follow(), request, {"X-Run-Id": in_flight.run_id})
+        claim = in_flight_runs[idempotency_key] = InFlightRun()
+    
+    try:
+        # Resume from a checkpoint when asked to, or when the idempotency key already started a run
+        resume_run_id = body.resume_run_id or (await run_store.run_for_key(idempotency_key) if idempotency_key else None)
+        checkpoint = await run_store.load(resume_run_id) if resume_run_id else None
+        if body.resume_run_id and checkpoint is None:
+            raise HTTPException(status_code=404, detail="Run not found or expired")
+        
+        # Past the daily cost budget only runs that already finished can be served
+        if daily_budget.level() == "exhausted" and not (checkpoint and "Get Recipe Details" in checkpoint["steps"]):
+            DEGRADED_REQUESTS.labels(reason="daily_budget_exhausted").inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Daily cost budget exhausted",
+                headers={"Retry-After": str(daily_budget.seconds_until_reset())},
+            )
+        
+        # The pantry is only reachable with a token issued by POST /pantry
+        pantry_token = request.headers.get("x-pantry-token")
+        user_id = await pantry_store.owner(pantry_token) if pantry_token else None
+        if pantry_token and user_id is None:
+            raise HTTPException(status_code=401, detail="Unknown pantry token")
+        
+        images_hash = hashlib.sha256("\n".join(images).encode()).hexdigest() if images else None
+        if checkpoint is not None:
+            if images and checkpoint["images_hash"] and images_hash != checkpoint["images_hash"]:
+                raise HTTPException(status_code=409, detail="Photos differ from the run being resumed")
+            if not images and "Extract Ingredients" not in checkpoint["steps"]:
+                raise HTTPException(status_code=422, detail="Photos are needed to resume a run that did not finish extraction")
+            run_id = resume_run_id
+            completed_steps = dict(checkpoint["steps"])
+        else:
+            run_id = new_run_id()
+            completed_steps = {}
+            if not images and user_id:
+                # No photos: search with the user's saved pantry inventory
+                inventory = await pantry_store.inventory(user_id)
+                if inventory.ingredients:
+                    completed_steps = {"Extract Ingredients": inventory.model_dump()}
+            if images or completed_steps:
+                await run_store.start(run_id, images_hash)
+                bound_run_id = await run_store.bind_key(idempotency_key, run_id) if idempotency_key else run_id
+                if bound_run_id != run_id:
+                    # another worker bound the key first: resume its run rather than starting a second one
+                    run_id = bound_run_id
+                    checkpoint = await run_store.load(run_id)
+                    completed_steps = dict(checkpoint["steps"]) if checkpoint else completed_steps
+    except BaseException:
+        # 404/409/422/429/401 and anything unexpected: let waiting retries proceed
+        if claim is not None:
+            release_in_flight(idempotency_key, claim)
+        raise
+    
+    is_pipeline_run = bool(images or completed_steps)
+    # "quick", "vegan", "under 30 minutes"...: applied locally to the results, not sent to the search
+    preferences = parse_preferences(body.message)
+    
     async def generate():
+        sample_request()
+        # tools, the vision call and the transport charge their costs to this ledger
+        ledger = CostLedger()
+        current_ledger.set(ledger)
+        detail_mode = body.detail_mode
         try:
-            async with AsyncClient() as client:
+            async with AsyncClient(transport=outbound_transport()) as client:
                 deps = Deps(
                     client=client,
                     spoonacular_api_key=os.getenv("SPOONACULAR_API_KEY"),
-                    image_base64=body.image_base64  # Store image in deps
+                    image_base64=images[0] if images else None,  # Store image in deps
+                    images_base64=images,
+                    ledger=ledger
                 )
                 
-                # Check if image is provided
-                if body.image_base64:
+                # Check if image is provided (or a checkpoint to resume from)
+                if is_pipeline_run:
                     # Log that we're starting the process
-                    logfire.info("Starting recipe assistant workflow with image")
+                    logfire.info("Starting recipe assistant workflow with image", run_id=run_id, resumed_steps=list(completed_steps))
+                    CHAT_REQUESTS.labels(mode="image").inc()
+                    restore_checkpoint(deps, completed_steps)
                     
                     # Track completion state for each step
                     step_states = {
@@ -926,101 +1557,169 @@ async def chat_with_assistant(body: ChatMessage):
                     
                     try:
                         # Step 1: Extract ingredients
-                        yield json.dumps({
+                        yield {
                             "type": "step_update",
                             "step": {
                                 "step_name": "Extract Ingredients",
                                 "status": "in_progress",
-                                "message": "Analyzing fridge contents..."
+                                "message": "Analyzing fridge contents..." if len(images) == 1 else f"Analyzing {len(images)} fridge photos..."
                             }
-                        }) + "\n"
+                        }
                         
-                        # Run extraction
-                        extraction_result = await main_agent.run(
-                            "Use the analyze_fridge_contents tool to analyze the fridge image and extract all visible ingredients. The image is already in the context, so call the tool without any parameters.",
-                            deps=deps
-                        )
+                        # Run extraction (skipped when resuming past it)
+                        if "Extract Ingredients" in completed_steps:
+                            extract_timer = resumed_step("Extract Ingredients")
+                        else:
+                            with observe_step("Extract Ingredients") as extract_timer, ledger.step("Extract Ingredients"):
+                                extraction_result = await main_agent.run(
+                                    "Use the analyze_fridge_contents tool to analyze the fridge image and extract all visible ingredients. The image is already in the context, so call the tool without any parameters.",
+                                    deps=deps
+                                )
+                                record_agent_usage("main", extraction_result.usage())
+                                if not (deps.last_extracted_ingredients and deps.last_extracted_ingredients.ingredients):
+                                    extract_timer.status = "empty"
+                        
+                        # Fold the upload into the user's pantry; the search then uses the whole inventory,
+                        # or reuses the last search when the inventory has barely changed
+                        pantry_baseline = None
+                        if user_id and deps.last_extracted_ingredients and deps.last_extracted_ingredients.ingredients:
+                            change = None
+                            if extract_timer.status != "resumed":
+                                change = await pantry_store.update(
+                                    user_id, deps.last_extracted_ingredients, body.pantry_update == "replace"
+                                )
+                                deps.last_extracted_ingredients = change.inventory
+                            
+                            search_reused = False
+                            if "Search Recipes" not in completed_steps:
+                                saved = await pantry_store.saved_search(user_id, deps.last_extracted_ingredients)
+                                if saved is not None:
+                                    restore_checkpoint(deps, saved["steps"])
+                                    completed_steps.update(saved["steps"])
+                                    search_reused = True
+                                else:
+                                    pantry_baseline = ingredient_set(deps.last_extracted_ingredients)
+                            
+                            yield {
+                                "type": "pantry",
+                                "added": change.added if change else [],
+                                "removed": change.removed if change else [],
+                                "refreshed": len(change.refreshed) if change else 0,
+                                "total": len(deps.last_extracted_ingredients.ingredients),
+                                "search_reused": search_reused
+                            }
                         
                         # Check if ingredients were extracted
                         if deps.last_extracted_ingredients and deps.last_extracted_ingredients.ingredients:
                             ingredients = deps.last_extracted_ingredients.ingredients
                             step_states["Extract Ingredients"]["completed"] = True
                             step_states["Extract Ingredients"]["data"] = ingredients
+                            await run_store.save_step(run_id, "Extract Ingredients", checkpoint_output("Extract Ingredients", deps))
+                            
+                            # One event per ingredient, tagged with the photo it was seen in
+                            image_indexes = deps.last_extracted_ingredients.image_indexes or [0] * len(ingredients)
+                            for ingredient, image_index in zip(ingredients, image_indexes):
+                                yield {
+                                    "type": "ingredient",
+                                    "ingredient": ingredient,
+                                    "image_index": image_index
+                                }
                             
-                            yield json.dumps({
+                            yield {
                                 "type": "step_complete",
                                 "step": {
                                     "step_name": "Extract Ingredients",
                                     "status": "completed",
                                     "message": f"Found {len(ingredients)} ingredients"
                                 },
+                                "timing_ms": extract_timer.elapsed_ms,
+                                "resumed": extract_timer.status == "resumed",
                                 "data": {
-                                    "ingredients": ingredients
+                                    "ingredients": ingredients,
+                                    "image_count": len(images)
                                 }
-                            }) + "\n"
+                            }
                             
                             # Step 2: Format ingredients
-                            yield json.dumps({
+                            yield {
                                 "type": "step_update",
                                 "step": {
                                     "step_name": "Format Ingredients",
                                     "status": "in_progress",
                                     "message": "Formatting ingredients for recipe search..."
                                 }
-                            }) + "\n"
+                            }
                             
-                            # Run formatting
-                            format_result = await main_agent.run(
-                                "Format the extracted ingredients for recipe search using format_ingredients_for_recipes tool.",
-                                deps=deps
-                            )
+                            # Run formatting (skipped when resuming past it)
+                            if "Format Ingredients" in completed_steps:
+                                format_timer = resumed_step("Format Ingredients")
+                            else:
+                                with observe_step("Format Ingredients") as format_timer, ledger.step("Format Ingredients"):
+                                    format_result = await main_agent.run(
+                                        "Format the extracted ingredients for recipe search using format_ingredients_for_recipes tool.",
+                                        deps=deps
+                                    )
+                                    record_agent_usage("main", format_result.usage())
+                                    if not (deps.last_formatted_params and deps.last_formatted_params.ingredients):
+                                        format_timer.status = "empty"
                             
                             if deps.last_formatted_params and deps.last_formatted_params.ingredients:
                                 formatted = deps.last_formatted_params.ingredients
                                 step_states["Format Ingredients"]["completed"] = True
                                 step_states["Format Ingredients"]["data"] = formatted
+                                await run_store.save_step(run_id, "Format Ingredients", checkpoint_output("Format Ingredients", deps))
                                 
-                                yield json.dumps({
+                                yield {
                                     "type": "step_complete",
                                     "step": {
                                         "step_name": "Format Ingredients",
                                         "status": "completed",
                                         "message": "Ingredients formatted successfully"
                                     },
+                                    "timing_ms": format_timer.elapsed_ms,
+                                    "resumed": format_timer.status == "resumed",
                                     "data": {
                                         "formatted": formatted
                                     }
-                                }) + "\n"
+                                }
                                 
                                 # Step 3: Search recipes
-                                yield json.dumps({
+                                yield {
                                     "type": "step_update",
                                     "step": {
                                         "step_name": "Search Recipes",
                                         "status": "in_progress",
                                         "message": "Searching for recipes..."
                                     }
-                                }) + "\n"
+                                }
                                 
-                                # Search for recipes with user preferences if provided
+                                # Preferences don't change the search; results are re-ranked locally once fetched
                                 search_prompt = "Search for recipes using search_recipes_by_ingredients tool with number=15."
-                                if body.message and any(word in body.message.lower() for word in ['healthy', 'quick', 'easy', 'vegetarian', 'vegan']):
-                                    search_prompt += f" User preference: {body.message}"
                                 
-                                search_result = await main_agent.run(search_prompt, deps=deps)
+                                if "Search Recipes" in completed_steps:
+                                    search_timer = resumed_step("Search Recipes")
+                                else:
+                                    with observe_step("Search Recipes") as search_timer, ledger.step("Search Recipes"):
+                                        search_result = await main_agent.run(search_prompt, deps=deps)
+                                        record_agent_usage("main", search_result.usage())
+                                        if not deps.last_recipes:
+                                            search_timer.status = "empty"
                                 
                                 if deps.last_recipes:
                                     recipes_count = len(deps.last_recipes)
                                     step_states["Search Recipes"]["completed"] = True
                                     step_states["Search Recipes"]["data"] = recipes_count
+                                    await run_store.save_step(run_id, "Search Recipes", checkpoint_output("Search Recipes", deps))
                                     
-                                    yield json.dumps({
+                                    yield {
                                         "type": "step_complete",
                                         "step": {
                                             "step_name": "Search Recipes",
                                             "status": "completed",
                                             "message": f"Found {recipes_count} recipes"
                                         },
+                                        "timing_ms": search_timer.elapsed_ms,
+                                        "resumed": search_timer.status == "resumed",
                                         "data": {
                                             "recipe_count": recipes_count,
                                             "recipe_previews": [
@@ -1032,135 +1731,151 @@ async def chat_with_assistant(body: ChatMessage):
                                                 } for r in deps.last_recipes[:5]  # Preview first 5
                                             ]
                                         }
-                                    }) + "\n"
-                                    
-                                    # Step 4: Get details
-                                    yield json.dumps({
-                                        "type": "step_update",
-                                        "step": {
-                                            "step_name": "Get Recipe Details",
-                                            "status": "in_progress",
-                                            "message": f"Fetching detailed information for {recipes_count} recipes..."
-                                        }
-                                    }) + "\n"
+                                    }
                                     
-                                    # Get recipe details
-                                    details_result = await main_agent.run(
-                                        "Get detailed information for all recipes using get_all_recipe_details tool.",
-                                        deps=deps
-                                    )
+                                    # Out of budget (this request's, or close to today's): finish with previews
+                                    if detail_mode == "full" and "Get Recipe Details" not in completed_steps:
+                                        budget_reason = ledger.over_budget() or (
+                                            "daily_budget" if daily_budget.level() != "normal" else None
+                                        )
+                                        if budget_reason:
+                                            detail_mode = "preview"
+                                            ledger.degrade(budget_reason)
                                     
-                                    # Process and send final results
-                                    recipes_data = []
-                                    if deps.all_recipe_details:
-                                        details_count = len(deps.all_recipe_details)
-                                        step_states["Get Recipe Details"]["completed"] = True
-                                        step_states["Get Recipe Details"]["data"] = details_count
+                                    if detail_mode == "preview":
+                                        # Preview-first: finish with search previews, details are served by GET /recipes/{id}
+                                        step_states["Get Recipe Details"]["data"] = "deferred"
+                                        previews = rank_previews(deps.last_recipes, preferences)
+                                        prefetch_recipe_details([r['id'] for r in previews[:PREFETCH_TOP_N]])
+                                        if pantry_baseline is not None:
+                                            await pantry_store.save_search(user_id, pantry_baseline, reusable_steps(deps, step_states))
+                                        
+                                        yield {
+                                            "type": "complete",
+                                            "message": f"I found {recipes_count} recipes you can make with your ingredients! Tap a recipe to see the full details.",
+                                            "summary": {
+                                                "total_ingredients": len(ingredients),
+                                                "total_recipes": recipes_count,
+                                                "detail_mode": "preview",
+                                                "details_url": "/recipes/{id}",
+                                                "preferences": preferences.describe(),
+                                                "cost": ledger.as_dict(),
+                                                "recipes": assemble_previews(previews)
+                                            },
+                                            "step_summary": step_states,
+                                            "run_id": run_id
+                                        }
                                         
-                                        yield json.dumps({
-                                            "type": "step_complete",
+                                    else:
+                                        # Step 4: Get details
+                                        yield {
+                                            "type": "step_update",
                                             "step": {
                                                 "step_name": "Get Recipe Details",
-                                                "status": "completed",
-                                                "message": f"Retrieved details for {details_count} recipes"
-                                            },
-                                            "data": {
-                                                "details_count": details_count
+                                                "status": "in_progress",
+                                                "message": f"Fetching detailed information for {recipes_count} recipes..."
                                             }
-                                        }) + "\n"
+                                        }
+                                    
+                                        # Get recipe details (skipped when the run already has them)
+                                        if "Get Recipe Details" in completed_steps:
+                                            details_timer = resumed_step("Get Recipe Details")
+                                        else:
+                                            with observe_step("Get Recipe Details") as details_timer, ledger.step("Get Recipe Details"):
+                                                details_result = await main_agent.run(
+                                                    "Get detailed information for all recipes using get_all_recipe_details tool.",
+                                                    deps=deps
+                                                )
+                                                record_agent_usage("main", details_result.usage())
+                                                if not deps.all_recipe_details:
+                                                    details_timer.status = "empty"
+                                    
+                                        # Process and send final results
+                                        recipes_data = []
+                                        if deps.all_recipe_details:
+                                            details_count = len(deps.all_recipe_details)
+                                            step_states["Get Recipe Details"]["completed"] = True
+                                            step_states["Get Recipe Details"]["data"] = details_count
+                                            await run_store.save_step(run_id, "Get Recipe Details", checkpoint_output("Get Recipe Details", deps))
                                         
-                                        for recipe in deps.all_recipe_details:
-                                            # Create recipe dict following RecipeDetails model structure
-                                            recipe_dict = {
-                                                "id": recipe.id,
-                                                "title": recipe.title,
-                                                "readyInMinutes": recipe.readyInMinutes,
-                                                "image": recipe.image,
-                                                "summary": recipe.summary,
-                                                "preparationMinutes": recipe.preparationMinutes,
-                                                "cookingMinutes": recipe.cookingMinutes,
-                                                "nutrition": {
-                                                    "calories": recipe.nutrition.calories if recipe.nutrition else None,
-                                                    "protein": recipe.nutrition.protein if recipe.nutrition else None,
-                                                    "carbohydrates": recipe.nutrition.carbohydrates if recipe.nutrition else None,
-                                                    "fat": recipe.nutrition.fat if recipe.nutrition else None
-                                                } if recipe.nutrition else None,
-                                                "ingredients": [
-                                                    {
-                                                        "name": ing.name,
-                                                        "amount": ing.amount,
-                                                        "unit": ing.unit
-                                                    } for ing in recipe.ingredients
-                                                ],
-                                                "analyzedInstructions": [
-                                                    {
-                                                        "number": step.number,
-                                                        "step": step.step,
-                                                        "length": step.length
-                                                    } for step in recipe.analyzedInstructions
-                                                ]
+                                            yield {
+                                                "type": "step_complete",
+                                                "step": {
+                                                    "step_name": "Get Recipe Details",
+                                                    "status": "completed",
+                                                    "message": f"Retrieved details for {details_count} recipes"
+                                                },
+                                                "timing_ms": details_timer.elapsed_ms,
+                                                "resumed": details_timer.status == "resumed",
+                                                "data": {
+                                                    "details_count": details_count
+                                                }
                                             }
-                                            
-                                            # Add match information from original search results
-                                            for original_recipe in deps.last_recipes:
-                                                if original_recipe['id'] == recipe.id:
-                                                    recipe_dict['usedIngredientCount'] = original_recipe.get('usedIngredientCount', 0)
-                                                    recipe_dict['missedIngredientCount'] = original_recipe.get('missedIngredientCount', 0)
-                                                    recipe_dict['usedIngredients'] = [ing['name'] for ing in original_recipe.get('usedIngredients', [])]
-                                                    recipe_dict['missedIngredients'] = [ing['name'] for ing in original_recipe.get('missedIngredients', [])]
-                                                    break
-                                            
-                                            recipes_data.append(recipe_dict)
+                                        
+                                            if pantry_baseline is not None:
+                                                await pantry_store.save_search(user_id, pantry_baseline, reusable_steps(deps, step_states))
+                                        
+                                            # Re-rank against the message's preferences (the checkpoint keeps search order)
+                                            ranked = rank_recipes(deps.all_recipe_details, deps.last_recipes, preferences)
+                                        
+                                            # Merge details with match data in one pass, projected to the requested fields
+                                            recipes_data = assemble_recipes(ranked, deps.last_recipes, body.fields)
                                     
-                                    # Send final complete message with all data
-                                    final_message = "I found some great recipes based on what's in your fridge!"
-                                    if len(recipes_data) > 0:
-                                        final_message = f"I found {len(recipes_data)} delicious recipes you can make with your ingredients! Swipe through the recipes below to find something you'd like to cook."
+                                        # Send final complete message with all data
+                                        final_message = "I found some great recipes based on what's in your fridge!"
+                                        if len(recipes_data) > 0:
+                                            final_message = f"I found {len(recipes_data)} delicious recipes you can make with your ingredients! Swipe through the recipes below to find something you'd like to cook."
                                     
-                                    yield json.dumps({
-                                        "type": "complete",
-                                        "message": final_message,
-                                        "summary": {
-                                            "total_ingredients": len(ingredients),
-                                            "total_recipes": len(recipes_data),
-                                            "recipes": recipes_data
-                                        },
-                                        "step_summary": step_states  # Include step completion summary
-                                    }) + "\n"
+                                        yield {
+                                            "type": "complete",
+                                            "message": final_message,
+                                            "summary": {
+                                                "total_ingredients": len(ingredients),
+                                                "total_recipes": len(recipes_data),
+                                                "preferences": preferences.describe(),
+                                                "cost": ledger.as_dict(),
+                                                "recipes": recipes_data
+                                            },
+                                            "step_summary": step_states,  # Include step completion summary
+                                            "run_id": run_id
+                                        }
                                     
                                 else:
                                     # No recipes found
-                                    yield json.dumps({
+                                    yield {
                                         "type": "error",
                                         "step": {
                                             "step_name": "Search Recipes",
                                             "status": "error",
                                             "message": "No recipes found with the available ingredients"
                                         },
-                                        "step_summary": step_states
-                                    }) + "\n"
+                                        "step_summary": step_states,
+                                        "run_id": run_id
+                                    }
                             else:
                                 # Format failed
-                                yield json.dumps({
+                                yield {
                                     "type": "error",
                                     "step": {
                                         "step_name": "Format Ingredients",
                                         "status": "error",
                                         "message": "Failed to format ingredients for recipe search"
                                     },
-                                    "step_summary": step_states
-                                }) + "\n"
+                                    "step_summary": step_states,
+                                    "run_id": run_id
+                                }
                         else:
                             # No ingredients extracted
-                            yield json.dumps({
+                            yield {
                                 "type": "error",
                                 "step": {
                                     "step_name": "Extract Ingredients",
                                     "status": "error",
                                     "message": "No ingredients could be extracted from the image. Please ensure the image shows the contents of a fridge clearly."
                                 },
-                                "step_summary": step_states
-                            }) + "\n"
+                                "step_summary": step_states,
+                                "run_id": run_id
+                            }
                             
                     except Exception as e:
                         logfire.error(f"Error in processing pipeline: {str(e)}", exc_info=True)
@@ -1172,7 +1887,7 @@ async def chat_with_assistant(body: ChatMessage):
                                 failed_step = step_name
                                 break
                         
-                        yield json.dumps({
+                        yield {
                             "type": "error",
                             "step": {
                                 "step_name": failed_step,
@@ -1181,37 +1896,357 @@ async def chat_with_assistant(body: ChatMessage):
                             },
                             "error": str(e),
                             "message": f"I encountered an error while processing your request: {str(e)}",
-                            "step_summary": step_states
-                        }) + "\n"
+                            "step_summary": step_states,
+                            "run_id": run_id
+                        }
                 
                 else:
                     # No image provided - just respond to the message
                     if body.message:
-                        # Run the agent with just the message
-                        result = await main_agent.run(body.message, deps=deps)
+                        CHAT_REQUESTS.labels(mode="message").inc()
                         
-                        # Send response
-                        yield json.dumps({
+                        # Stream the agent's answer as it is generated
+                        response_chunks = []
+                        # timed() rather than step(): the block yields, so the step can't be held in context
+                        with observe_step("Respond"), ledger.timed("Respond"):
+                            async with main_agent.run_stream(body.message, deps=deps) as result:
+                                async for delta in result.stream_text(delta=True):
+                                    if not delta:
+                                        continue
+                                    response_chunks.append(delta)
+                                    yield {
+                                        "type": "message_delta",
+                                        "delta": delta
+                                    }
+                                record_agent_usage("main", result.usage(), step="Respond")
+                        
+                        # Send the full response once generation is done
+                        response_text = "".join(response_chunks)
+                        yield {
                             "type": "message",
-                            "message": result.data if result and result.data else "I can help you find recipes! Please upload a photo of your fridge to get started."
-                        }) + "\n"
+                            "message": response_text if response_text else "I can help you find recipes! Please upload a photo of your fridge to get started.",
+                            "cost": ledger.as_dict()
+                        }
                         
                     else:
                         # No image and no message
-                        yield json.dumps({
+                        yield {
                             "type": "message",
                             "message": "👋 Welcome! I can help you find recipes based on what's in your fridge. Upload a photo of your fridge or ask me any cooking questions!"
-                        }) + "\n"
+                        }
                         
         except Exception as e:
             logfire.error(f"Chat endpoint error: {str(e)}", exc_info=True)
-            yield json.dumps({
+            yield {
                 "type": "error",
                 "error": str(e),
                 "message": f"An unexpected error occurred: {str(e)}. Please try again."
-            }) + "\n"
+            }
+        finally:
+            ledger.finish()
     
-    return StreamingResponse(generate(), media_type="application/x-ndjson")
+    events = generate()
+    headers = {"X-Run-Id": run_id} if is_pipeline_run else {}
+    
+    # Profile the pipeline itself, which for keyed runs is the background publish task
+    if profile_requested(request):
+        output_path = profile_path("chat")
+        events = profiled_stream(events, output_path)
+        headers["X-Profile-Path"] = str(output_path)
+    
+    # Keyed runs execute in the background so a retry (or a dropped client)
+    # doesn't stop them; every response for the key follows the same events
+    if claim is not None and is_pipeline_run:
+        claim.begin(run_id)
+        task = asyncio.create_task(claim.publish(events))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        task.add_done_callback(lambda _: release_in_flight(idempotency_key, claim))
+        events = claim.follow()
+    elif claim is not None:
+        # a plain chat reply isn't a run; retries with the key get their own reply
+        release_in_flight(idempotency_key, claim)
+    
+    return event_stream_response(events, request, headers)
+
+@app.post("/chat/batch")
+async def chat_batch(body: BatchChatRequest, request: Request):
+    """
+    Run many fridges through the /chat pipeline (extract → format → search → details)
+    without the conversational agent, for bulk jobs.
+    
+    Items are processed by a pool of BATCH_CONCURRENCY workers sharing the
+    caches. Work is shared across the batch: identical ingredient sets are
+    formatted and searched once, and recipe details for all items are fetched
+    through coalesced informationBulk calls.
+    
+    Each item has its own cost ledger and the same budgets as a /chat request:
+    an item over COST_REQUEST_MAX_* (or running while today's budget is
+    nearly spent) gets search previews instead of details, and items started
+    once the daily budget is exhausted fail.
+    
+    Returns: StreamingResponse with one item_result (or item_error) line per
+    item in completion order, then a batch_complete summary
+    """
+    api_key = os.getenv("SPOONACULAR_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="Spoonacular API key not configured")
+    if daily_budget.level() == "exhausted":
+        DEGRADED_REQUESTS.labels(reason="daily_budget_exhausted").inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Daily cost budget exhausted",
+            headers={"Retry-After": str(daily_budget.seconds_until_reset())},
+        )
+    
+    async def generate():
+        sample_request()
+        start = time.perf_counter()
+        async with AsyncClient(transport=outbound_transport()) as client:
+            vision_semaphore = asyncio.Semaphore(VISION_CONCURRENCY)
+            formatting = TaskMemo()
+            searches = TaskMemo()
+            details_loader = BatchLoader(
+                lambda recipe_ids: fetch_recipe_details_bulk(client, api_key, recipe_ids),
+                max_batch=BULK_DETAILS_CHUNK,
+            )
+            
+            async def process(index: int, item: BatchItem) -> dict:
+                # each item is charged to its own ledger and held to the per-request budget;
+                # work shared with other items is charged to the item that ran it
+                ledger = CostLedger()
+                token = current_ledger.set(ledger)
+                try:
+                    return await process_item(index, item, ledger)
+                finally:
+                    current_ledger.reset(token)
+                    ledger.finish()
+            
+            async def process_item(index: int, item: BatchItem, ledger: CostLedger) -> dict:
+                images = item.all_images()
+                if not images:
+                    raise ValueError("No image provided")
+                if daily_budget.level() == "exhausted":
+                    DEGRADED_REQUESTS.labels(reason="daily_budget_exhausted").inc()
+                    raise ValueError("Daily cost budget exhausted")
+                
+                with ledger.step("Extract Ingredients"):
+                    extracted, _ = await extract_from_images([decode_image(image) for image in images], vision_semaphore)
+                candidates = extracted.cooking_ingredients()
+                if not candidates:
+                    raise ValueError("No ingredients found")
+                
+                # same fridge contents -> one formatter run and one search for the whole batch
+                candidates_key = tuple(sorted({c.strip().lower() for c in candidates}))
+                with ledger.step("Format Ingredients"):
+                    params = await formatting.run(candidates_key, lambda: format_search_params(candidates))
+                if not params:
+                    raise ValueError("Could not format ingredients for recipe search")
+                
+                search_key = search_cache_key(params.ingredients, body.number, body.ranking)
+                with ledger.step("Search Recipes"):
+                    search_results = await searches.run(
+                        search_key,
+                        lambda: search_recipes(client, api_key, params.ingredients, body.number, body.ranking)
+                    )
+                
+                result = {
+                    "type": "item_result",
+                    "index": index,
+                    "id": item.id,
+                    "ingredients": extracted.ingredients,
+                    "formatted": params.ingredients,
+                }
+                
+                # Out of budget (this item's, or close to today's): finish with previews, as /chat does
+                budget_reason = ledger.over_budget() or (
+                    "daily_budget" if daily_budget.level() != "normal" else None
+                )
+                if budget_reason:
+                    ledger.degrade(budget_reason)
+                    return {**result, "detail_mode": "preview", "recipes": assemble_previews(search_results), "cost": ledger.as_dict()}
+                
+                with ledger.step("Get Recipe Details"):
+                    details = await details_loader.load_many(recipe.get('id') for recipe in search_results)
+                recipes = [details[recipe.get('id')] for recipe in search_results if recipe.get('id') in details]
+                return {**result, "recipes": assemble_recipes(recipes, search_results, body.fields), "cost": ledger.as_dict()}
+            
+            # bounded worker pool: workers pull items and push result lines
+            queue: asyncio.Queue = asyncio.Queue()
+            for index, item in enumerate(body.items):
+                queue.put_nowait((index, item))
+            results: asyncio.Queue = asyncio.Queue()
+            
+            async def worker():
+                while True:
+                    try:
+                        index, item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    try:
+                        results.put_nowait(await process(index, item))
+                    except Exception as e:
+                        logfire.error(f"Batch item {index} failed: {str(e)}")
+                        results.put_nowait({"type": "item_error", "index": index, "id": item.id, "error": str(e)})
+            
+            workers = [asyncio.create_task(worker()) for _ in range(min(BATCH_CONCURRENCY, len(body.items)))]
+            failed = degraded = 0
+            try:
+                for _ in range(len(body.items)):
+                    line = await results.get()
+                    failed += line["type"] == "item_error"
+                    degraded += line.get("detail_mode") == "preview"
+                    yield line
+            finally:
+                for task in workers:
+                    task.cancel()
+            
+            yield {
+                "type": "batch_complete",
+                "summary": {
+                    "items": len(body.items),
+                    "succeeded": len(body.items) - failed,
+                    "failed": failed,
+                    "degraded": degraded,
+                    "unique_searches": len(searches),
+                    "detail_batches": details_loader.batches,
+                    "timing_ms": round((time.perf_counter() - start) * 1000, 1),
+                }
+            }
+    
+    return event_stream_response(generate(), request)
+
+@app.get("/recipes/query")
+async def query_recipes(
+    preference: Optional[str] = None,
+    max_ready_minutes: Optional[float] = None,
+    min_calories: Optional[float] = None,
+    max_calories: Optional[float] = None,
+    min_protein: Optional[float] = None,
+    max_fat: Optional[float] = None,
+    max_carbohydrates: Optional[float] = None,
+    max_ingredients: Optional[int] = None,
+    sort: str = "readyInMinutes",
+    descending: bool = False,
+    limit: int = Query(20, ge=1, le=500),
+):
+    """
+    Filter every cached recipe by time, macros and ingredient count without
+    calling Spoonacular or the LLM.
+    
+    Args:
+        preference: Comma-separated keywords ("quick", "healthy", ...) mapped to range filters
+        sort: Numeric field to order by (readyInMinutes, calories, fat, carbohydrates, protein, ingredientCount)
+        limit: Maximum recipes to return
+    """
+    preferences = [p.strip().lower() for p in preference.split(",")] if preference else []
+    unknown = [p for p in preferences if p not in PREFERENCE_FILTERS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown preference: {', '.join(unknown)}")
+    if sort not in NUMERIC_FIELDS:
+        raise HTTPException(status_code=422, detail=f"Unknown sort field: {sort}")
+    
+    start = time.perf_counter()
+    if recipe_store.needs_sync():
+        # picks up entries other workers cached, and drops expired ones
+        recipe_store.sync(await recipe_details_cache.aitems())
+    query = (
+        recipe_store.query()
+        .prefer(*preferences)
+        .where("readyInMinutes", max=max_ready_minutes)
+        .where("calories", min=min_calories, max=max_calories)
+        .where("protein", min=min_protein)
+        .where("fat", max=max_fat)
+        .where("carbohydrates", max=max_carbohydrates)
+        .where("ingredientCount", max=max_ingredients)
+    )
+    recipes = query.order_by(sort, descending).limit(limit).rows()
+    result = {
+        "matched": query.count(),
+        "cached_recipes": len(recipe_store),
+        "recipes": recipes,
+        "stats": {field: query.aggregate(field) for field in ("readyInMinutes", "calories", "protein")},
+        "query_us": round((time.perf_counter() - start) * 1_000_000, 1),
+    }
+    return Response(content=json_dumps(result), media_type="application/json")
+
+@app.get("/recipes/{recipe_id}")
+async def get_recipe(recipe_id: int, fields: Optional[str] = None):
+    """
+    Recipe details on demand, for clients using detail_mode="preview".
+    Served from the details cache when warm (top results are prefetched).
+    
+    Args:
+        recipe_id: Spoonacular recipe id
+        fields: Optional comma-separated field names or preset to return
+    """
+    api_key = os.getenv("SPOONACULAR_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="Spoonacular API key not configured")
+    
+    try:
+        recipe = await fetch_recipe_details(app.state.http_client, api_key, recipe_id)
+    except HTTPStatusError as e:
+        status = e.response.status_code
+        logfire.error(f"Failed to get details for recipe {recipe_id}: {str(e)}")
+        raise HTTPException(
+            status_code=404 if status == 404 else 502,
+            detail="Recipe not found" if status == 404 else "Failed to fetch recipe details"
+        )
+    
+    recipe_data = assemble_recipes([recipe], None, fields.split(",") if fields else None)[0]
+    return Response(content=json_dumps(recipe_data), media_type="application/json")
+
+@app.post("/pantry")
+async def create_pantry():
+    """
+    Issue a pantry token. Send it as X-Pantry-Token on /chat to keep an
+    inventory across requests, and on GET /pantry to read it.
+    """
+    token = await pantry_store.issue_token()
+    return Response(content=json_dumps({"pantry_token": token}), media_type="application/json", status_code=201)
+
+@app.get("/pantry")
+async def get_pantry(request: Request):
+    """The caller's pantry inventory: items seen in their uploads and when they were last seen"""
+    token = request.headers.get("x-pantry-token")
+    user_id = await pantry_store.owner(token) if token else None
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="A valid X-Pantry-Token header is required")
+    items = await pantry_store.items(user_id)
+    return Response(content=json_dumps({"total": len(items), "items": items}), media_type="application/json")
+
+@app.get("/healthz")
+async def healthz():
+    """Readiness: 200 once startup warm-up is done, 503 before"""
+    state = {
+        **startup_state,
+        "budget": daily_budget.describe(),
+        "caches": {
+            cache.name: await cache.alen()
+            for cache in (recipe_details_cache, search_results_cache, vision_results_cache)
+        },
+    }
+    return Response(
+        content=json_dumps({"status": "ok" if state["ready"] else "starting", **state}),
+        media_type="application/json",
+        status_code=200 if state["ready"] else 503,
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
 
 if __name__ == '__main__':
-    uvicorn.run("main:app", reload=True, host="localhost", port=8000)
\ No newline at end of file
+    # WEB_CONCURRENCY > 1 runs that many worker processes (no auto-reload:
+    # uvicorn can't reload with workers). Workers share the SQLite cache and
+    # write Prometheus samples to a common directory so /metrics covers them all.
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        os.environ.setdefault("CACHE_BACKEND", "sqlite")
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="fridger-metrics-"))
+        uvicorn.run("main:app", host="localhost", port=8000, workers=workers)
+    else:
+        uvicorn.run("main:app", reload=True, host="localhost", port=8000)
\ No newline at end of file
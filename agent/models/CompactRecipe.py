@@ -0,0 +1,131 @@
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+from models.RecipeDetails import RecipeDetails
+
+# compact records for recipe data held per request
+#
+# RecipeDetails keeps a pydantic object per ingredient and per instruction
+# step. Once a recipe is parsed, the pipeline only needs to hold it until the
+# final payload is built, so it is stored as one slotted object instead:
+# ingredient names and units are interned (the same few hundred strings recur
+# across recipes and requests), amounts and step metadata live in typed
+# arrays, and instruction text is one string sliced by offsets. Records turn
+# back into the API dict shape only when the response is assembled.
+
+NUTRIENTS = ("calories", "fat", "carbohydrates", "protein")
+
+# same key order as RecipeDetails.model_dump()
+RECIPE_FIELDS = tuple(RecipeDetails.model_fields)
+
+# search result keys the pipeline reads; the rest of findByIngredients is dropped
+SEARCH_RESULT_KEYS = ("id", "title", "image", "usedIngredientCount", "missedIngredientCount")
+
+
+def _intern(value: Optional[str]) -> str:
+    return sys.intern(value or "")
+
+
+class CompactRecipe:
+    """Slotted, array-backed stand-in for a RecipeDetails held during a request"""
+
+    __slots__ = (
+        "id",
+        "title",
+        "image",
+        "readyInMinutes",
+        "preparationMinutes",
+        "cookingMinutes",
+        "summary",
+        "nutrition",          # tuple in NUTRIENTS order, or None
+        "ingredient_names",   # tuple of interned str
+        "ingredient_units",   # tuple of interned str
+        "ingredient_amounts", # array('d')
+        "instructions",       # all step texts, concatenated
+        "step_offsets",       # array('I'): end offset of each step in instructions
+        "step_numbers",       # array('i')
+        "step_lengths",       # array('i'), minutes
+    )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CompactRecipe":
+        """From RecipeDetails.model_dump() output (the details cache and checkpoint shape)"""
+        record = cls.__new__(cls)
+        record.id = data["id"]
+        record.title = data.get("title", "")
+        record.image = data.get("image", "")
+        record.readyInMinutes = data.get("readyInMinutes", 0)
+        record.preparationMinutes = data.get("preparationMinutes")
+        record.cookingMinutes = data.get("cookingMinutes")
+        record.summary = data.get("summary", "")
+
+        nutrition = data.get("nutrition")
+        record.nutrition = tuple(nutrition.get(key) for key in NUTRIENTS) if nutrition else None
+
+        ingredients = data.get("ingredients") or []
+        record.ingredient_names = tuple(_intern(i.get("name")) for i in ingredients)
+        record.ingredient_units = tuple(_intern(i.get("unit")) for i in ingredients)
+        record.ingredient_amounts = array("d", (i.get("amount") or 0 for i in ingredients))
+
+        steps = data.get("analyzedInstructions") or []
+        texts = [step.get("step", "") for step in steps]
+        record.instructions = "".join(texts)
+        offsets, end = [], 0
+        for text in texts:
+            end += len(text)
+            offsets.append(end)
+        record.step_offsets = array("I", offsets)
+        record.step_numbers = array("i", (step.get("number") or 0 for step in steps))
+        record.step_lengths = array("i", (step.get("length") or 0 for step in steps))
+        return record
+
+    @classmethod
+    def from_details(cls, details: RecipeDetails) -> "CompactRecipe":
+        return cls.from_dict(details.model_dump())
+
+    @property
+    def ingredient_count(self) -> int:
+        return len(self.ingredient_names)
+
+    def steps(self) -> List[str]:
+        texts, start = [], 0
+        for end in self.step_offsets:
+            texts.append(self.instructions[start:end])
+            start = end
+        return texts
+
+    def to_dict(self, include: Optional[Iterable[str]] = None) -> Dict:
+        """The RecipeDetails.model_dump(include=...) shape, built at the edge"""
+        fields = RECIPE_FIELDS if include is None else [f for f in RECIPE_FIELDS if f in include]
+        data = {}
+        for field in fields:
+            if field == "nutrition":
+                data[field] = dict(zip(NUTRIENTS, self.nutrition)) if self.nutrition else None
+            elif field == "ingredients":
+                data[field] = [
+                    {"name": name, "amount": amount, "unit": unit}
+                    for name, amount, unit in zip(self.ingredient_names, self.ingredient_amounts, self.ingredient_units)
+                ]
+            elif field == "analyzedInstructions":
+                data[field] = [
+                    {"number": number, "step": text, "length": length}
+                    for number, text, length in zip(self.step_numbers, self.steps(), self.step_lengths)
+                ]
+            else:
+                data[field] = getattr(self, field)
+        return data
+
+    def to_details(self) -> RecipeDetails:
+        return RecipeDetails.model_validate(self.to_dict())
+
+
+def compact_search_result(recipe: Dict) -> Dict:
+    """
+    A findByIngredients result trimmed to the keys the pipeline reads, with
+    ingredient names interned. Keeps the API shape so callers are unchanged.
+    """
+    result = {key: recipe[key] for key in SEARCH_RESULT_KEYS if key in recipe}
+    result["usedIngredients"] = [{"name": _intern(i.get("name"))} for i in recipe.get("usedIngredients", [])]
+    result["missedIngredients"] = [{"name": _intern(i.get("name"))} for i in recipe.get("missedIngredients", [])]
+    return result
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any
 import logfire  # Add this import at the top of your file if not already there
+from utils.telemetry import verbose_enabled
 
 class NutritionInfo(BaseModel):
     calories: Optional[float] = None
@@ -49,10 +50,11 @@ class RecipeDetails(BaseModel):
         if v is None:
             return []
         
-        # Log raw ingredients data
-        logfire.info(f"Raw ingredients data (type: {type(v)})", 
-                    count=len(v) if isinstance(v, list) else 0,
-                    sample=v[:2] if isinstance(v, list) and len(v) > 0 else v)
+        # Log raw ingredients data (sampled requests only, the sample is payload-sized)
+        if verbose_enabled():
+            logfire.info(f"Raw ingredients data (type: {type(v)})", 
+                        count=len(v) if isinstance(v, list) else 0,
+                        sample=v[:2] if isinstance(v, list) and len(v) > 0 else v)
         
         if isinstance(v, list):
             result = []
@@ -95,7 +97,7 @@ class RecipeDetails(BaseModel):
                             unit=unit
                         ))
                         
-                        if idx < 3:  # Log first 3 ingredients for debugging
+                        if idx < 3 and verbose_enabled():  # Log first 3 ingredients for debugging
                             logfire.info(f"Parsed ingredient {idx}", 
                                        name=name, amount=amount, unit=unit)
             
@@ -110,7 +112,8 @@ class RecipeDetails(BaseModel):
             return None
         
         # Log the raw nutrition data
-        logfire.info("Raw nutrition data", nutrition_data=str(v)[:200])
+        if verbose_enabled():
+            logfire.info("Raw nutrition data", nutrition_data=str(v)[:200])
         
         if isinstance(v, dict):
             # Direct nutrition values (some endpoints return this format)
@@ -138,7 +141,8 @@ class RecipeDetails(BaseModel):
                     elif name == 'protein':
                         result['protein'] = amount
                 
-                logfire.info("Extracted nutrition", result=result)
+                if verbose_enabled():
+                    logfire.info("Extracted nutrition", result=result)
                 return NutritionInfo(**result)
             
             # Try direct mapping
@@ -194,18 +198,21 @@ class RecipeDetails(BaseModel):
                                         length=int(length)
                                     ))
                     
-                    # Direct step format (some endpoints return this)
+                    # Direct step format (some endpoints return this, as does model_dump())
                     elif 'step' in item:
+                        length = item.get('length', 0)
+                        if isinstance(length, dict):
+                            length = length.get('number', 0)
                         all_steps.append(InstructionStep(
                             number=item.get('number', len(all_steps) + 1),
                             step=item.get('step', ''),
-                            length=0
+                            length=int(length) if isinstance(length, (int, float)) else 0
                         ))
             
             logfire.info(f"Total instruction steps parsed: {len(all_steps)}")
             
             # Log first 2 steps for debugging
-            for i, step in enumerate(all_steps[:2]):
+            for i, step in enumerate(all_steps[:2] if verbose_enabled() else []):
                 logfire.info(f"Step {i+1}", number=step.number, 
                            text=step.step[:100] + "..." if len(step.step) > 100 else step.step)
             
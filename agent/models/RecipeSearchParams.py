@@ -3,11 +3,43 @@ from typing import List, Optional
 
 # structure for recipe search parameters
 
+# model for a single item returned by the vision call
+class FridgeItem(BaseModel):
+    name: str = Field(
+        description="Specific item name, including brand when visible (e.g., 'Heinz ketchup', 'whole milk')"
+    )
+    category: str = Field(
+        default="other",
+        description="One of: produce, dairy, meat, seafood, condiment, grain, beverage, leftovers, other"
+    )
+    is_food: bool = Field(
+        default=True,
+        description="False for items that are not food (containers, medicine, etc.)"
+    )
+    image_index: int = Field(
+        default=0,
+        description="Which uploaded photo the item was seen in (set by the app, not the vision model)"
+    )
+
 # model for structured ingredient extraction from image
 class ExtractedIngredients(BaseModel):
     ingredients: List[str] = Field(
         description="Comma-separated list of EVERY SINGLE item name found in the fridge (e.g., 'ketchup,milk,chicken')"
     )
+    items: List[FridgeItem] = Field(
+        default_factory=list,
+        description="Structured items from the vision call (empty when the free-text fallback was used)"
+    )
+    image_indexes: List[int] = Field(
+        default_factory=list,
+        description="Photo index for each entry in ingredients"
+    )
+
+    def cooking_ingredients(self) -> List[str]:
+        """Item names worth searching recipes with (food, not beverages)"""
+        if not self.items:
+            return self.ingredients
+        return [item.name for item in self.items if item.is_food and item.category != "beverage"]
 
 # model for recipe search parameters
 class RecipeSearchParams(BaseModel):
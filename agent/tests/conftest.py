@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# tests import main and utils.* the way the app does, from agent/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("LOGFIRE_IGNORE_NO_CONFIG", "1")
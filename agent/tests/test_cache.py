@@ -0,0 +1,53 @@
+import asyncio
+
+from utils.cache import SQLiteCache, SQLiteStore
+
+
+def make_cache(tmp_path, max_entries=2):
+    return SQLiteCache(SQLiteStore(tmp_path / "cache.sqlite3"), "test", ttl_seconds=60, max_entries=max_entries)
+
+
+def test_hit_does_not_write(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    cache.set("a", {"n": 1})
+    writes = []
+    monkeypatch.setattr(cache.store, "write", lambda *statements: writes.append(statements))
+
+    assert cache.get("a") == {"n": 1}
+    assert writes == []
+
+
+def test_hits_count_for_eviction_on_next_set(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+
+    cache.set("c", 3)
+    assert "a" in cache
+    assert "b" not in cache
+
+
+def test_async_methods_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def run():
+        await cache.aset("a", [1, 2])
+        return await cache.aget("a"), await cache.acontains("a"), await cache.aitems()
+
+    value, contained, items = asyncio.run(run())
+    assert value == [1, 2]
+    assert contained
+    assert [(key, item) for key, _, item in items] == [("a", [1, 2])]
+
+
+def test_async_len_counts_only_live_entries(tmp_path):
+    cache = make_cache(tmp_path, max_entries=10)
+    cache.set("live", 1)
+    # expired rows stay in the file until the next set() evicts them
+    cache.store.write((
+        "INSERT INTO entries (cache, key, expires_at, accessed_at, value) VALUES (?, ?, 0, 0, ?)",
+        (cache.name, "expired", b"2"),
+    ))
+
+    assert asyncio.run(cache.alen()) == 1
@@ -0,0 +1,22 @@
+from models.CompactRecipe import CompactRecipe
+
+
+def test_step_metadata_outside_short_range_round_trips():
+    data = {
+        "id": 1,
+        "title": "Slow stock",
+        "analyzedInstructions": [
+            {"number": 1, "step": "Simmer.", "length": 70000},
+            {"number": -1, "step": "Strain.", "length": None},
+            {"number": None, "step": "Serve.", "length": 5},
+        ],
+    }
+
+    record = CompactRecipe.from_dict(data)
+
+    steps = record.to_dict(include={"analyzedInstructions"})["analyzedInstructions"]
+    assert [(s["number"], s["step"], s["length"]) for s in steps] == [
+        (1, "Simmer.", 70000),
+        (-1, "Strain.", 0),
+        (0, "Serve.", 5),
+    ]
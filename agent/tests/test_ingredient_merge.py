@@ -0,0 +1,33 @@
+import asyncio
+
+import main
+from models.RecipeSearchParams import ExtractedIngredients, FridgeItem
+from utils.ingredient_merge import merge_extractions
+
+
+def extraction(*names: str) -> ExtractedIngredients:
+    return ExtractedIngredients(ingredients=list(names), items=[FridgeItem(name=name) for name in names])
+
+
+def test_merge_keeps_photo_indexes_past_a_gap():
+    merged = merge_extractions([(1, extraction("Milk", "Eggs")), (2, extraction("eggs", "Butter"))])
+    assert merged.ingredients == ["Milk", "Eggs", "Butter"]
+    assert merged.image_indexes == [1, 1, 2]
+
+
+def test_failed_photo_does_not_shift_later_indexes(monkeypatch):
+    results = {b"bad": ValueError("not an image"), b"shelf": extraction("Milk"), b"door": extraction("Ketchup")}
+
+    async def fake_extract(image_bytes: bytes) -> ExtractedIngredients:
+        result = results[image_bytes]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(main, "extract_ingredients_from_image", fake_extract)
+    merged, failed = asyncio.run(main.extract_from_images([b"bad", b"shelf", b"door"]))
+
+    assert failed == 1
+    assert merged.ingredients == ["Milk", "Ketchup"]
+    assert merged.image_indexes == [1, 2]
+    assert [item.image_index for item in merged.items] == [1, 2]
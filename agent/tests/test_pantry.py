@@ -0,0 +1,19 @@
+import asyncio
+
+from models.RecipeSearchParams import ExtractedIngredients
+from utils.pantry import PantryStore, pantry_id
+
+
+def test_only_issued_tokens_open_a_pantry(tmp_path):
+    store = PantryStore(path=tmp_path / "pantry.sqlite3")
+
+    async def run():
+        token = await store.issue_token()
+        owner = await store.owner(token)
+        await store.update(owner, ExtractedIngredients(ingredients=["Milk", "Eggs"]))
+        return token, owner, await store.owner("guessed-user-id"), await store.items(owner)
+
+    token, owner, stranger, items = asyncio.run(run())
+    assert owner == pantry_id(token) != token
+    assert stranger is None
+    assert sorted(item["name"] for item in items) == ["Eggs", "Milk"]
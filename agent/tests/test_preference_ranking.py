@@ -0,0 +1,11 @@
+from utils.preference_ranking import parse_preferences
+
+
+def test_high_protein_needs_asking_for_more_protein():
+    for message in ("something high-protein", "high protein dinner", "more protein please", "protein-packed lunch", "post-gym gains"):
+        assert "high-protein" in parse_preferences(message).keywords, message
+
+
+def test_negated_protein_is_not_a_high_protein_request():
+    for message in ("low protein please", "no protein powder", "less protein today", "what has protein in it?"):
+        assert "high-protein" not in parse_preferences(message).keywords, message
@@ -0,0 +1,49 @@
+import asyncio
+
+from utils.cache import SQLiteCache, SQLiteStore
+from utils.runs import InFlightRun, RunStore, in_flight_runs, release_in_flight
+
+
+def shared_run_stores(tmp_path, count=2):
+    """RunStores on one SQLite file, as in separate workers"""
+    stores = []
+    for _ in range(count):
+        runs = RunStore(ttl_seconds=60, max_entries=10)
+        runs._cache = SQLiteCache(SQLiteStore(tmp_path / "runs.sqlite3"), "pipeline_runs", 60, 10)
+        stores.append(runs)
+    return stores
+
+
+def test_second_worker_gets_the_run_already_bound(tmp_path):
+    first, second = shared_run_stores(tmp_path)
+
+    async def run():
+        return await first.bind_key("key", "run-a"), await second.bind_key("key", "run-b")
+
+    assert asyncio.run(run()) == ("run-a", "run-a")
+
+
+def test_save_step_is_the_only_checkpoint_write():
+    runs = RunStore(ttl_seconds=60, max_entries=10)
+
+    async def run():
+        await runs.start("run", "hash")
+        loaded = await runs.load("run")
+        await runs.save_step("run", "Extract Ingredients", {"ingredients": ["egg"]})
+        return loaded, await runs.load("run")
+
+    loaded, saved = asyncio.run(run())
+    assert loaded["steps"] == {}
+    assert saved == {"steps": {"Extract Ingredients": {"ingredients": ["egg"]}}, "images_hash": "hash"}
+
+
+def test_waiting_retry_carries_on_when_the_claim_is_released():
+    async def run():
+        claim = in_flight_runs["key"] = InFlightRun()
+        waiter = asyncio.create_task(claim.started())
+        await asyncio.sleep(0)
+        release_in_flight("key", claim)
+        return await waiter
+
+    assert asyncio.run(run()) is False
+    assert "key" not in in_flight_runs
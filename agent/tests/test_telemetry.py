@@ -0,0 +1,20 @@
+from utils import telemetry
+
+
+class RecordingSpan:
+    def __init__(self):
+        self.attributes = {}
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+def test_truncated_list_keeps_a_single_type(monkeypatch):
+    monkeypatch.setattr(telemetry, "TELEMETRY_DEBUG", False)
+    monkeypatch.setattr(telemetry, "MAX_ATTRIBUTE_ITEMS", 3)
+    span = RecordingSpan()
+
+    telemetry.set_attribute(span, "recipe_ids", list(range(5)))
+    telemetry.set_attribute(span, "names", ["a", "b"])
+
+    assert span.attributes == {"recipe_ids": [0, 1, 2], "recipe_ids.truncated": 2, "names": ["a", "b"]}
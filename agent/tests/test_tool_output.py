@@ -0,0 +1,25 @@
+from utils.recipe_columns import RecipeColumns
+from utils.tool_output import compact_stats_line
+
+
+def recipe(id, minutes, calories):
+    return {"id": id, "readyInMinutes": minutes, "nutrition": {"calories": calories} if calories is not None else None}
+
+
+def test_stats_line_skips_recipes_without_calories():
+    columns = RecipeColumns.from_recipes([recipe(1, 30, 600), recipe(2, 10, 0), recipe(3, 20, None), recipe(4, 40, 400)])
+
+    header = compact_stats_line(columns, failed_count=1).splitlines()[0]
+
+    assert header == "recipes=4 failed=1 avg_min=25 avg_kcal=500 lowest_kcal=4 quickest=2"
+
+
+def test_stats_line_for_no_recipes():
+    assert compact_stats_line(RecipeColumns.from_recipes([])).startswith("recipes=0 failed=0\n")
+
+
+def test_header_names_the_match_column_when_lines_have_it():
+    columns = RecipeColumns.from_recipes([recipe(1, 30, 600)])
+
+    assert compact_stats_line(columns).endswith("\nid|title|time|macros|ingredients|steps")
+    assert compact_stats_line(columns, with_match=True).endswith("\nid|title|time|macros|ingredients|steps|match")
@@ -0,0 +1,142 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from utils.metrics import SINGLE_FLIGHT_CALLS
+
+# Request coalescing helpers.
+#
+# TaskMemo runs each distinct key's coroutine once and hands the same result
+# to every caller, including callers that arrive while it is still running.
+# BatchLoader collects keys requested by concurrent callers for a short window
+# and loads them with one bulk call (the DataLoader pattern). Both live for one
+# /chat/batch request.
+#
+# SingleFlight is the process-wide counterpart for /chat: while a key's call is
+# in flight, identical calls from other requests wait for it instead of making
+# their own; once it finishes the key is forgotten (the result caches take it
+# from there).
+
+
+class TaskMemo:
+    """Run each key's coroutine once; concurrent and later callers share the result"""
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+        # shield so one cancelled caller doesn't cancel the work others wait on
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+class SingleFlight:
+    """
+    Share one in-flight call per key among concurrent callers.
+
+    The first caller (the leader) starts the call as its own task; everyone
+    awaits it through a shield, so a caller that is cancelled (a client
+    disconnecting, the leader included) only stops waiting. The call runs to
+    completion for the others and for the caches it fills.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            SINGLE_FLIGHT_CALLS.labels(operation=self.name, role="leader").inc()
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            SINGLE_FLIGHT_CALLS.labels(operation=self.name, role="follower").inc()
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, so a failure nobody waited for isn't logged as unhandled
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+class BatchLoader:
+    """
+    Coalesce lookups from concurrent callers into bulk loads.
+
+    Keys are memoized for the loader's lifetime, so each key is loaded at
+    most once. A batch is flushed after `delay` seconds or as soon as it
+    reaches `max_batch` keys.
+    """
+
+    def __init__(
+        self,
+        load_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        max_batch: int = 100,
+        delay: float = 0.02,
+    ):
+        self._load_many = load_many
+        self.max_batch = max_batch
+        self.delay = delay
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._pending: List[Hashable] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+
+    async def load_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Values for the keys the bulk load returned (missing keys are left out)"""
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for key in keys:
+            future = self._futures.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._futures[key] = future
+                self._pending.append(key)
+            futures[key] = future
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._pending and self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.delay, self._flush)
+
+        results = {}
+        for key, future in futures.items():
+            value = await asyncio.shield(future)
+            if value is not None:
+                results[key] = value
+        return results
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._pending:
+            keys, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.ensure_future(self._load(keys))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, keys: List[Hashable]) -> None:
+        self.batches += 1
+        try:
+            values = await self._load_many(keys)
+        except Exception as e:
+            for key in keys:
+                if not self._futures[key].done():
+                    self._futures[key].set_exception(e)
+            return
+        for key in keys:
+            if not self._futures[key].done():
+                self._futures[key].set_result(values.get(key))
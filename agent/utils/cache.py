@@ -0,0 +1,387 @@
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.json_codec import dumps, loads
+from utils.metrics import CACHE_REQUESTS
+
+# TTL caches for upstream results. Values must be JSON-compatible (dicts,
+# lists, strings, numbers) so they can be snapshotted or shared.
+#
+# With CACHE_BACKEND=memory (the default) each process keeps its own LRU. With
+# CACHE_BACKEND=sqlite every worker on the node shares one SQLite file, so a
+# recipe, search or image paid for by one worker is a hit in all of them.
+# Async code uses the a* methods (aget, aset, ...), which run SQLite calls on
+# the store's own thread so a busy database never stalls the event loop.
+#
+#   CACHE_BACKEND                   memory|sqlite (default memory)
+#   CACHE_SQLITE_PATH               shared cache file (default cache/fridger-cache.sqlite3)
+#   RECIPE_CACHE_TTL_SECONDS        details TTL (default 3600)
+#   RECIPE_CACHE_MAX_ENTRIES        details entries kept (default 2000)
+#   SEARCH_CACHE_TTL_SECONDS        findByIngredients TTL (default 1800)
+#   SEARCH_CACHE_MAX_ENTRIES        search entries kept (default 500)
+#   VISION_CACHE_TTL_SECONDS        fridge image analysis TTL (default 86400)
+#   VISION_CACHE_MAX_ENTRIES        vision entries kept (default 500)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_SQLITE_PATH = Path(os.getenv("CACHE_SQLITE_PATH", "cache/fridger-cache.sqlite3"))
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries expire after a TTL"""
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 1024):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+            return None
+
+        self._entries.move_to_end(key)
+        CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def expires_at(self, key: str) -> Optional[float]:
+        """Expiry timestamp of a live entry, without counting a lookup"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[0]
+
+    def items(self) -> Iterator[Tuple[str, float, Any]]:
+        """(key, expires_at, value) for every live entry, oldest first"""
+        now = time.time()
+        for key, (expires_at, value) in list(self._entries.items()):
+            if expires_at > now:
+                yield key, expires_at, value
+
+    def _live_value(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None and entry[0] > time.time() else None
+
+    def setdefault(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> Any:
+        """The live value for key, or store `value` and return it"""
+        current = self._live_value(key)
+        if current is not None:
+            return current
+        self.set(key, value, ttl_seconds)
+        return value
+
+    def update(self, key: str, fn: Callable[[Optional[Any]], Any], ttl_seconds: Optional[float] = None) -> Any:
+        """Store fn(live value or None) under key and return it"""
+        value = fn(self._live_value(key))
+        self.set(key, value, ttl_seconds)
+        return value
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.time()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # in memory nothing blocks, so the async forms run inline
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self.set(key, value, ttl_seconds)
+
+    async def acontains(self, key: str) -> bool:
+        return key in self
+
+    async def aexpires_at(self, key: str) -> Optional[float]:
+        return self.expires_at(key)
+
+    async def asetdefault(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> Any:
+        return self.setdefault(key, value, ttl_seconds)
+
+    async def aupdate(self, key: str, fn: Callable[[Optional[Any]], Any], ttl_seconds: Optional[float] = None) -> Any:
+        return self.update(key, fn, ttl_seconds)
+
+    async def aitems(self) -> List[Tuple[str, float, Any]]:
+        return list(self.items())
+
+    async def alen(self) -> int:
+        """Number of live entries (len() also counts expired ones not yet dropped)"""
+        now = time.time()
+        return sum(1 for expires_at, _ in self._entries.values() if expires_at > now)
+
+
+CACHE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS entries ("
+    " cache TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL,"
+    " accessed_at REAL NOT NULL, value BLOB NOT NULL,"
+    " PRIMARY KEY (cache, key))",
+    "CREATE INDEX IF NOT EXISTS entries_lru ON entries (cache, accessed_at)",
+    "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)",
+)
+
+
+class SQLiteStore:
+    """
+    One SQLite file shared by every worker on the node.
+
+    WAL mode lets readers run alongside a writer; writes take the database
+    lock with BEGIN IMMEDIATE and wait up to the busy timeout for it, so
+    concurrent workers serialize instead of failing. Within a process the
+    connection is guarded by a lock; async callers go through call(), which
+    runs on one dedicated thread so the event loop never waits on the lock.
+    """
+
+    def __init__(self, path: Path, schema: Sequence[str] = CACHE_SCHEMA):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        for statement in schema:
+            self._conn.execute(statement)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sqlite-{path.stem}")
+
+    async def call(self, fn: Callable, *args: Any) -> Any:
+        """Run a blocking store operation off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def read(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def write(self, *statements: Tuple[str, tuple]) -> int:
+        """Run statements in one write transaction; returns the last rowcount"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rowcount = 0
+                for sql, params in statements:
+                    rowcount = self._conn.execute(sql, params).rowcount
+                self._conn.execute("COMMIT")
+                return rowcount
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def transaction(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run fn(connection) in one write transaction, for read-modify-write"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """Take or renew a named lease; only one holder across processes at a time"""
+        now = time.time()
+        return self.write((
+            "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at"
+            " WHERE leases.holder = excluded.holder OR leases.expires_at <= ?",
+            (name, holder, now + ttl_seconds, now),
+        )) > 0
+
+    def release_lease(self, name: str, holder: str) -> None:
+        self.write(("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder)))
+
+
+class SQLiteCache:
+    """
+    TTLCache interface over a shared SQLiteStore; approximately LRU by last access.
+
+    Hits are read-only: access times are noted in memory and written with the
+    next set() in this process, which is the only place entries are evicted.
+    """
+
+    def __init__(self, store: SQLiteStore, name: str, ttl_seconds: float, max_entries: int = 1024):
+        self.store = store
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._touched: Dict[str, float] = {}  # key -> last hit, not yet written
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        rows = self.store.read(
+            "SELECT value FROM entries WHERE cache = ? AND key = ? AND expires_at > ?",
+            (self.name, key, now),
+        )
+        if not rows:
+            CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+            return None
+
+        if len(self._touched) < self.max_entries:
+            self._touched[key] = now
+        CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+        return loads(rows[0][0])
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        touched, self._touched = self._touched, {}
+        self.store.write(
+            *(
+                ("UPDATE entries SET accessed_at = ? WHERE cache = ? AND key = ?", (accessed_at, self.name, touched_key))
+                for touched_key, accessed_at in touched.items()
+            ),
+            (
+                "INSERT OR REPLACE INTO entries (cache, key, expires_at, accessed_at, value) VALUES (?, ?, ?, ?, ?)",
+                (self.name, key, expires_at, now, dumps(value)),
+            ),
+            # expired entries first, then least recently used beyond max_entries
+            ("DELETE FROM entries WHERE cache = ? AND expires_at <= ?", (self.name, now)),
+            (
+                "DELETE FROM entries WHERE cache = ? AND key IN ("
+                " SELECT key FROM entries WHERE cache = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.name, self.name, self.max_entries),
+            ),
+        )
+
+    def expires_at(self, key: str) -> Optional[float]:
+        rows = self.store.read(
+            "SELECT expires_at FROM entries WHERE cache = ? AND key = ? AND expires_at > ?",
+            (self.name, key, time.time()),
+        )
+        return rows[0][0] if rows else None
+
+    def _live_value(self, conn: sqlite3.Connection, key: str, now: float) -> Optional[Any]:
+        row = conn.execute(
+            "SELECT value FROM entries WHERE cache = ? AND key = ? AND expires_at > ?",
+            (self.name, key, now),
+        ).fetchone()
+        return loads(row[0]) if row else None
+
+    def _put(self, conn: sqlite3.Connection, key: str, value: Any, now: float, ttl_seconds: Optional[float]) -> None:
+        expires_at = now + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (cache, key, expires_at, accessed_at, value) VALUES (?, ?, ?, ?, ?)",
+            (self.name, key, expires_at, now, dumps(value)),
+        )
+
+    def setdefault(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> Any:
+        """The live value for key, or store `value` and return it; atomic across workers"""
+        def run(conn: sqlite3.Connection) -> Any:
+            now = time.time()
+            current = self._live_value(conn, key, now)
+            if current is not None:
+                return current
+            self._put(conn, key, value, now, ttl_seconds)
+            return value
+        return self.store.transaction(run)
+
+    def update(self, key: str, fn: Callable[[Optional[Any]], Any], ttl_seconds: Optional[float] = None) -> Any:
+        """Store fn(live value or None) under key and return it; atomic across workers"""
+        def run(conn: sqlite3.Connection) -> Any:
+            now = time.time()
+            value = fn(self._live_value(conn, key, now))
+            self._put(conn, key, value, now, ttl_seconds)
+            return value
+        return self.store.transaction(run)
+
+    def items(self) -> Iterator[Tuple[str, float, Any]]:
+        rows = self.store.read(
+            "SELECT key, expires_at, value FROM entries WHERE cache = ? AND expires_at > ? ORDER BY accessed_at",
+            (self.name, time.time()),
+        )
+        for key, expires_at, value in rows:
+            yield key, expires_at, loads(value)
+
+    def delete(self, key: str) -> None:
+        self.store.write(("DELETE FROM entries WHERE cache = ? AND key = ?", (self.name, key)))
+
+    def clear(self) -> None:
+        self.store.write(("DELETE FROM entries WHERE cache = ?", (self.name,)))
+
+    def __contains__(self, key: str) -> bool:
+        return self.expires_at(key) is not None
+
+    def __len__(self) -> int:
+        return self.store.read(
+            "SELECT COUNT(*) FROM entries WHERE cache = ? AND expires_at > ?",
+            (self.name, time.time()),
+        )[0][0]
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await self.store.call(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        await self.store.call(self.set, key, value, ttl_seconds)
+
+    async def acontains(self, key: str) -> bool:
+        return await self.store.call(self.__contains__, key)
+
+    async def aexpires_at(self, key: str) -> Optional[float]:
+        return await self.store.call(self.expires_at, key)
+
+    async def asetdefault(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> Any:
+        return await self.store.call(self.setdefault, key, value, ttl_seconds)
+
+    async def aupdate(self, key: str, fn: Callable[[Optional[Any]], Any], ttl_seconds: Optional[float] = None) -> Any:
+        return await self.store.call(self.update, key, fn, ttl_seconds)
+
+    async def aitems(self) -> List[Tuple[str, float, Any]]:
+        return await self.store.call(lambda: list(self.items()))
+
+    async def alen(self) -> int:
+        return await self.store.call(self.__len__)
+
+
+shared_store = SQLiteStore(CACHE_SQLITE_PATH) if CACHE_BACKEND == "sqlite" else None
+
+
+def make_cache(name: str, ttl_seconds: float, max_entries: int):
+    """Cache on the configured backend"""
+    if shared_store is not None:
+        return SQLiteCache(shared_store, name, ttl_seconds, max_entries)
+    return TTLCache(name, ttl_seconds, max_entries)
+
+
+recipe_details_cache = make_cache(
+    "recipe_details",
+    ttl_seconds=float(os.getenv("RECIPE_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", "2000")),
+)
+
+search_results_cache = make_cache(
+    "recipe_search",
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "1800")),
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "500")),
+)
+
+vision_results_cache = make_cache(
+    "vision_results",
+    ttl_seconds=float(os.getenv("VISION_CACHE_TTL_SECONDS", "86400")),
+    max_entries=int(os.getenv("VISION_CACHE_MAX_ENTRIES", "500")),
+)
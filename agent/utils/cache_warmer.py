@@ -0,0 +1,242 @@
+import asyncio
+import os
+import socket
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import logfire
+
+from utils.cache import CACHE_BACKEND, SQLiteCache, TTLCache, shared_store
+from utils.json_codec import dumps, loads
+from utils.metrics import CACHE_REFRESHES
+
+# Background refresh for popular cache entries.
+#
+# Callers record which keys they serve; every CACHE_WARMER_INTERVAL seconds the
+# warmer refreshes the most popular keys that are missing or expire within
+# CACHE_WARMER_REFRESH_WINDOW seconds, so hot entries are replaced before they
+# expire and readers keep getting the old value meanwhile. A key served while
+# already inside the window is revalidated right away instead of waiting for
+# the next tick.
+#
+# With CACHE_SNAPSHOT_PATH set, live entries and popularity counts are saved on
+# shutdown and loaded on startup; popular keys whose entries expired while the
+# app was down are fetched on the first tick.
+#
+# With the shared SQLite cache (multi-worker mode) only the worker holding the
+# warmer lease refreshes, so extra workers don't multiply upstream calls, and
+# snapshots are skipped since the cache file already survives restarts.
+#
+#   CACHE_WARMER=0                        disable the warmer
+#   CACHE_WARMER_INTERVAL                 seconds between ticks (default 60)
+#   CACHE_WARMER_REFRESH_WINDOW           refresh-ahead window (default 300)
+#   CACHE_WARMER_TOP_N                    keys considered per cache (default 50)
+#   CACHE_WARMER_CONCURRENCY              concurrent refreshes (default 2)
+#   CACHE_WARMER_MAX_REFRESHES_PER_HOUR   upstream quota for refreshes (default 300)
+#   CACHE_SNAPSHOT_PATH                   snapshot file (memory backend; disabled when unset)
+
+CACHE_WARMER = os.getenv("CACHE_WARMER", "1").lower() not in ("0", "false", "off", "no")
+CACHE_WARMER_INTERVAL = float(os.getenv("CACHE_WARMER_INTERVAL", "60"))
+CACHE_WARMER_REFRESH_WINDOW = float(os.getenv("CACHE_WARMER_REFRESH_WINDOW", "300"))
+CACHE_WARMER_TOP_N = int(os.getenv("CACHE_WARMER_TOP_N", "50"))
+CACHE_WARMER_CONCURRENCY = int(os.getenv("CACHE_WARMER_CONCURRENCY", "2"))
+CACHE_WARMER_MAX_REFRESHES_PER_HOUR = int(os.getenv("CACHE_WARMER_MAX_REFRESHES_PER_HOUR", "300"))
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH") if CACHE_BACKEND == "memory" else None
+
+# popularity counts are halved every tick so old favourites fade out
+POPULARITY_DECAY = 0.5
+# counters are trimmed to this many keys per cache
+POPULARITY_MAX_KEYS = 1000
+
+SNAPSHOT_VERSION = 1
+
+LEASE_NAME = "cache_warmer"
+
+Refresher = Callable[[str], Awaitable[None]]
+
+
+class CacheWarmer:
+    """Tracks key popularity and refreshes hot entries ahead of expiry"""
+
+    def __init__(
+        self,
+        interval: float = CACHE_WARMER_INTERVAL,
+        refresh_window: float = CACHE_WARMER_REFRESH_WINDOW,
+        top_n: int = CACHE_WARMER_TOP_N,
+        concurrency: int = CACHE_WARMER_CONCURRENCY,
+        max_refreshes_per_hour: int = CACHE_WARMER_MAX_REFRESHES_PER_HOUR,
+    ):
+        self.interval = interval
+        self.refresh_window = refresh_window
+        self.top_n = top_n
+        self.max_refreshes_per_hour = max_refreshes_per_hour
+        self._caches: Dict[str, TTLCache] = {}
+        self._refreshers: Dict[str, Refresher] = {}
+        self._popularity: Dict[str, Counter] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight: set = set()
+        self._refresh_times: deque = deque()
+        self._tasks: set = set()
+        self._holder = f"{socket.gethostname()}:{os.getpid()}"
+        # without a shared store every process warms its own cache
+        self._leader = shared_store is None
+
+    def register(self, cache: TTLCache | SQLiteCache, refresher: Refresher) -> None:
+        """
+        Warm `cache` with `refresher`, which must fetch the key from upstream
+        (bypassing the cache) and store the result in the cache.
+        """
+        self._caches[cache.name] = cache
+        self._refreshers[cache.name] = refresher
+        self._popularity.setdefault(cache.name, Counter())
+
+    async def record(self, cache_name: str, key: str) -> None:
+        """Count one use of a key; revalidate it now if it is about to expire"""
+        counter = self._popularity.get(cache_name)
+        if counter is None:
+            return
+        counter[key] += 1
+
+        expires_at = await self._caches[cache_name].aexpires_at(key)
+        if self._leader and expires_at is not None and expires_at - time.time() < self.refresh_window:
+            self._spawn(self._refresh(cache_name, key))
+
+    def popular(self, cache_name: str, n: Optional[int] = None) -> List[str]:
+        return [key for key, _ in self._popularity[cache_name].most_common(n or self.top_n)]
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _take_quota(self) -> bool:
+        """Sliding one-hour window over refreshes made"""
+        now = time.monotonic()
+        while self._refresh_times and now - self._refresh_times[0] > 3600:
+            self._refresh_times.popleft()
+        if len(self._refresh_times) >= self.max_refreshes_per_hour:
+            return False
+        self._refresh_times.append(now)
+        return True
+
+    async def _refresh(self, cache_name: str, key: str) -> None:
+        in_flight_key = (cache_name, key)
+        if in_flight_key in self._in_flight:
+            return
+        self._in_flight.add(in_flight_key)
+        try:
+            async with self._semaphore:
+                if not self._take_quota():
+                    CACHE_REFRESHES.labels(cache=cache_name, result="quota_exceeded").inc()
+                    return
+                try:
+                    await self._refreshers[cache_name](key)
+                    CACHE_REFRESHES.labels(cache=cache_name, result="ok").inc()
+                except Exception as e:
+                    CACHE_REFRESHES.labels(cache=cache_name, result="error").inc()
+                    logfire.warning(f"Cache refresh failed for {cache_name}:{key}: {str(e)}")
+        finally:
+            self._in_flight.discard(in_flight_key)
+
+    def due(self, cache_name: str) -> List[str]:
+        """Popular keys that are missing or inside the refresh window"""
+        cache = self._caches[cache_name]
+        deadline = time.time() + self.refresh_window
+        due = []
+        for key in self.popular(cache_name):
+            expires_at = cache.expires_at(key)
+            if expires_at is None or expires_at < deadline:
+                due.append(key)
+        return due
+
+    async def _renew_leadership(self) -> None:
+        if shared_store is None:
+            return
+        # the lease outlives a couple of missed ticks before another worker takes over
+        self._leader = await shared_store.call(shared_store.acquire_lease, LEASE_NAME, self._holder, self.interval * 3)
+
+    async def _due(self, cache_name: str) -> List[str]:
+        if shared_store is None:
+            return self.due(cache_name)
+        return await shared_store.call(self.due, cache_name)
+
+    async def tick(self) -> None:
+        await self._renew_leadership()
+        refreshes = [
+            self._refresh(cache_name, key)
+            for cache_name in self._caches
+            for key in await self._due(cache_name)
+        ] if self._leader else []
+        if refreshes:
+            logfire.info(f"Cache warmer refreshing {len(refreshes)} entries")
+            await asyncio.gather(*refreshes)
+
+        for cache_name, counter in self._popularity.items():
+            decayed = Counter({
+                key: count * POPULARITY_DECAY
+                for key, count in counter.most_common(POPULARITY_MAX_KEYS)
+                if count * POPULARITY_DECAY >= 0.5
+            })
+            self._popularity[cache_name] = decayed
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logfire.error(f"Cache warmer tick failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if shared_store is not None and self._leader:
+            await shared_store.call(shared_store.release_lease, LEASE_NAME, self._holder)
+
+    # --- snapshots ---
+
+    def save_snapshot(self, path: Path) -> None:
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "saved_at": time.time(),
+            "caches": {
+                cache_name: {
+                    "entries": [[key, expires_at, value] for key, expires_at, value in cache.items()],
+                    "popularity": dict(self._popularity[cache_name].most_common(POPULARITY_MAX_KEYS)),
+                }
+                for cache_name, cache in self._caches.items()
+            },
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so a crash mid-write never leaves a torn snapshot
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_bytes(dumps(snapshot))
+        os.replace(tmp_path, path)
+        logfire.info(f"Saved cache snapshot to {path}")
+
+    def load_snapshot(self, path: Path) -> None:
+        if not path.exists():
+            return
+        snapshot = loads(path.read_bytes())
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            logfire.warning(f"Ignoring cache snapshot {path} with unknown version")
+            return
+
+        now = time.time()
+        loaded = 0
+        for cache_name, data in snapshot.get("caches", {}).items():
+            cache = self._caches.get(cache_name)
+            if cache is None:
+                continue
+            for key, expires_at, value in data.get("entries", []):
+                if expires_at > now:
+                    cache.set(key, value, ttl_seconds=expires_at - now)
+                    loaded += 1
+            self._popularity[cache_name].update(data.get("popularity", {}))
+        logfire.info(f"Loaded {loaded} cache entries from {path}")
+
+
+cache_warmer = CacheWarmer()
@@ -0,0 +1,189 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+
+import httpx
+
+from utils.metrics import dependency_for
+
+# Record/replay of external calls (Spoonacular and Gemini) to cassette files.
+#
+#   CASSETTE_MODE=off|record|replay     default off
+#   CASSETTE_DIR                        where cassettes live (default ./cassettes)
+#   CASSETTE_REPLAY_LATENCY=1           sleep for the recorded latency when replaying
+#
+# Cassettes are keyed on method, URL without credentials and a hash of the
+# request body, so API keys never end up on disk.
+
+CASSETTE_FORMAT_VERSION = 1
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_DIR = Path(os.getenv("CASSETTE_DIR", "cassettes"))
+CASSETTE_REPLAY_LATENCY = os.getenv("CASSETTE_REPLAY_LATENCY", "").lower() in ("1", "true", "yes", "on")
+
+# query parameters that carry credentials
+SECRET_PARAMS = {"apikey", "api_key", "key"}
+
+# response headers worth keeping (content is stored decoded)
+KEPT_HEADERS = {"content-type", "x-api-quota-request", "x-api-quota-used", "x-api-quota-left"}
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when no cassette exists for a request"""
+
+
+def cassettes_enabled() -> bool:
+    return CASSETTE_MODE in ("record", "replay")
+
+
+def sanitized_url(url: httpx.URL) -> str:
+    params = sorted((k, v) for k, v in url.params.multi_items() if k.lower() not in SECRET_PARAMS)
+    return str(url.copy_with(query=None, fragment=None).copy_merge_params(params))
+
+
+def cassette_key(*parts: bytes | str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode() if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def _cassette_path(group: str, key: str) -> Path:
+    return CASSETTE_DIR / f"v{CASSETTE_FORMAT_VERSION}" / group / f"{key}.json"
+
+
+def _write_cassette(path: Path, payload: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write then rename so concurrent readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(payload, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _read_cassette(path: Path) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        return None
+    if payload.get("version") != CASSETTE_FORMAT_VERSION:
+        return None
+    return payload
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records responses to, or replays them from, cassettes"""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None, mode: str = CASSETTE_MODE):
+        self._transport = transport or httpx.AsyncHTTPTransport()
+        self.mode = mode
+
+    def _locate(self, request: httpx.Request) -> tuple[Path, str]:
+        url = sanitized_url(request.url)
+        key = cassette_key(request.method, url, hashlib.sha256(request.content).hexdigest())
+        return _cassette_path(dependency_for(request.url), key), url
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        path, url = self._locate(request)
+
+        if self.mode == "replay":
+            payload = _read_cassette(path)
+            if payload is None:
+                raise CassetteMissError(f"No cassette for {request.method} {url} ({path})")
+            if CASSETTE_REPLAY_LATENCY:
+                await asyncio.sleep(payload["elapsed_ms"] / 1000)
+            response = payload["response"]
+            content = base64.b64decode(response["body_b64"]) if "body_b64" in response else response["body"].encode()
+            return httpx.Response(response["status"], headers=response["headers"], content=content, request=request)
+
+        start = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        content = await response.aread()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if self.mode == "record":
+            stored = {
+                "status": response.status_code,
+                "headers": {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS},
+            }
+            try:
+                stored["body"] = content.decode()
+            except UnicodeDecodeError:
+                stored["body_b64"] = base64.b64encode(content).decode()
+            _write_cassette(path, {
+                "version": CASSETTE_FORMAT_VERSION,
+                "request": {"method": request.method, "url": url},
+                "elapsed_ms": round(elapsed_ms, 1),
+                "response": stored,
+            })
+
+        return httpx.Response(
+            response.status_code,
+            headers=[(k, v) for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length")],
+            content=content,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def cassette_transport() -> Optional[httpx.AsyncBaseTransport]:
+    """Base transport for outbound clients (None when cassettes are off)"""
+    if not cassettes_enabled():
+        return None
+    return CassetteTransport()
+
+
+class CassetteVisionModel:
+    """
+    Wraps a google.generativeai model so generate_content is recorded/replayed.
+    Keyed on the prompt, the decoded image pixels and the generation config.
+    """
+
+    def __init__(self, model, mode: str = CASSETTE_MODE):
+        self._model = model
+        self.mode = mode
+
+    def _key(self, contents, generation_config) -> str:
+        parts = []
+        for item in contents:
+            if isinstance(item, str):
+                parts.append(item)
+            elif hasattr(item, "tobytes"):
+                parts.append(hashlib.sha256(item.tobytes()).hexdigest())
+            else:
+                parts.append(repr(item))
+        parts.append(repr(generation_config))
+        return cassette_key(*parts)
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        path = _cassette_path("gemini-vision", self._key(contents, generation_config))
+
+        if self.mode == "replay":
+            payload = _read_cassette(path)
+            if payload is None:
+                raise CassetteMissError(f"No vision cassette at {path}")
+            if CASSETTE_REPLAY_LATENCY:
+                time.sleep(payload["elapsed_ms"] / 1000)
+            return SimpleNamespace(text=payload["response"]["text"])
+
+        start = time.perf_counter()
+        response = self._model.generate_content(contents, generation_config=generation_config, **kwargs)
+        if self.mode == "record":
+            _write_cassette(path, {
+                "version": CASSETTE_FORMAT_VERSION,
+                "request": {"kind": "vision"},
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+                "response": {"text": response.text},
+            })
+        return response
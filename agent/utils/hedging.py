@@ -0,0 +1,159 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+
+from utils.metrics import HEDGED_REQUESTS
+
+# Hedged GETs for idempotent upstream calls (Spoonacular search and details).
+#
+# If a response hasn't arrived after the HEDGE_PERCENTILE latency of recent
+# calls to the same operation, a second identical request is sent; whichever
+# answers first is used and the other is cancelled. A failed or 5xx answer
+# doesn't win while the other request is still running.
+#
+# Hedges are paid for with a token budget: every original request adds
+# HEDGE_MAX_RATE tokens (capped at HEDGE_BURST) and a hedge spends one, so
+# hedges stay under that fraction of requests over time even when the
+# upstream slows down across the board.
+#
+#   HEDGE_REQUESTS=1            enable hedging (off by default)
+#   HEDGE_PERCENTILE            latency percentile to wait before hedging (default 95)
+#   HEDGE_MIN_DELAY_MS          never hedge sooner than this (default 50)
+#   HEDGE_DEFAULT_DELAY_MS      delay until enough latencies are recorded (default 1000)
+#   HEDGE_MAX_RATE              hedges per original request (default 0.05)
+#   HEDGE_BURST                 hedge tokens that can accumulate (default 5)
+#   HEDGE_WINDOW                latencies kept per operation (default 500)
+
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "0").lower() in ("1", "true", "on", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "1000"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.05"))
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "5"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))
+
+# latencies needed before the percentile is trusted over the default delay
+MIN_SAMPLES = 20
+
+
+class LatencyWindow:
+    """Recent latencies for one operation and the hedge delay derived from them"""
+
+    def __init__(self, size: int = HEDGE_WINDOW):
+        self._samples: deque = deque(maxlen=size)
+        self._sorted: Optional[list] = None
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> float:
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        index = min(len(self._sorted) - 1, int(len(self._sorted) * p / 100))
+        return self._sorted[index]
+
+    def hedge_delay(self) -> float:
+        if len(self) < MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_MS / 1000
+        return max(HEDGE_MIN_DELAY_MS / 1000, self.percentile(HEDGE_PERCENTILE))
+
+
+class HedgeBudget:
+    """Token bucket refilled by original requests, spent by hedges"""
+
+    def __init__(self, rate: float = HEDGE_MAX_RATE, burst: float = HEDGE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.rate)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def _usable(task: asyncio.Future) -> bool:
+    return task.exception() is None and task.result().status_code < 500
+
+
+class Hedger:
+    def __init__(self, enabled: bool = HEDGE_REQUESTS):
+        self.enabled = enabled
+        self.budget = HedgeBudget()
+        self._windows: Dict[str, LatencyWindow] = {}
+
+    def window(self, operation: str) -> LatencyWindow:
+        window = self._windows.get(operation)
+        if window is None:
+            window = self._windows[operation] = LatencyWindow()
+        return window
+
+    async def _timed_get(self, client: httpx.AsyncClient, url: str, params: Any, operation: str) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.get(url, params=params)
+        if response.status_code < 500:
+            self.window(operation).record(time.perf_counter() - start)
+        return response
+
+    async def get(self, client: httpx.AsyncClient, url: str, operation: str, params: Any = None) -> httpx.Response:
+        """
+        GET `url`, hedged when enabled.
+
+        Args:
+            client: httpx client to send both requests with
+            url: Request URL (must be safe to send twice)
+            operation: Name the latency window and metrics are kept under
+            params: Query parameters
+
+        Returns:
+            The first usable response
+        """
+        if not self.enabled:
+            return await client.get(url, params=params)
+
+        self.budget.deposit()
+        primary = asyncio.ensure_future(self._timed_get(client, url, params, operation))
+        tasks = [primary]
+        # cancelling the caller cancels whatever is still in flight
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.window(operation).hedge_delay())
+            if done:
+                return primary.result()
+
+            if not self.budget.withdraw():
+                HEDGED_REQUESTS.labels(operation=operation, outcome="budget_exhausted").inc()
+                return await primary
+
+            HEDGED_REQUESTS.labels(operation=operation, outcome="fired").inc()
+            hedge = asyncio.ensure_future(self._timed_get(client, url, params, operation))
+            tasks.append(hedge)
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if _usable(task)), None)
+                if winner is None and not pending:
+                    # both failed: a response (raised for status by the caller) beats an exception
+                    winner = next((task for task in done if task.exception() is None), next(iter(done)))
+                if winner is not None:
+                    HEDGED_REQUESTS.labels(operation=operation, outcome="won" if winner is hedge else "lost").inc()
+                    return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # retrieved, so a losing failure isn't logged as unhandled
+
+hedger = Hedger()
@@ -0,0 +1,66 @@
+import difflib
+import os
+import re
+from typing import List, Tuple
+
+from models.RecipeSearchParams import ExtractedIngredients, FridgeItem
+
+# Merging ingredient lists extracted from several photos of the same fridge.
+#
+# The same item is often visible in more than one shot and the vision model
+# names it slightly differently each time ("Heinz ketchup" / "heinz tomato
+# ketchup"), so names are compared after normalization with difflib and
+# near-duplicates are kept once, attributed to the first photo they appear in.
+#
+#   INGREDIENT_DEDUPE_THRESHOLD     similarity ratio treated as the same item (default 0.85)
+
+INGREDIENT_DEDUPE_THRESHOLD = float(os.getenv("INGREDIENT_DEDUPE_THRESHOLD", "0.85"))
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9 ]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_name(name: str) -> str:
+    name = _NON_WORD_RE.sub(" ", name.lower())
+    name = _SPACES_RE.sub(" ", name).strip()
+    # naive singular so "eggs" and "egg" compare equal
+    return " ".join(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+                    for word in name.split())
+
+
+def merge_extractions(
+    extractions: List[Tuple[int, ExtractedIngredients]],
+    threshold: float = INGREDIENT_DEDUPE_THRESHOLD,
+) -> ExtractedIngredients:
+    """
+    Merge per-photo extractions into one, dropping fuzzy duplicates.
+
+    Args:
+        extractions: (photo index, ExtractedIngredients) for each photo that was
+            analyzed, in upload order; photos that failed are simply absent
+        threshold: difflib ratio at or above which two names are the same item
+
+    Returns:
+        ExtractedIngredients whose items and image_indexes say which photo each came from
+    """
+    structured = any(extraction.items for _, extraction in extractions)
+    kept_names: List[str] = []
+    merged: List[FridgeItem] = []
+
+    for image_index, extraction in extractions:
+        # free-text fallback results become plain items so they merge the same way
+        items = extraction.items or [FridgeItem(name=name) for name in extraction.ingredients]
+        for item in items:
+            name = normalize_name(item.name)
+            if not name:
+                continue
+            if name in kept_names or difflib.get_close_matches(name, kept_names, n=1, cutoff=threshold):
+                continue
+            kept_names.append(name)
+            merged.append(item.model_copy(update={"image_index": image_index}))
+
+    return ExtractedIngredients(
+        ingredients=[item.name for item in merged],
+        items=merged if structured else [],
+        image_indexes=[item.image_index for item in merged],
+    )
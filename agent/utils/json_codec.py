@@ -0,0 +1,57 @@
+import json
+import os
+from typing import Any
+
+from pydantic import BaseModel
+
+# JSON encoding/decoding for the response path, with a pluggable backend.
+#
+#   JSON_BACKEND=orjson|json     default orjson when installed
+#
+# Pydantic models can be embedded anywhere in an event; they are serialized
+# by pydantic-core directly instead of going through an intermediate dict.
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson" if orjson else "json").lower()
+if JSON_BACKEND == "orjson" and orjson is None:
+    JSON_BACKEND = "json"
+
+# orjson.Fragment (orjson >= 3.9) embeds already-serialized JSON without re-parsing it
+_HAS_FRAGMENT = orjson is not None and hasattr(orjson, "Fragment")
+
+
+def _orjson_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        if _HAS_FRAGMENT:
+            return orjson.Fragment(obj.__pydantic_serializer__.to_json(obj))
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    if JSON_BACKEND == "orjson":
+        return orjson.dumps(obj, default=_orjson_default)
+    return json.dumps(obj, default=_json_default, ensure_ascii=False).encode()
+
+
+def ndjson_line(obj: Any) -> bytes:
+    """Encode one NDJSON event, newline included"""
+    if JSON_BACKEND == "orjson":
+        return orjson.dumps(obj, default=_orjson_default, option=orjson.OPT_APPEND_NEWLINE)
+    return dumps(obj) + b"\n"
+
+
+def loads(data: bytes | str) -> Any:
+    if JSON_BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
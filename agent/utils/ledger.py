@@ -0,0 +1,341 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from utils.metrics import (
+    DEGRADED_REQUESTS,
+    MODEL_TOKENS,
+    REQUEST_POINTS,
+    REQUEST_TOKENS,
+    SPOONACULAR_POINTS,
+    TRANSFER_BYTES,
+    dependency_for,
+    operation_for,
+)
+
+# Per-request cost accounting and budgets.
+#
+# Every /chat request carries a CostLedger (on Deps, and in a context variable
+# so tools, the vision call and the httpx transport can reach it without being
+# handed it). Each pipeline step gets an entry with the model tokens it used,
+# the Spoonacular points it was charged (the X-API-Quota-Request header),
+# bytes sent and received, and its wall time. The ledger goes out with the
+# final event and the same numbers feed the Prometheus counters.
+#
+# Budgets (0 disables each limit):
+#   - per request: once a request has spent COST_REQUEST_MAX_POINTS or
+#     COST_REQUEST_MAX_TOKENS, it finishes with search previews instead of
+#     fetching recipe details
+#   - per day (UTC, per process): past COST_DEGRADE_AT of COST_DAILY_MAX_POINTS
+#     or COST_DAILY_MAX_TOKENS every request gets previews only; past the
+#     limit new runs are refused with 429 until midnight. Spoonacular's
+#     X-API-Quota-Used header replaces the local point count when it is higher,
+#     so points spent by other workers or clients count too.
+#
+#   COST_REQUEST_MAX_POINTS     Spoonacular points per request (default 0)
+#   COST_REQUEST_MAX_TOKENS     model tokens per request (default 0)
+#   COST_DAILY_MAX_POINTS       Spoonacular points per day (default 0)
+#   COST_DAILY_MAX_TOKENS       model tokens per day (default 0)
+#   COST_DEGRADE_AT             share of a daily limit where previews-only starts (default 0.8)
+
+COST_REQUEST_MAX_POINTS = float(os.getenv("COST_REQUEST_MAX_POINTS", "0"))
+COST_REQUEST_MAX_TOKENS = int(os.getenv("COST_REQUEST_MAX_TOKENS", "0"))
+COST_DAILY_MAX_POINTS = float(os.getenv("COST_DAILY_MAX_POINTS", "0"))
+COST_DAILY_MAX_TOKENS = int(os.getenv("COST_DAILY_MAX_TOKENS", "0"))
+COST_DEGRADE_AT = float(os.getenv("COST_DEGRADE_AT", "0.8"))
+
+# work done outside any named step (tool calls from the chat reply, etc.)
+OTHER_STEP = "other"
+
+
+@dataclass
+class StepCost:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    model_calls: int = 0
+    spoonacular_points: float = 0.0
+    spoonacular_calls: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    wall_ms: float = 0.0
+
+    @property
+    def tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add(self, other: "StepCost") -> None:
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        cost = asdict(self)
+        cost["spoonacular_points"] = round(self.spoonacular_points, 2)
+        cost["wall_ms"] = round(self.wall_ms, 1)
+        return cost
+
+
+class CostLedger:
+    """What one request has spent, per pipeline step"""
+
+    def __init__(self):
+        self.steps: Dict[str, StepCost] = {}
+        self.degraded: Optional[str] = None  # budget that cut the request short
+        self._start = time.perf_counter()
+        self._finished = False
+
+    def entry(self, step: Optional[str] = None) -> StepCost:
+        step = step or current_step.get()
+        cost = self.steps.get(step)
+        if cost is None:
+            cost = self.steps[step] = StepCost()
+        return cost
+
+    @contextmanager
+    def timed(self, name: str):
+        """Add the block's wall time to `name` without changing the current step"""
+        cost = self.entry(name)
+        start = time.perf_counter()
+        try:
+            yield cost
+        finally:
+            cost.wall_ms += (time.perf_counter() - start) * 1000
+
+    @contextmanager
+    def step(self, name: str):
+        """
+        Attribute costs inside the block to `name` and add its wall time.
+
+        The block must not yield out of a generator: the step is set and reset
+        in the same context. Streamed work uses timed() and passes the step to
+        the cost hooks instead.
+        """
+        token = current_step.set(name)
+        try:
+            with self.timed(name) as cost:
+                yield cost
+        finally:
+            current_step.reset(token)
+
+    def total(self) -> StepCost:
+        total = StepCost()
+        for cost in self.steps.values():
+            total.add(cost)
+        total.wall_ms = (time.perf_counter() - self._start) * 1000
+        return total
+
+    def over_budget(
+        self,
+        max_points: float = COST_REQUEST_MAX_POINTS,
+        max_tokens: int = COST_REQUEST_MAX_TOKENS,
+    ) -> Optional[str]:
+        """Name of the per-request limit that has been reached, if any"""
+        total = self.total()
+        if max_points and total.spoonacular_points >= max_points:
+            return "request_points"
+        if max_tokens and total.tokens >= max_tokens:
+            return "request_tokens"
+        return None
+
+    def degrade(self, reason: str) -> None:
+        if self.degraded is None:
+            self.degraded = reason
+            DEGRADED_REQUESTS.labels(reason=reason).inc()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "steps": {name: cost.as_dict() for name, cost in self.steps.items()},
+            "total": self.total().as_dict(),
+            "degraded": self.degraded,
+        }
+
+    def finish(self) -> None:
+        """Record the request's totals in the per-request histograms (once)"""
+        if self._finished:
+            return
+        self._finished = True
+        total = self.total()
+        REQUEST_POINTS.observe(total.spoonacular_points)
+        REQUEST_TOKENS.observe(total.tokens)
+
+
+current_ledger: ContextVar[Optional[CostLedger]] = ContextVar("current_ledger", default=None)
+current_step: ContextVar[str] = ContextVar("current_step", default=OTHER_STEP)
+
+
+class DailyBudget:
+    """Points and tokens spent today (UTC) by this process, against the daily limits"""
+
+    def __init__(
+        self,
+        max_points: float = COST_DAILY_MAX_POINTS,
+        max_tokens: int = COST_DAILY_MAX_TOKENS,
+        degrade_at: float = COST_DEGRADE_AT,
+    ):
+        self.max_points = max_points
+        self.max_tokens = max_tokens
+        self.degrade_at = degrade_at
+        self.day = ""
+        self.points = 0.0
+        self.tokens = 0
+
+    def _roll(self) -> None:
+        today = time.strftime("%Y-%m-%d", time.gmtime())
+        if today != self.day:
+            self.day, self.points, self.tokens = today, 0.0, 0
+
+    def add(self, points: float = 0.0, tokens: int = 0) -> None:
+        self._roll()
+        self.points += points
+        self.tokens += tokens
+
+    def observe_quota_used(self, used: float) -> None:
+        """Spoonacular's own count of today's points wins when it is ahead of ours"""
+        self._roll()
+        self.points = max(self.points, used)
+
+    def usage(self) -> float:
+        """Largest share of a daily limit used so far (0 with no limits)"""
+        self._roll()
+        shares = []
+        if self.max_points:
+            shares.append(self.points / self.max_points)
+        if self.max_tokens:
+            shares.append(self.tokens / self.max_tokens)
+        return max(shares, default=0.0)
+
+    def level(self) -> str:
+        """"normal", "reduced" (previews only) or "exhausted" (no new runs)"""
+        usage = self.usage()
+        if usage >= 1:
+            return "exhausted"
+        if usage >= self.degrade_at:
+            return "reduced"
+        return "normal"
+
+    def seconds_until_reset(self) -> int:
+        return 86400 - int(time.time()) % 86400
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "level": self.level(),
+            "day": self.day,
+            "points": round(self.points, 2),
+            "max_points": self.max_points or None,
+            "tokens": self.tokens,
+            "max_tokens": self.max_tokens or None,
+        }
+
+
+daily_budget = DailyBudget()
+
+
+def record_model_usage(
+    agent: str,
+    input_tokens: int,
+    output_tokens: int,
+    calls: int = 1,
+    step: Optional[str] = None,
+) -> None:
+    """Count a model call's tokens in the metrics, the daily budget and the current ledger
+
+    `step` overrides the current step, for calls made outside a ledger.step() block.
+    """
+    MODEL_TOKENS.labels(agent=agent, direction="input").inc(input_tokens)
+    MODEL_TOKENS.labels(agent=agent, direction="output").inc(output_tokens)
+    daily_budget.add(tokens=input_tokens + output_tokens)
+    ledger = current_ledger.get()
+    if ledger is not None:
+        cost = ledger.entry(step)
+        cost.input_tokens += input_tokens
+        cost.output_tokens += output_tokens
+        cost.model_calls += calls
+
+
+def record_agent_usage(agent: str, usage: Any, step: Optional[str] = None) -> None:
+    """record_model_usage for a pydantic-ai run's Usage"""
+    record_model_usage(agent, usage.request_tokens or 0, usage.response_tokens or 0, usage.requests, step)
+
+
+def record_transfer(dependency: str, sent: int = 0, received: int = 0) -> None:
+    """Bytes exchanged with an external service outside httpx (the vision SDK call)"""
+    TRANSFER_BYTES.labels(dependency=dependency, direction="sent").inc(sent)
+    TRANSFER_BYTES.labels(dependency=dependency, direction="received").inc(received)
+    ledger = current_ledger.get()
+    if ledger is not None:
+        cost = ledger.entry()
+        cost.bytes_sent += sent
+        cost.bytes_received += received
+
+
+def _header_float(headers: httpx.Headers, name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class CountingStream(httpx.AsyncByteStream):
+    """Response body stream that reports the size of each chunk as it is read"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_chunk: Callable[[int], None]):
+        self._stream = stream
+        self._on_chunk = on_chunk
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._on_chunk(len(chunk))
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+
+
+class LedgerTransport(httpx.AsyncBaseTransport):
+    """httpx transport that charges bytes and Spoonacular points to the current ledger"""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        dependency = dependency_for(request.url)
+        # resolved now: the body may be read after the step has moved on
+        ledger = current_ledger.get()
+        cost = ledger.entry() if ledger is not None else None
+        try:
+            sent = len(request.content)
+        except httpx.RequestNotRead:
+            sent = 0
+        TRANSFER_BYTES.labels(dependency=dependency, direction="sent").inc(sent)
+
+        response = await self._transport.handle_async_request(request)
+
+        received = TRANSFER_BYTES.labels(dependency=dependency, direction="received")
+
+        def on_chunk(size: int) -> None:
+            received.inc(size)
+            if cost is not None:
+                cost.bytes_received += size
+
+        response.stream = CountingStream(response.stream, on_chunk)
+
+        points = _header_float(response.headers, "x-api-quota-request")
+        used = _header_float(response.headers, "x-api-quota-used")
+        if points is not None:
+            SPOONACULAR_POINTS.labels(operation=operation_for(request.url)).inc(points)
+            daily_budget.add(points=points)
+        if used is not None:
+            daily_budget.observe_quota_used(used)
+        if cost is not None:
+            cost.bytes_sent += sent
+            if dependency == "spoonacular":
+                cost.spoonacular_calls += 1
+                cost.spoonacular_points += points or 0
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
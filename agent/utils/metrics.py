@@ -0,0 +1,229 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Prometheus metrics for the /chat pipeline and the services it calls.
+# Everything is kept in-process and exposed on /metrics for scraping; with
+# PROMETHEUS_MULTIPROC_DIR set (multi-worker mode) samples from all workers
+# are aggregated.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+
+STEP_LATENCY = Histogram(
+    "fridger_chat_step_duration_seconds",
+    "Latency of each /chat pipeline step",
+    ["step", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STEP_TOTAL = Counter(
+    "fridger_chat_steps_total",
+    "Number of /chat pipeline steps run, by outcome",
+    ["step", "status"],
+)
+
+DEPENDENCY_LATENCY = Histogram(
+    "fridger_dependency_duration_seconds",
+    "Latency of outbound calls to external services",
+    ["dependency", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DEPENDENCY_CALLS = Counter(
+    "fridger_dependency_calls_total",
+    "Outbound calls to external services, by outcome",
+    ["dependency", "operation", "outcome"],
+)
+
+CHAT_REQUESTS = Counter(
+    "fridger_chat_requests_total",
+    "Requests handled by /chat",
+    ["mode"],
+)
+
+TOOL_OUTPUT_TOKENS = Counter(
+    "fridger_tool_output_tokens_total",
+    "Estimated tokens returned by agent tools to the model",
+    ["tool", "mode"],
+)
+
+TOOL_OUTPUT_TOKENS_SAVED = Counter(
+    "fridger_tool_output_tokens_saved_total",
+    "Estimated tokens saved by compact tool output compared to the verbose summary",
+    ["tool"],
+)
+
+CACHE_REQUESTS = Counter(
+    "fridger_cache_requests_total",
+    "Cache lookups, by cache and result",
+    ["cache", "result"],
+)
+
+CACHE_REFRESHES = Counter(
+    "fridger_cache_refreshes_total",
+    "Background cache refreshes, by cache and result",
+    ["cache", "result"],
+)
+
+HEDGED_REQUESTS = Counter(
+    "fridger_hedged_requests_total",
+    "Hedged outbound GETs: hedges fired, won by the hedge or the original, or skipped for budget",
+    ["operation", "outcome"],
+)
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "fridger_single_flight_calls_total",
+    "Calls through a single-flight group: leaders run the operation, followers share its in-flight result",
+    ["operation", "role"],
+)
+
+MODEL_TOKENS = Counter(
+    "fridger_model_tokens_total",
+    "Model tokens used, by agent and direction",
+    ["agent", "direction"],
+)
+
+SPOONACULAR_POINTS = Counter(
+    "fridger_spoonacular_points_total",
+    "Spoonacular quota points charged, by operation",
+    ["operation"],
+)
+
+TRANSFER_BYTES = Counter(
+    "fridger_transfer_bytes_total",
+    "Bytes sent to and received from external services",
+    ["dependency", "direction"],
+)
+
+REQUEST_POINTS = Histogram(
+    "fridger_chat_request_points",
+    "Spoonacular points charged per /chat request",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+
+REQUEST_TOKENS = Histogram(
+    "fridger_chat_request_tokens",
+    "Model tokens used per /chat request",
+    buckets=(0, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
+
+DEGRADED_REQUESTS = Counter(
+    "fridger_degraded_requests_total",
+    "Requests served in a reduced mode or refused because of a cost budget",
+    ["reason"],
+)
+
+# hosts we know about -> dependency label
+DEPENDENCY_HOSTS = {
+    "api.spoonacular.com": "spoonacular",
+    "generativelanguage.googleapis.com": "gemini",
+}
+
+
+class Timer:
+    """Measures a block of code; status can be changed inside the block"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status = "success"
+
+    @property
+    def elapsed(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    @property
+    def elapsed_ms(self) -> float:
+        return round(self.elapsed * 1000, 1)
+
+
+@contextmanager
+def observe_step(step: str):
+    """Time a /chat pipeline step and record it in the step histogram"""
+    timer = Timer()
+    try:
+        yield timer
+    except BaseException:
+        timer.status = "error"
+        raise
+    finally:
+        timer.end = time.perf_counter()
+        STEP_LATENCY.labels(step=step, status=timer.status).observe(timer.elapsed)
+        STEP_TOTAL.labels(step=step, status=timer.status).inc()
+
+
+def resumed_step(step: str) -> Timer:
+    """Zero-length timer for a step restored from a checkpoint instead of run"""
+    timer = Timer()
+    timer.end = timer.start
+    timer.status = "resumed"
+    STEP_TOTAL.labels(step=step, status=timer.status).inc()
+    return timer
+
+
+@contextmanager
+def observe_dependency(dependency: str, operation: str):
+    """Time a call to an external service and count it by outcome"""
+    timer = Timer()
+    try:
+        yield timer
+    except BaseException:
+        timer.status = "error"
+        raise
+    finally:
+        timer.end = time.perf_counter()
+        DEPENDENCY_LATENCY.labels(dependency=dependency, operation=operation).observe(timer.elapsed)
+        DEPENDENCY_CALLS.labels(dependency=dependency, operation=operation, outcome=timer.status).inc()
+
+
+def dependency_for(url: httpx.URL) -> str:
+    return DEPENDENCY_HOSTS.get(url.host, url.host or "unknown")
+
+
+def operation_for(url: httpx.URL) -> str:
+    """Low-cardinality operation name for a request URL
+
+    /recipes/findByIngredients             -> findByIngredients
+    /recipes/716429/information            -> information
+    /v1beta/models/gemini-2.0-flash:generateContent -> generateContent
+    """
+    last_segment = url.path.rstrip("/").rsplit("/", 1)[-1]
+    return last_segment.rsplit(":", 1)[-1] or "root"
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records latency and outcome of every outbound request"""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        with observe_dependency(dependency_for(request.url), operation_for(request.url)) as timer:
+            response = await self._transport.handle_async_request(request)
+            if response.status_code >= 400:
+                timer.status = f"http_{response.status_code}"
+            return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def format_server_timing(timings: dict) -> str:
+    """Build a Server-Timing header value from {name: milliseconds}"""
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings.items())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    # with several workers each process writes its samples to
+    # PROMETHEUS_MULTIPROC_DIR; aggregate them so any worker can answer a scrape
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,265 @@
+import difflib
+import hashlib
+import os
+import secrets
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from models.RecipeSearchParams import ExtractedIngredients, FridgeItem
+from utils.cache import SQLiteStore
+from utils.ingredient_merge import INGREDIENT_DEDUPE_THRESHOLD, normalize_name
+from utils.json_codec import dumps, loads
+
+# Per-user pantry inventory, so repeat users don't start from an empty fridge.
+#
+# A pantry is reached only through a server-issued token (POST /pantry), sent
+# back in the X-Pantry-Token header. Tokens are random; the database keeps
+# their SHA-256 as the pantry id, so neither guessing nor reading the file
+# gives access to someone's inventory.
+#
+# Every /chat upload with a pantry token is folded into that inventory:
+# items matched by normalized name (fuzzy, like multi-photo merging) get their
+# last-seen time bumped, new ones are added, and items not seen for
+# PANTRY_ITEM_TTL_DAYS drop out. A photo of one shelf therefore only touches
+# that shelf's items; pantry_update="replace" treats the upload as the whole
+# fridge and removes anything it didn't show.
+#
+# Recipe search runs against the whole inventory. The outputs of the last
+# search are kept per user along with the ingredient set they were made for;
+# while the inventory stays within PANTRY_CHANGE_THRESHOLD of that set
+# (Jaccard distance over cooking ingredients) the next request reuses them and
+# skips the formatter and Spoonacular search entirely.
+#
+#   PANTRY_DB_PATH              inventory file (default cache/fridger-pantry.sqlite3)
+#   PANTRY_ITEM_TTL_DAYS        days an unseen item stays in the inventory (default 7)
+#   PANTRY_SEARCH_TTL_HOURS     how long a saved search can be reused (default 24)
+#   PANTRY_CHANGE_THRESHOLD     share of changed ingredients that triggers a new search (default 0.2)
+
+PANTRY_DB_PATH = Path(os.getenv("PANTRY_DB_PATH", "cache/fridger-pantry.sqlite3"))
+PANTRY_ITEM_TTL_DAYS = float(os.getenv("PANTRY_ITEM_TTL_DAYS", "7"))
+PANTRY_SEARCH_TTL_HOURS = float(os.getenv("PANTRY_SEARCH_TTL_HOURS", "24"))
+PANTRY_CHANGE_THRESHOLD = float(os.getenv("PANTRY_CHANGE_THRESHOLD", "0.2"))
+
+PANTRY_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS pantry_items ("
+    " user_id TEXT NOT NULL, key TEXT NOT NULL, name TEXT NOT NULL, category TEXT NOT NULL,"
+    " is_food INTEGER NOT NULL, first_seen REAL NOT NULL, last_seen REAL NOT NULL, seen_count INTEGER NOT NULL,"
+    " PRIMARY KEY (user_id, key))",
+    "CREATE TABLE IF NOT EXISTS pantry_searches ("
+    " user_id TEXT PRIMARY KEY, ingredients BLOB NOT NULL, steps BLOB NOT NULL, searched_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS pantry_tokens (user_id TEXT PRIMARY KEY, issued_at REAL NOT NULL)",
+)
+
+
+@dataclass
+class PantryChange:
+    """What one upload did to a user's inventory"""
+    added: List[str] = field(default_factory=list)
+    refreshed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    inventory: ExtractedIngredients = field(default_factory=lambda: ExtractedIngredients(ingredients=[]))
+
+
+def ingredient_set(inventory: ExtractedIngredients) -> set:
+    """Normalized cooking ingredients, the part of the inventory a search depends on"""
+    return {normalize_name(name) for name in inventory.cooking_ingredients()} - {""}
+
+
+def pantry_id(token: str) -> str:
+    """Stored id of the pantry a token opens"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def change_ratio(before: set, after: set) -> float:
+    """Jaccard distance: 0 for the same set, 1 for disjoint sets"""
+    union = before | after
+    return len(before ^ after) / len(union) if union else 0.0
+
+
+class PantryStore:
+    """
+    Inventories keyed by pantry id (the hash of the token). The public methods
+    are async and run their SQLite work on the store's thread.
+    """
+
+    def __init__(
+        self,
+        path: Path = PANTRY_DB_PATH,
+        item_ttl_days: float = PANTRY_ITEM_TTL_DAYS,
+        search_ttl_hours: float = PANTRY_SEARCH_TTL_HOURS,
+        change_threshold: float = PANTRY_CHANGE_THRESHOLD,
+    ):
+        self.path = path
+        self.item_ttl_seconds = item_ttl_days * 86400
+        self.search_ttl_seconds = search_ttl_hours * 3600
+        self.change_threshold = change_threshold
+        self._store: Optional[SQLiteStore] = None
+
+    @property
+    def store(self) -> SQLiteStore:
+        # opened on first use so importing main doesn't create the file
+        if self._store is None:
+            self._store = SQLiteStore(self.path, PANTRY_SCHEMA)
+        return self._store
+
+    def _rows(self, user_id: str) -> list:
+        return self.store.read(
+            "SELECT key, name, category, is_food, last_seen FROM pantry_items"
+            " WHERE user_id = ? AND last_seen > ? ORDER BY first_seen, key",
+            (user_id, time.time() - self.item_ttl_seconds),
+        )
+
+    def _inventory(self, user_id: str, image_indexes: Optional[Dict[str, int]] = None) -> ExtractedIngredients:
+        """
+        The user's current items, oldest first, as an extraction result.
+        Items seen in this request's photos keep that photo's index (from
+        `image_indexes`, by key); the rest are marked -1.
+        """
+        image_indexes = image_indexes or {}
+        items = [
+            FridgeItem(name=name, category=category, is_food=bool(is_food), image_index=image_indexes.get(key, -1))
+            for key, name, category, is_food, _ in self._rows(user_id)
+        ]
+        return ExtractedIngredients(
+            ingredients=[item.name for item in items],
+            items=items,
+            image_indexes=[item.image_index for item in items],
+        )
+
+    def _items(self, user_id: str) -> List[Dict[str, Any]]:
+        """Inventory rows with their last-seen timestamps (for the /pantry endpoint)"""
+        return [
+            {"name": name, "category": category, "is_food": bool(is_food), "last_seen": last_seen}
+            for _, name, category, is_food, last_seen in self._rows(user_id)
+        ]
+
+    def _update(self, user_id: str, extraction: ExtractedIngredients, replace: bool = False) -> PantryChange:
+        """
+        Fold one upload's extraction into the inventory.
+
+        Args:
+            user_id: Pantry id, from owner()
+            extraction: Items found in the upload (one shelf or the whole fridge)
+            replace: The upload shows the whole fridge; drop items it didn't show
+
+        Returns:
+            PantryChange with the names added, refreshed and removed, and the new inventory
+        """
+        now = time.time()
+        existing = {key: name for key, name, *_ in self._rows(user_id)}
+        keys = list(existing)
+        change = PantryChange()
+        statements = []
+        seen: Dict[str, int] = {}  # key -> photo index
+
+        items = extraction.items or [
+            FridgeItem(name=name, image_index=image_index)
+            for name, image_index in zip(extraction.ingredients, extraction.image_indexes or [0] * len(extraction.ingredients))
+        ]
+        for item in items:
+            key = normalize_name(item.name)
+            if not key:
+                continue
+            if key not in existing:
+                close = difflib.get_close_matches(key, keys, n=1, cutoff=INGREDIENT_DEDUPE_THRESHOLD)
+                key = close[0] if close else key
+            if key in seen:
+                continue
+            seen[key] = item.image_index
+            if key in existing:
+                change.refreshed.append(existing[key])
+                statements.append((
+                    "UPDATE pantry_items SET last_seen = ?, seen_count = seen_count + 1, category = ?, is_food = ?"
+                    " WHERE user_id = ? AND key = ?",
+                    (now, item.category, int(item.is_food), user_id, key),
+                ))
+            else:
+                change.added.append(item.name)
+                statements.append((
+                    "INSERT INTO pantry_items (user_id, key, name, category, is_food, first_seen, last_seen, seen_count)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, 1)"
+                    " ON CONFLICT (user_id, key) DO UPDATE SET name = excluded.name, category = excluded.category,"
+                    " is_food = excluded.is_food, first_seen = excluded.first_seen, last_seen = excluded.last_seen,"
+                    " seen_count = 1",
+                    (user_id, key, item.name, item.category, int(item.is_food), now, now),
+                ))
+
+        if replace:
+            for key, name in existing.items():
+                if key not in seen:
+                    change.removed.append(name)
+                    statements.append(("DELETE FROM pantry_items WHERE user_id = ? AND key = ?", (user_id, key)))
+        # items past the TTL are gone for good
+        statements.append((
+            "DELETE FROM pantry_items WHERE user_id = ? AND last_seen <= ?",
+            (user_id, now - self.item_ttl_seconds),
+        ))
+        self.store.write(*statements)
+
+        change.inventory = self._inventory(user_id, seen)
+        return change
+
+    def _saved_search(self, user_id: str, inventory: ExtractedIngredients) -> Optional[Dict[str, Any]]:
+        """
+        Checkpointed step outputs of the user's last search, if it is recent
+        and the inventory hasn't changed meaningfully since.
+        """
+        rows = self.store.read(
+            "SELECT ingredients, steps FROM pantry_searches WHERE user_id = ? AND searched_at > ?",
+            (user_id, time.time() - self.search_ttl_seconds),
+        )
+        if not rows:
+            return None
+        searched_with = set(loads(rows[0][0]))
+        if change_ratio(searched_with, ingredient_set(inventory)) > self.change_threshold:
+            return None
+        return {"ingredients": searched_with, "steps": loads(rows[0][1])}
+
+    def _save_search(self, user_id: str, ingredients: set, steps: Dict[str, Any]) -> None:
+        """Remember a search's outputs and the ingredient set it was made for"""
+        self.store.write((
+            "INSERT INTO pantry_searches (user_id, ingredients, steps, searched_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (user_id) DO UPDATE SET ingredients = excluded.ingredients,"
+            " steps = excluded.steps, searched_at = excluded.searched_at",
+            (user_id, dumps(sorted(ingredients)), dumps(steps), time.time()),
+        ))
+
+    def _issue_token(self) -> str:
+        token = secrets.token_urlsafe(32)
+        self.store.write((
+            "INSERT INTO pantry_tokens (user_id, issued_at) VALUES (?, ?)", (pantry_id(token), time.time())
+        ))
+        return token
+
+    def _owner(self, token: str) -> Optional[str]:
+        user_id = pantry_id(token)
+        rows = self.store.read("SELECT 1 FROM pantry_tokens WHERE user_id = ?", (user_id,))
+        return user_id if rows else None
+
+    async def issue_token(self) -> str:
+        """A new pantry token; only its hash is stored"""
+        return await self.store.call(self._issue_token)
+
+    async def owner(self, token: str) -> Optional[str]:
+        """Pantry id for a token this server issued, None for anything else"""
+        return await self.store.call(self._owner, token)
+
+    async def inventory(self, user_id: str, image_indexes: Optional[Dict[str, int]] = None) -> ExtractedIngredients:
+        return await self.store.call(self._inventory, user_id, image_indexes)
+
+    async def items(self, user_id: str) -> List[Dict[str, Any]]:
+        return await self.store.call(self._items, user_id)
+
+    async def update(self, user_id: str, extraction: ExtractedIngredients, replace: bool = False) -> PantryChange:
+        return await self.store.call(self._update, user_id, extraction, replace)
+
+    async def saved_search(self, user_id: str, inventory: ExtractedIngredients) -> Optional[Dict[str, Any]]:
+        return await self.store.call(self._saved_search, user_id, inventory)
+
+    async def save_search(self, user_id: str, ingredients: set, steps: Dict[str, Any]) -> None:
+        await self.store.call(self._save_search, user_id, ingredients, steps)
+
+
+pantry_store = PantryStore()
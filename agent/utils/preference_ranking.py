@@ -0,0 +1,232 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.recipe_columns import NUMERIC_FIELDS, RecipeColumns
+
+# Local re-ranking of recipes against preferences parsed from the chat message.
+#
+# Spoonacular's findByIngredients has no notion of "quick" or "healthy", so
+# instead of another search the recipes already fetched are re-scored: each
+# active preference adds a weighted component in [0, 1] (ready time, macros,
+# ingredient count, diet tags from ingredient names), normalized within the
+# result set, on top of a baseline that favours fewer missed ingredients.
+# Ties keep the search order. Nothing here calls Spoonacular or the LLM, so a
+# follow-up that resumes a finished run (resume_run_id) re-ranks for free.
+#
+#   RANKING_WEIGHTS     comma-separated overrides, e.g. "time=2,missed=0.5"
+
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "missed": 1.0,         # fewer missing ingredients (always on)
+    "time": 1.5,           # quick / easy
+    "ingredients": 1.0,    # easy
+    "calories": 1.0,       # healthy / low-calorie
+    "fat": 0.5,            # healthy
+    "protein": 1.0,        # high-protein
+    "carbohydrates": 1.0,  # low-carb
+    "diet": 3.0,           # vegetarian / vegan: no conflicting ingredients
+    "time_limit": 3.0,     # penalty for going over an explicit "under N minutes"
+}
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        if name.strip() in weights:
+            weights[name.strip()] = float(value)
+    return weights
+
+
+RANKING_WEIGHTS = parse_weights(os.getenv("RANKING_WEIGHTS", ""))
+
+# message wording -> preference keyword
+PREFERENCE_PATTERNS = {
+    "quick": re.compile(r"\b(quick|fast|speedy|in a hurry|weeknight)\b"),
+    "easy": re.compile(r"\b(easy|simple|beginner|few ingredients)\b"),
+    "healthy": re.compile(r"\b(healthy|healthier|light|lean|nutritious)\b"),
+    "low-calorie": re.compile(r"\b(low[- ]cal(orie)?s?)\b"),
+    # bare "protein" also appears in "low protein" or "no protein powder"
+    "high-protein": re.compile(r"\b(high[- ]protein|more protein|lots of protein|protein[- ](rich|packed)|gains)\b"),
+    "low-carb": re.compile(r"\b(low[- ]carbs?|keto)\b"),
+    "vegetarian": re.compile(r"\b(vegetarian|veggie|meatless|no meat)\b"),
+    "vegan": re.compile(r"\b(vegan|plant[- ]based)\b"),
+}
+TIME_LIMIT_RE = re.compile(r"\b(?:under|within|less than|in|max(?:imum)?)\s+(\d{1,3})\s*(?:min|mins|minutes)\b")
+
+# preference keyword -> (weight name, direction); +1 rewards higher values, -1 lower
+PREFERENCE_COMPONENTS = {
+    "quick": [("time", -1)],
+    "easy": [("ingredients", -1), ("time", -1)],
+    "healthy": [("calories", -1), ("fat", -1)],
+    "low-calorie": [("calories", -1)],
+    "high-protein": [("protein", 1)],
+    "low-carb": [("carbohydrates", -1)],
+}
+# weight name -> RecipeColumns field
+COMPONENT_FIELDS = {
+    "time": "readyInMinutes",
+    "ingredients": "ingredientCount",
+    "calories": "calories",
+    "fat": "fat",
+    "protein": "protein",
+    "carbohydrates": "carbohydrates",
+}
+
+# ingredient words that break a diet, matched per word (singularized)
+MEAT_WORDS = {
+    "beef", "sirloin", "steak", "chicken", "pork", "bacon", "ham", "lamb", "turkey", "sausage",
+    "chorizo", "pepperoni", "prosciutto", "salami", "veal", "duck", "mince", "fish", "salmon",
+    "tuna", "cod", "shrimp", "prawn", "crab", "lobster", "anchovy", "gelatin",
+}
+ANIMAL_WORDS = {
+    "milk", "cheese", "butter", "cream", "egg", "yogurt", "yoghurt", "honey", "ghee", "feta",
+    "parmesan", "mozzarella", "cheddar", "ricotta", "mayonnaise",
+}
+PLANT_BASED_NAMES = ("peanut butter", "almond butter", "coconut milk", "almond milk", "oat milk", "soy milk", "coconut cream")
+WORD_RE = re.compile(r"[a-z]+")
+
+
+@dataclass
+class Preferences:
+    keywords: List[str] = field(default_factory=list)
+    max_minutes: Optional[int] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords) or self.max_minutes is not None
+
+    def describe(self) -> Dict[str, Any]:
+        return {"keywords": self.keywords, "max_minutes": self.max_minutes}
+
+
+def parse_preferences(message: Optional[str]) -> Preferences:
+    """Preference keywords and an optional time limit from free text"""
+    if not message:
+        return Preferences()
+    text = message.lower()
+    keywords = [name for name, pattern in PREFERENCE_PATTERNS.items() if pattern.search(text)]
+    if "vegan" in keywords and "vegetarian" in keywords:
+        keywords.remove("vegetarian")
+    limit = TIME_LIMIT_RE.search(text)
+    return Preferences(keywords, int(limit.group(1)) if limit else None)
+
+
+def ingredient_tags(name: str) -> set:
+    """"meat" and/or "animal" for an ingredient name (empty for plant-based ones)"""
+    name = name.lower()
+    if any(plant in name for plant in PLANT_BASED_NAMES):
+        return set()
+    words = {word[:-1] if word.endswith("s") and len(word) > 3 else word for word in WORD_RE.findall(name)}
+    tags = set()
+    if words & MEAT_WORDS:
+        tags.add("meat")
+    if words & ANIMAL_WORDS:
+        tags.add("animal")
+    return tags
+
+
+def ingredient_names(recipe: Any) -> List[str]:
+    if hasattr(recipe, "ingredient_names"):  # CompactRecipe
+        return list(recipe.ingredient_names)
+    return [ingredient.name for ingredient in recipe.ingredients]
+
+
+def diet_conflicts(names: Sequence[str], diet: str) -> bool:
+    banned = {"meat"} if diet == "vegetarian" else {"meat", "animal"}
+    return any(ingredient_tags(name) & banned for name in names)
+
+
+def _closeness(values: np.ndarray, direction: int) -> np.ndarray:
+    """Min-max normalize to [0, 1] where 1 is best; missing values score 0.5"""
+    present = ~np.isnan(values)
+    scores = np.full(len(values), 0.5)
+    if present.any():
+        low, high = values[present].min(), values[present].max()
+        if high > low:
+            normalized = (values[present] - low) / (high - low)
+            scores[present] = normalized if direction > 0 else 1 - normalized
+        else:
+            scores[present] = 1.0
+    return scores
+
+
+def score_recipes(
+    columns: RecipeColumns,
+    missed_counts: Sequence[float],
+    names: Sequence[Sequence[str]],
+    preferences: Preferences,
+    weights: Dict[str, float] = RANKING_WEIGHTS,
+) -> np.ndarray:
+    """Preference score per row of `columns` (higher is better)"""
+    scores = weights["missed"] * _closeness(np.asarray(missed_counts, dtype=np.float64), -1)
+
+    components = {}
+    for keyword in preferences.keywords:
+        for weight_name, direction in PREFERENCE_COMPONENTS.get(keyword, []):
+            components[weight_name] = direction
+    for weight_name, direction in components.items():
+        scores += weights[weight_name] * _closeness(columns.columns[COMPONENT_FIELDS[weight_name]], direction)
+
+    for diet in ("vegetarian", "vegan"):
+        if diet in preferences.keywords:
+            scores += weights["diet"] * np.array([0.0 if diet_conflicts(n, diet) else 1.0 for n in names])
+
+    if preferences.max_minutes is not None:
+        ready = columns.columns["readyInMinutes"]
+        scores -= weights["time_limit"] * (np.nan_to_num(ready, nan=0) > preferences.max_minutes)
+    return scores
+
+
+def _order(scores: np.ndarray) -> List[int]:
+    # stable on the negated scores, so equal scores keep the search order
+    return np.argsort(-scores, kind="stable").tolist()
+
+
+def rank_recipes(
+    details: List[Any],
+    search_results: Optional[List[Dict]],
+    preferences: Preferences,
+    weights: Dict[str, float] = RANKING_WEIGHTS,
+) -> List[Any]:
+    """Recipe details (RecipeDetails or CompactRecipe) reordered by preference score"""
+    if not preferences or len(details) < 2:
+        return details
+    missed = {r.get("id"): r.get("missedIngredientCount", 0) for r in search_results or []}
+    columns = RecipeColumns.from_recipes(details)
+    scores = score_recipes(
+        columns,
+        [missed.get(recipe.id, 0) for recipe in details],
+        [ingredient_names(recipe) for recipe in details],
+        preferences,
+        weights,
+    )
+    return [details[i] for i in _order(scores)]
+
+
+def rank_previews(
+    search_results: List[Dict],
+    preferences: Preferences,
+    weights: Dict[str, float] = RANKING_WEIGHTS,
+) -> List[Dict]:
+    """
+    findByIngredients results reordered by preference score. Without details,
+    time and macro components are neutral; diet tags come from the matched
+    ingredient names.
+    """
+    if not preferences or len(search_results) < 2:
+        return search_results
+    columns = RecipeColumns.from_rows([
+        (r.get("id"), r.get("title", ""), r.get("image", ""), (None,) * len(NUMERIC_FIELDS))
+        for r in search_results
+    ])
+    names = [
+        [i["name"] for i in r.get("usedIngredients", []) + r.get("missedIngredients", [])]
+        for r in search_results
+    ]
+    scores = score_recipes(
+        columns, [r.get("missedIngredientCount", 0) for r in search_results], names, preferences, weights
+    )
+    return [search_results[i] for i in _order(scores)]
@@ -0,0 +1,83 @@
+import functools
+import hmac
+import importlib.util
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+import logfire
+from fastapi import Request
+
+# Opt-in sampling profiler for single requests.
+#
+# A request is profiled only when PROFILING_ADMIN_TOKEN is set and the request
+# carries both `X-Profile: 1` (or `?profile=1`) and a matching `X-Admin-Token`.
+# The profile is written to PROFILE_DIR (default ./profiles) as a speedscope
+# JSON file, or as pyinstrument HTML with PROFILE_FORMAT=html.
+#
+# Uses pyinstrument (in requirements.txt); it is only imported when a profiled
+# request comes in, so unprofiled requests pay nothing. Without it installed,
+# profiling requests are served unprofiled and get no X-Profile-Path header.
+
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "speedscope").lower()
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+
+@functools.lru_cache(maxsize=None)
+def profiler_available() -> bool:
+    return importlib.util.find_spec("pyinstrument") is not None
+
+
+def profile_requested(request: Request) -> bool:
+    """Whether this request asked for profiling, is allowed to, and can be profiled"""
+    if not PROFILING_ADMIN_TOKEN:
+        return False
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    if flag not in ("1", "true"):
+        return False
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), PROFILING_ADMIN_TOKEN.encode()):
+        return False
+    if not profiler_available():
+        logfire.warning("Profiling requested but pyinstrument is not installed")
+        return False
+    return True
+
+
+def profile_path(label: str) -> Path:
+    suffix = "html" if PROFILE_FORMAT == "html" else "speedscope.json"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return PROFILE_DIR / f"{stamp}-{label}-{uuid.uuid4().hex[:8]}.{suffix}"
+
+
+def _write_profile(profiler, path: Path) -> None:
+    from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+
+    renderer = HTMLRenderer() if PROFILE_FORMAT == "html" else SpeedscopeRenderer()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(profiler.output(renderer=renderer))
+    logfire.info(f"Wrote request profile to {path}")
+
+
+async def profiled_stream(stream: AsyncIterator, path: Path) -> AsyncIterator:
+    """
+    Run a stream under the sampling profiler. Wrap the producer: samples are
+    attributed to the task iterating this stream (async_mode="enabled").
+    """
+    from pyinstrument import Profiler
+
+    profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+    profiler.start()
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        profiler.stop()
+        try:
+            _write_profile(profiler, path)
+        except Exception as e:
+            logfire.error(f"Failed to write profile: {str(e)}")
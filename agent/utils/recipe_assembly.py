@@ -0,0 +1,96 @@
+from typing import Dict, Iterable, List, Optional
+
+from models.CompactRecipe import CompactRecipe
+from models.RecipeDetails import RecipeDetails
+
+# Builds the recipe list for the final /chat payload in one pass: search match
+# data is indexed by recipe id once and each recipe (a RecipeDetails, or the
+# CompactRecipe the pipeline holds between steps) is serialized directly,
+# optionally projected down to the requested fields.
+
+MATCH_FIELDS = {"usedIngredientCount", "missedIngredientCount", "usedIngredients", "missedIngredients"}
+DETAIL_FIELDS = set(RecipeDetails.model_fields)
+
+# named projections clients can ask for instead of listing fields
+FIELD_PRESETS = {
+    "full": DETAIL_FIELDS | MATCH_FIELDS,
+    "card": {
+        "id", "title", "image", "readyInMinutes", "nutrition",
+        "usedIngredientCount", "missedIngredientCount",
+    },
+}
+
+
+def resolve_fields(fields: Optional[Iterable[str]]) -> Optional[set]:
+    """Expand presets; None means every field"""
+    if not fields:
+        return None
+    resolved = set()
+    for field in fields:
+        resolved |= FIELD_PRESETS.get(field, {field})
+    # the id is always needed to tie cards back to recipes
+    resolved.add("id")
+    return resolved
+
+
+def index_matches(search_results: Optional[List[Dict]]) -> Dict[int, Dict]:
+    """Map recipe id -> findByIngredients result"""
+    return {recipe.get("id"): recipe for recipe in search_results or []}
+
+
+def match_metadata(match: Dict) -> Dict:
+    return {
+        "usedIngredientCount": match.get("usedIngredientCount", 0),
+        "missedIngredientCount": match.get("missedIngredientCount", 0),
+        "usedIngredients": [ing["name"] for ing in match.get("usedIngredients", [])],
+        "missedIngredients": [ing["name"] for ing in match.get("missedIngredients", [])],
+    }
+
+
+def assemble_recipes(
+    details: List[RecipeDetails | CompactRecipe],
+    search_results: Optional[List[Dict]],
+    fields: Optional[Iterable[str]] = None,
+) -> List[Dict]:
+    """
+    Merge recipe details with their search match data.
+
+    Args:
+        details: Recipes with full details, as models or compact records
+        search_results: Raw findByIngredients results (match counts and names)
+        fields: Field names or presets ("card", "full") to include; all when empty
+
+    Returns:
+        One dict per recipe in the shape the frontend expects
+    """
+    include = resolve_fields(fields)
+    detail_include = include & DETAIL_FIELDS if include is not None else None
+    matches = index_matches(search_results)
+
+    recipes = []
+    for recipe in details:
+        if isinstance(recipe, CompactRecipe):
+            recipe_data = recipe.to_dict(include=detail_include)
+        else:
+            recipe_data = recipe.model_dump(include=detail_include)
+        match = matches.get(recipe.id)
+        if match is not None:
+            metadata = match_metadata(match)
+            if include is not None:
+                metadata = {key: value for key, value in metadata.items() if key in include}
+            recipe_data.update(metadata)
+        recipes.append(recipe_data)
+    return recipes
+
+
+def assemble_previews(search_results: Optional[List[Dict]]) -> List[Dict]:
+    """Card previews straight from findByIngredients results (no detail fetch)"""
+    return [
+        {
+            "id": recipe.get("id"),
+            "title": recipe.get("title", ""),
+            "image": recipe.get("image", ""),
+            **match_metadata(recipe),
+        }
+        for recipe in search_results or []
+    ]
@@ -0,0 +1,250 @@
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Columnar view of recipe details for filtering, sorting and aggregates.
+#
+# RecipeColumns keeps one NumPy array per numeric field (ready time, the
+# NutritionInfo macros, ingredient count) plus parallel id/title/image lists,
+# so a range filter over thousands of recipes is a few vectorized comparisons.
+# Missing nutrition values are NaN and never match a range filter.
+#
+# RecipeColumnStore holds the columns for every recipe in the details cache.
+# Fetches upsert into it as they land; a periodic resync from the cache picks
+# up entries written by other workers (CACHE_BACKEND=sqlite) and drops expired
+# ones; callers check needs_sync() and pass the cache's entries to sync().
+#
+#   RECIPE_STORE_SYNC_SECONDS       max age before a query resyncs from the cache (default 30)
+
+RECIPE_STORE_SYNC_SECONDS = float(os.getenv("RECIPE_STORE_SYNC_SECONDS", "30"))
+
+NUMERIC_FIELDS = ("readyInMinutes", "calories", "fat", "carbohydrates", "protein", "ingredientCount")
+NUTRITION_FIELDS = ("calories", "fat", "carbohydrates", "protein")
+INTEGER_FIELDS = {"readyInMinutes", "ingredientCount"}
+
+# preference keywords -> range filters, as (field, min, max)
+PREFERENCE_FILTERS: Dict[str, List[Tuple[str, Optional[float], Optional[float]]]] = {
+    "quick": [("readyInMinutes", None, 30)],
+    "easy": [("ingredientCount", None, 8), ("readyInMinutes", None, 45)],
+    "healthy": [("calories", None, 600), ("fat", None, 25)],
+    "low-calorie": [("calories", None, 400)],
+    "high-protein": [("protein", 25, None)],
+    "low-carb": [("carbohydrates", None, 30)],
+}
+
+
+def recipe_row(recipe: Any) -> Tuple[int, str, str, Tuple[float, ...]]:
+    """(id, title, image, numeric values) from a RecipeDetails, CompactRecipe or model_dump dict"""
+    if isinstance(recipe, dict):
+        nutrition = recipe.get("nutrition") or {}
+        values = [recipe.get("readyInMinutes") or 0]
+        values.extend(nutrition.get(field) for field in NUTRITION_FIELDS)
+        values.append(len(recipe.get("ingredients") or []))
+        return recipe["id"], recipe.get("title", ""), recipe.get("image", ""), tuple(values)
+
+    nutrition = recipe.nutrition
+    if nutrition is None:
+        macros = (None,) * len(NUTRITION_FIELDS)
+    elif isinstance(nutrition, tuple):  # CompactRecipe
+        macros = nutrition
+    else:
+        macros = tuple(getattr(nutrition, field) for field in NUTRITION_FIELDS)
+    count = recipe.ingredient_count if hasattr(recipe, "ingredient_count") else len(recipe.ingredients)
+    return recipe.id, recipe.title, recipe.image, (recipe.readyInMinutes or 0, *macros, count)
+
+
+def _column(values: Iterable[Optional[float]]) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+class RecipeColumns:
+    """Immutable columns for a set of recipes"""
+
+    def __init__(self, ids: np.ndarray, titles: List[str], images: List[str], columns: Dict[str, np.ndarray]):
+        self.ids = ids
+        self.titles = titles
+        self.images = images
+        self.columns = columns
+
+    @classmethod
+    def from_recipes(cls, recipes: Iterable[Any]) -> "RecipeColumns":
+        rows = [recipe_row(recipe) for recipe in recipes]
+        return cls.from_rows(rows)
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[int, str, str, Tuple[float, ...]]]) -> "RecipeColumns":
+        values = list(zip(*(row[3] for row in rows))) or [()] * len(NUMERIC_FIELDS)
+        return cls(
+            ids=np.array([row[0] for row in rows], dtype=np.int64),
+            titles=[row[1] for row in rows],
+            images=[row[2] for row in rows],
+            columns={field: _column(column) for field, column in zip(NUMERIC_FIELDS, values)},
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self) -> "RecipeQuery":
+        return RecipeQuery(self)
+
+
+class RecipeQuery:
+    """
+    Chainable filters, ordering and aggregates over RecipeColumns.
+
+    Filters narrow a boolean mask; nothing is materialized until ids(),
+    rows() or an aggregate is asked for.
+    """
+
+    def __init__(self, columns: RecipeColumns):
+        self._columns = columns
+        self._mask = np.ones(len(columns), dtype=bool)
+        self._order: Optional[Tuple[str, bool]] = None
+        self._limit: Optional[int] = None
+
+    def _values(self, field: str) -> np.ndarray:
+        column = self._columns.columns.get(field)
+        if column is None:
+            raise ValueError(f"Unknown field {field!r}; expected one of {', '.join(NUMERIC_FIELDS)}")
+        return column
+
+    def where(self, field: str, min: Optional[float] = None, max: Optional[float] = None) -> "RecipeQuery":
+        """Keep rows with min <= field <= max; a missing bound is open, and NaN never matches a bound"""
+        values = self._values(field)
+        if min is not None:
+            self._mask &= values >= min
+        if max is not None:
+            self._mask &= values <= max
+        return self
+
+    def nonzero(self, field: str) -> "RecipeQuery":
+        """Keep rows where field is present and not 0 (what a truthiness check on the value keeps)"""
+        values = self._values(field)
+        self._mask &= ~np.isnan(values) & (values != 0)
+        return self
+
+    def prefer(self, *preferences: str) -> "RecipeQuery":
+        """Apply the PREFERENCE_FILTERS ranges for each keyword (unknown keywords are ignored)"""
+        for preference in preferences:
+            for field, low, high in PREFERENCE_FILTERS.get(preference, []):
+                self.where(field, low, high)
+        return self
+
+    def order_by(self, field: str, descending: bool = False) -> "RecipeQuery":
+        self._values(field)
+        self._order = (field, descending)
+        return self
+
+    def limit(self, n: int) -> "RecipeQuery":
+        self._limit = n
+        return self
+
+    def indexes(self) -> np.ndarray:
+        """Row positions matching the filters, in order, after the limit"""
+        selected = np.flatnonzero(self._mask)
+        if self._order is not None:
+            field, descending = self._order
+            values = self._columns.columns[field][selected]
+            if descending:
+                values = -values
+            # stable, so ties keep insertion order; NaN sorts last either way
+            selected = selected[np.argsort(values, kind="stable")]
+        if self._limit is not None:
+            selected = selected[:self._limit]
+        return selected
+
+    def ids(self) -> List[int]:
+        return self._columns.ids[self.indexes()].tolist()
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """id, title, image and the numeric fields for each matching recipe"""
+        columns = self._columns
+        rows = []
+        for i in self.indexes().tolist():
+            row = {"id": int(columns.ids[i]), "title": columns.titles[i], "image": columns.images[i]}
+            for field in NUMERIC_FIELDS:
+                value = columns.columns[field][i]
+                if np.isnan(value):
+                    row[field] = None
+                else:
+                    row[field] = int(value) if field in INTEGER_FIELDS else value.item()
+            rows.append(row)
+        return rows
+
+    def count(self) -> int:
+        return int(self._mask.sum())
+
+    def aggregate(self, field: str) -> Dict[str, Optional[float]]:
+        """count/mean/min/max of a field over matching rows, ignoring missing values"""
+        values = self._values(field)[self._mask]
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return {"count": 0, "mean": None, "min": None, "max": None}
+        return {
+            "count": int(len(values)),
+            "mean": float(values.mean()),
+            "min": float(values.min()),
+            "max": float(values.max()),
+        }
+
+    def _extreme(self, field: str, highest: bool) -> Optional[int]:
+        values = np.where(self._mask, self._values(field), np.nan)
+        if np.isnan(values).all():
+            return None
+        return int(np.nanargmax(values) if highest else np.nanargmin(values))
+
+    def argmin(self, field: str) -> Optional[int]:
+        """Row position of the lowest value among matching rows (None when all are missing)"""
+        return self._extreme(field, highest=False)
+
+    def argmax(self, field: str) -> Optional[int]:
+        return self._extreme(field, highest=True)
+
+
+class RecipeColumnStore:
+    """Columns over every cached recipe, rebuilt lazily after changes"""
+
+    def __init__(self, sync_seconds: float = RECIPE_STORE_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._rows: Dict[int, Tuple[float, Tuple]] = {}  # id -> (expires_at, row)
+        self._columns: Optional[RecipeColumns] = None
+        self._expires_at: Optional[np.ndarray] = None
+        self._synced_at = 0.0
+
+    def upsert(self, recipe: Any, expires_at: float) -> None:
+        row = recipe_row(recipe)
+        self._rows[row[0]] = (expires_at, row)
+        self._columns = None
+
+    def needs_sync(self) -> bool:
+        return time.monotonic() - self._synced_at > self.sync_seconds
+
+    def sync(self, items: Iterable[Tuple[str, float, Any]]) -> None:
+        """Replace the rows with the live entries of the details cache (from cache.aitems())"""
+        self._rows = {
+            value["id"]: (expires_at, recipe_row(value))
+            for _, expires_at, value in items
+        }
+        self._columns = None
+        self._synced_at = time.monotonic()
+
+    def columns(self) -> RecipeColumns:
+        """Current columns of unexpired recipes"""
+        now = time.time()
+        if self._columns is None or (self._expires_at is not None and (self._expires_at <= now).any()):
+            live = [(expires_at, row) for expires_at, row in self._rows.values() if expires_at > now]
+            self._rows = {row[0]: (expires_at, row) for expires_at, row in live}
+            self._expires_at = np.array([expires_at for expires_at, _ in live], dtype=np.float64)
+            self._columns = RecipeColumns.from_rows([row for _, row in live])
+        return self._columns
+
+    def query(self) -> RecipeQuery:
+        return self.columns().query()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+recipe_store = RecipeColumnStore()
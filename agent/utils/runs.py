@@ -0,0 +1,126 @@
+import asyncio
+import os
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from utils.cache import make_cache
+
+# Checkpoints for /chat pipeline runs, so a retry can resume after the last
+# completed step instead of starting again from the vision call.
+#
+# Each run has an id; after every completed step its output is saved under
+# that id in a TTL cache (shared across workers with CACHE_BACKEND=sqlite).
+# An Idempotency-Key header is bound to the run it started: a retry with the
+# same key follows the run live if it is still in flight in this process, or
+# resumes it from its checkpoint otherwise. Binding is set-if-absent in the
+# shared cache, so two workers racing on one key end up on the same run id.
+#
+#   RUN_CHECKPOINT_TTL_SECONDS      how long checkpoints are kept (default 900)
+#   RUN_CHECKPOINT_MAX_ENTRIES      runs kept (default 1000)
+
+RUN_CHECKPOINT_TTL_SECONDS = float(os.getenv("RUN_CHECKPOINT_TTL_SECONDS", "900"))
+RUN_CHECKPOINT_MAX_ENTRIES = int(os.getenv("RUN_CHECKPOINT_MAX_ENTRIES", "1000"))
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+class RunStore:
+    """Step outputs per run id, plus idempotency key -> run id bindings"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self._cache = make_cache("pipeline_runs", ttl_seconds, max_entries)
+
+    async def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """{"steps": {step name: output}, "images_hash": ...} or None when unknown/expired"""
+        return await self._cache.aget(f"run:{run_id}")
+
+    async def start(self, run_id: str, images_hash: Optional[str]) -> None:
+        await self._cache.aset(f"run:{run_id}", {"steps": {}, "images_hash": images_hash})
+
+    async def save_step(self, run_id: str, step: str, output: Any) -> None:
+        """Add one step's output; the only write to a started checkpoint"""
+        def add_step(checkpoint: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            checkpoint = checkpoint or {"steps": {}, "images_hash": None}
+            return {**checkpoint, "steps": {**checkpoint["steps"], step: output}}
+
+        await self._cache.aupdate(f"run:{run_id}", add_step)
+
+    async def bind_key(self, idempotency_key: str, run_id: str) -> str:
+        """
+        Bind the key to run_id unless it is already bound; returns the bound
+        run id, so a worker that loses the race resumes the winner's run.
+        """
+        return await self._cache.asetdefault(f"key:{idempotency_key}", run_id)
+
+    async def run_for_key(self, idempotency_key: str) -> Optional[str]:
+        return await self._cache.aget(f"key:{idempotency_key}")
+
+
+class InFlightRun:
+    """
+    A run executing in a background task; any number of responses can follow
+    it and each gets every event from the start.
+
+    It is registered under its idempotency key before the request's first
+    await, with no run id yet: retries arriving meanwhile wait in started()
+    until the run begins, or until the request gives up (an error response or
+    a plain chat reply) and they go on to handle the request themselves.
+    """
+
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id
+        self.events: List[dict] = []
+        self.done = False
+        self._changed = asyncio.Condition()
+        self._settled = asyncio.Event()
+
+    def begin(self, run_id: str) -> None:
+        self.run_id = run_id
+        self._settled.set()
+
+    def abandon(self) -> None:
+        self._settled.set()
+
+    async def started(self) -> bool:
+        """Wait until the run begins (True) or is abandoned (False)"""
+        await self._settled.wait()
+        return self.run_id is not None
+
+    async def publish(self, events: AsyncIterator[dict]) -> None:
+        try:
+            async for event in events:
+                async with self._changed:
+                    self.events.append(event)
+                    self._changed.notify_all()
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[dict]:
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.done or len(self.events) > sent)
+                pending = self.events[sent:]
+                finished = self.done
+            for event in pending:
+                yield event
+            sent += len(pending)
+            if finished and sent == len(self.events):
+                return
+
+
+run_store = RunStore(RUN_CHECKPOINT_TTL_SECONDS, RUN_CHECKPOINT_MAX_ENTRIES)
+
+# idempotency key -> run currently executing (or being set up) in this process
+in_flight_runs: Dict[str, InFlightRun] = {}
+
+
+def release_in_flight(idempotency_key: str, in_flight: InFlightRun) -> None:
+    """Drop a claim whose request ended without starting a run; waiting retries carry on"""
+    if in_flight_runs.get(idempotency_key) is in_flight:
+        del in_flight_runs[idempotency_key]
+    in_flight.abandon()
@@ -0,0 +1,113 @@
+import json
+import os
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional, Tuple
+
+import logfire
+
+# Telemetry policy: keeps span attributes small and only records verbose
+# spans/attributes for a sampled fraction of requests.
+#
+#   TELEMETRY_DEBUG=1                  record everything, no truncation
+#   TELEMETRY_MAX_ATTRIBUTE_CHARS      max length of a string attribute (default 256)
+#   TELEMETRY_MAX_ATTRIBUTE_ITEMS      max items kept from a list attribute (default 10)
+#   TELEMETRY_VERBOSE_SAMPLE_RATE      fraction of requests with verbose spans (default 0.05)
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes", "on")
+
+
+TELEMETRY_DEBUG = _env_flag("TELEMETRY_DEBUG")
+MAX_ATTRIBUTE_CHARS = int(os.getenv("TELEMETRY_MAX_ATTRIBUTE_CHARS", "256"))
+MAX_ATTRIBUTE_ITEMS = int(os.getenv("TELEMETRY_MAX_ATTRIBUTE_ITEMS", "10"))
+VERBOSE_SAMPLE_RATE = float(os.getenv("TELEMETRY_VERBOSE_SAMPLE_RATE", "0.05"))
+
+# sampling decision for the current request, made once when the request starts
+_verbose_sampled: ContextVar[Optional[bool]] = ContextVar("telemetry_verbose_sampled", default=None)
+
+
+def sample_request() -> bool:
+    """Make the head-based sampling decision for the current request"""
+    sampled = TELEMETRY_DEBUG or random.random() < VERBOSE_SAMPLE_RATE
+    _verbose_sampled.set(sampled)
+    return sampled
+
+
+def verbose_enabled() -> bool:
+    """Whether verbose spans and attributes should be recorded right now"""
+    sampled = _verbose_sampled.get()
+    if sampled is None:
+        return TELEMETRY_DEBUG
+    return sampled
+
+
+def _truncate_str(value: str) -> str:
+    if len(value) <= MAX_ATTRIBUTE_CHARS:
+        return value
+    return value[:MAX_ATTRIBUTE_CHARS] + f"...(+{len(value) - MAX_ATTRIBUTE_CHARS} chars)"
+
+
+def _budget(value: Any) -> Tuple[Any, int]:
+    """Capped value, and how many list items were dropped to fit the budget"""
+    if TELEMETRY_DEBUG or value is None or isinstance(value, (bool, int, float)):
+        return value, 0
+
+    if isinstance(value, str):
+        return _truncate_str(value), 0
+
+    if isinstance(value, (list, tuple)):
+        kept = list(value[:MAX_ATTRIBUTE_ITEMS])
+        # OpenTelemetry only keeps homogeneous arrays of primitives
+        if len({type(item) for item in kept}) <= 1 and all(isinstance(item, (str, int, float, bool)) for item in kept):
+            capped = [_truncate_str(item) if isinstance(item, str) else item for item in kept]
+            return capped, max(len(value) - MAX_ATTRIBUTE_ITEMS, 0)
+        # nested or mixed structures are flattened to a truncated string
+        return _truncate_str(json.dumps(value, default=str)), 0
+
+    return _truncate_str(json.dumps(value, default=str) if isinstance(value, dict) else str(value)), 0
+
+
+def budget_value(value: Any) -> Any:
+    """Cap an attribute value to the configured size budget"""
+    return _budget(value)[0]
+
+
+def set_attribute(span, key: str, value: Any) -> None:
+    """Set a span attribute, truncated to the size budget
+
+    When a list is cut short the number of dropped items goes in `<key>.truncated`,
+    so the array itself stays a single type.
+    """
+    capped, dropped = _budget(value)
+    span.set_attribute(key, capped)
+    if dropped:
+        span.set_attribute(f"{key}.truncated", dropped)
+
+
+def set_verbose_attribute(span, key: str, value: Any) -> None:
+    """Set a payload-sized attribute only when the request is sampled"""
+    if verbose_enabled():
+        set_attribute(span, key, value)
+
+
+class _NoopSpan:
+    """Stand-in for a span that was sampled out"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exception: BaseException, **kwargs) -> None:
+        pass
+
+
+@contextmanager
+def verbose_span(name: str, **attributes):
+    """A logfire span that is only recorded for sampled requests"""
+    if verbose_enabled():
+        with logfire.span(name, **attributes) as span:
+            yield span
+    else:
+        yield _NoopSpan()
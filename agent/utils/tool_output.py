@@ -0,0 +1,114 @@
+import math
+import os
+from typing import List
+
+from utils.metrics import TOOL_OUTPUT_TOKENS, TOOL_OUTPUT_TOKENS_SAVED
+from utils.recipe_columns import RecipeColumns
+
+# Token-budgeted output for agent tools. Everything a tool returns becomes
+# input tokens for the next main_agent turn, so by default tools return a
+# terse line-per-record format that is cut off at a per-tool token budget.
+#
+#   TOOL_OUTPUT_MODE=compact|verbose       default compact
+#   TOOL_OUTPUT_MAX_TOKENS                 default budget per tool (default 400)
+#   TOOL_OUTPUT_MAX_TOKENS_<TOOL_NAME>     budget for one tool, e.g.
+#                                          TOOL_OUTPUT_MAX_TOKENS_GET_ALL_RECIPE_DETAILS=600
+
+TOOL_OUTPUT_MODE = os.getenv("TOOL_OUTPUT_MODE", "compact").lower()
+DEFAULT_MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "400"))
+
+# rough chars-per-token ratio for English text with Gemini tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def max_tokens_for(tool: str) -> int:
+    return int(os.getenv(f"TOOL_OUTPUT_MAX_TOKENS_{tool.upper()}", DEFAULT_MAX_TOKENS))
+
+
+def fit_to_budget(lines: List[str], max_tokens: int) -> str:
+    """Join lines, dropping trailing records once the token budget is reached"""
+    kept = []
+    used = 0
+    for idx, line in enumerate(lines):
+        cost = estimate_tokens(line) + 1  # newline
+        if kept and used + cost > max_tokens:
+            kept.append(f"...+{len(lines) - idx} more (truncated)")
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+def render_tool_output(tool: str, verbose: str, compact_lines: List[str]) -> str:
+    """
+    Pick the tool output to hand back to the model and record token metrics.
+
+    Args:
+        tool: Tool name, used for the budget lookup and metric labels
+        verbose: The full human-readable summary
+        compact_lines: Header line(s) followed by one terse line per record
+
+    Returns:
+        The verbose summary, or the compact lines fitted to the tool's budget
+    """
+    verbose_tokens = estimate_tokens(verbose)
+
+    if TOOL_OUTPUT_MODE == "verbose":
+        TOOL_OUTPUT_TOKENS.labels(tool=tool, mode="verbose").inc(verbose_tokens)
+        return verbose
+
+    compact = fit_to_budget(compact_lines, max_tokens_for(tool))
+    compact_tokens = estimate_tokens(compact)
+    TOOL_OUTPUT_TOKENS.labels(tool=tool, mode="compact").inc(compact_tokens)
+    TOOL_OUTPUT_TOKENS_SAVED.labels(tool=tool).inc(max(verbose_tokens - compact_tokens, 0))
+    return compact
+
+
+def fmt_number(value) -> str:
+    """Short number formatting for compact lines ('-' when missing)"""
+    if value is None:
+        return "-"
+    return f"{value:.0f}" if isinstance(value, float) else str(value)
+
+
+def compact_recipe_line(recipe, used_count=None, missed_count=None) -> str:
+    """One line per RecipeDetails: id|title|time|macros|counts[|match]"""
+    nutrition = recipe.nutrition
+    if nutrition:
+        macros = (
+            f"{fmt_number(nutrition.calories)}kcal P{fmt_number(nutrition.protein)}"
+            f" C{fmt_number(nutrition.carbohydrates)} F{fmt_number(nutrition.fat)}"
+        )
+    else:
+        macros = "nutrition=-"
+    line = (
+        f"{recipe.id}|{recipe.title}|{recipe.readyInMinutes}min|{macros}"
+        f"|{len(recipe.ingredients)} ing|{len(recipe.analyzedInstructions)} steps"
+    )
+    if used_count is not None:
+        line += f"|used={used_count} missed={missed_count}"
+    return line
+
+
+def compact_stats_line(columns: RecipeColumns, failed_count: int = 0, with_match: bool = False) -> str:
+    """
+    Header line with the aggregate statistics the verbose summary lists, then
+    the column names; with_match when the lines carry compact_recipe_line's
+    used/missed counts.
+    """
+    parts = [f"recipes={len(columns)}", f"failed={failed_count}"]
+    if len(columns):
+        stats = columns.query()
+        parts.append(f"avg_min={stats.aggregate('readyInMinutes')['mean']:.0f}")
+        # recipes with missing or 0 calories are left out, as in the verbose summary
+        with_calories = columns.query().nonzero("calories")
+        if with_calories.count():
+            parts.append(f"avg_kcal={with_calories.aggregate('calories')['mean']:.0f}")
+            parts.append(f"lowest_kcal={columns.ids[with_calories.argmin('calories')]}")
+        parts.append(f"quickest={columns.ids[stats.argmin('readyInMinutes')]}")
+    header = "id|title|time|macros|ingredients|steps" + ("|match" if with_match else "")
+    return " ".join(parts) + "\n" + header
@@ -0,0 +1,127 @@
+import os
+import zlib
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from utils.json_codec import ndjson_line
+
+# Wire format for streamed event responses.
+#
+# Events are encoded per the request's Accept header (NDJSON by default,
+# MessagePack for `application/x-msgpack`) and compressed per the
+# Accept-Encoding header (br, then gzip). Compressed output is flushed after
+# every event so the client still sees each event as soon as it is produced.
+#
+#   WIRE_COMPRESSION=0            disable compression
+#   WIRE_GZIP_LEVEL               default 6
+#   WIRE_BROTLI_QUALITY           default 5
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+WIRE_COMPRESSION = os.getenv("WIRE_COMPRESSION", "1").lower() not in ("0", "false", "off", "no")
+WIRE_GZIP_LEVEL = int(os.getenv("WIRE_GZIP_LEVEL", "6"))
+WIRE_BROTLI_QUALITY = int(os.getenv("WIRE_BROTLI_QUALITY", "5"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MSGPACK_MEDIA_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    """Parse an Accept/Accept-Encoding header into {token: q}"""
+    accepted = {}
+    for item in header.split(","):
+        token, _, params = item.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    if not WIRE_COMPRESSION:
+        return None
+    accepted = _accepted(request.headers.get("accept-encoding", ""))
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def negotiate_media_type(request: Request) -> str:
+    accepted = _accepted(request.headers.get("accept", ""))
+    if msgpack is not None:
+        for media_type in MSGPACK_MEDIA_TYPES:
+            if accepted.get(media_type, 0) > 0:
+                return media_type
+    return NDJSON_MEDIA_TYPE
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not MessagePack serializable")
+
+
+async def encode_events(events: AsyncIterator[dict], media_type: str) -> AsyncIterator[bytes]:
+    """Frame events as NDJSON lines or back-to-back MessagePack objects"""
+    if media_type == NDJSON_MEDIA_TYPE:
+        async for event in events:
+            yield ndjson_line(event)
+    else:
+        packer = msgpack.Packer(default=_msgpack_default)
+        async for event in events:
+            yield packer.pack(event)
+
+
+async def compress_stream(chunks: AsyncIterator[bytes], encoding: str) -> AsyncIterator[bytes]:
+    """Compress a byte stream, flushing after each chunk"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=WIRE_BROTLI_QUALITY)
+        async for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        # wbits 16 + MAX_WBITS produces a gzip container
+        compressor = zlib.compressobj(WIRE_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        async for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush(zlib.Z_FINISH)
+
+
+def event_stream_response(
+    events: AsyncIterator[dict],
+    request: Request,
+    headers: Optional[Dict[str, str]] = None,
+) -> StreamingResponse:
+    """StreamingResponse for an event generator, in the negotiated wire format"""
+    headers = dict(headers or {})
+    media_type = negotiate_media_type(request)
+    body = encode_events(events, media_type)
+
+    encoding = negotiate_encoding(request)
+    if encoding:
+        body = compress_stream(body, encoding)
+        headers["Content-Encoding"] = encoding
+    headers["Vary"] = "Accept, Accept-Encoding"
+
+    return StreamingResponse(body, media_type=media_type, headers=headers)
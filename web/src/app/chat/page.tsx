@@ -150,11 +150,30 @@ export default function ChatPage() {
 
                 // Update assistant message with streaming data
                 setMessages((prev) =>
-                  prev.map((msg) =>
-                    msg.id === assistantMessageId
-                      ? { ...msg, streamingData: update, isLoading: false }
-                      : msg
-                  )
+                  prev.map((msg) => {
+                    if (msg.id !== assistantMessageId) return msg;
+
+                    // Per-ingredient events are summarized by the step_complete that follows
+                    if (update.type === "ingredient") return msg;
+
+                    // Token deltas are appended to the partial message text
+                    if (update.type === "message_delta") {
+                      const partial =
+                        msg.streamingData?.type === "message"
+                          ? msg.streamingData.message || ""
+                          : "";
+                      return {
+                        ...msg,
+                        streamingData: {
+                          type: "message",
+                          message: partial + update.delta,
+                        },
+                        isLoading: false,
+                      };
+                    }
+
+                    return { ...msg, streamingData: update, isLoading: false };
+                  })
                 );
               } catch (e) {
                 console.error("Error parsing streaming response:", e);
@@ -15,6 +15,25 @@ interface StepData {
   detailsCount?: number; // Added this field
 }
 
+// Resources one request used in a step (or in total)
+interface StepCost {
+  input_tokens: number;
+  output_tokens: number;
+  model_calls: number;
+  spoonacular_points: number;
+  spoonacular_calls: number;
+  bytes_sent: number;
+  bytes_received: number;
+  wall_ms: number;
+}
+
+interface CostLedger {
+  steps: Record<string, StepCost>;
+  total: StepCost;
+  // budget that cut the request short ("request_points", "request_tokens", "daily_budget")
+  degraded: string | null;
+}
+
 interface ChatBubbleProps {
   role: "user" | "assistant";
 
@@ -24,7 +43,15 @@ interface ChatBubbleProps {
 
   // For assistant messages (streaming updates)
   streamingData?: {
-    type: "step_update" | "step_complete" | "complete" | "message" | "error";
+    type:
+      | "step_update"
+      | "step_complete"
+      | "ingredient"
+      | "pantry"
+      | "complete"
+      | "message"
+      | "message_delta"
+      | "error";
 
     // Step information
     step?: {
@@ -33,9 +60,31 @@ interface ChatBubbleProps {
       message: string;
     };
 
+    // Single extracted ingredient and the photo it came from (ingredient only);
+    // -1 for pantry items not seen in this request's photos
+    ingredient?: string;
+    image_index?: number;
+
+    // Pantry inventory changes when the request sends X-Pantry-Token (pantry only)
+    added?: string[];
+    removed?: string[];
+    refreshed?: number;
+    total?: number;
+    search_reused?: boolean;
+
+    // Step duration in milliseconds (step_complete only)
+    timing_ms?: number;
+
+    // True when the step was restored from a checkpoint (step_complete only)
+    resumed?: boolean;
+
+    // Run id to pass back as resume_run_id when retrying (complete/error)
+    run_id?: string;
+
     // Step data
     data?: {
       ingredients?: string[];
+      image_count?: number;
       formatted?: string;
       recipe_count?: number;
       recipe_previews?: Array<{
@@ -51,12 +100,25 @@ interface ChatBubbleProps {
     summary?: {
       total_ingredients: number;
       total_recipes: number;
+      // preferences parsed from the message; recipes are ranked against them
+      preferences?: {
+        keywords: string[];
+        max_minutes: number | null;
+      };
+      // what the request spent (tokens, Spoonacular points, bytes, time), per step
+      cost?: CostLedger;
       recipes: RecipeResponse[];
     };
 
+    // Cost of a plain chat reply (message only)
+    cost?: CostLedger;
+
     // Error or simple message
     error?: string;
     message?: string;
+
+    // Incremental text for message_delta events
+    delta?: string;
   };
 
   isLoading?: boolean;